@@ -0,0 +1,16 @@
+"""
+Benchmarks of the analysis hot paths run against reproducible synthetic workloads.
+
+The benchmarks run offline on the CPU: comment corpora, predictions and databases are
+generated from fixed seeds and the YouTube API client is replaced by a stub.
+
+Run every benchmark, print a comparison with the stored baseline and exit with a non-zero
+status if any benchmark is slower than the baseline by more than the tolerance::
+
+    python -m benchmarks --output results.json
+
+Modules:
+- workloads: Synthetic comment corpora, seeded databases and a stubbed YouTube API client.
+- cases: The benchmarked functions and view functions.
+- runner: Functions used to time benchmarks and compare their results with a baseline.
+"""
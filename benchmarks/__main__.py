@@ -0,0 +1,64 @@
+"""
+Command used to run the benchmarks, write their results as JSON and compare them with a baseline.
+
+Examples::
+
+    python -m benchmarks                                  # run, compare with benchmarks/baseline.json
+    python -m benchmarks --quick -k combine -k youtube    # smallest workloads of matching benchmarks
+    python -m benchmarks --save-baseline                  # store this run as the baseline
+
+The exit status is 1 if any benchmark regressed by more than the tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from benchmarks import cases  # noqa: F401 registers the benchmarks.
+from benchmarks.runner import run_benchmarks, compare_results, environment
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[1])
+    parser.add_argument("-k", dest="selected", action="append",
+                        help="only run benchmarks whose names contain this string; may be repeated")
+    parser.add_argument("--quick", action="store_true",
+                        help="only run the smallest workload of each benchmark with shorter repeats")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="the baseline results file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fractional slowdown before a benchmark has regressed, by default 0.25")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    args = parser.parse_args(argv)
+
+    # the per-request logging of the application would drown out the results.
+    logging.disable(logging.WARNING)
+    results = run_benchmarks(args.selected, args.quick)
+    document = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with the baseline of {baseline['environment']['time']} "
+          f"(tolerance {args.tolerance:.0%}):")
+    rows = compare_results(results, baseline["results"], args.tolerance)
+    for key, previous, current, status in rows:
+        change = f"{current / previous - 1:+.1%}" if previous and current else ""
+        print(f"{key:<55} {status:>10} {change:>8}")
+    return 1 if any(status == "regressed" for *_, status in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
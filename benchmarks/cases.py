@@ -0,0 +1,197 @@
+"""
+Benchmarks of the analysis functions and the analyser and account view functions.
+
+Functions:
+- bench_calculate_prediction_confidence: Benchmark calculate_prediction_confidence over many predictions.
+- bench_combine_analysed_data: Benchmark combine_analysed_data for corpora of several sizes.
+- bench_summarise_analysed_data: Benchmark summarise_analysed_data for corpora of several sizes.
+- bench_get_youtube_video_comments: Benchmark get_youtube_video_comments against a stub with several page counts.
+- bench_fetch_video_comments: Benchmark fetching every comment and reply of a video from a fake API with 20 ms latency.
+- bench_comment_thread_page: Benchmark fetching and parsing a page of commentThreads with and without a field mask and gzip.
+- bench_predict_comments: Benchmark predict_comments with the saved model on the CPU.
+- bench_predict_comments_stub: Benchmark predict_comments with the stub model backend.
+- bench_analyser: Benchmark the analyser view function, with its cached issue list, with databases of several sizes.
+- bench_analyser_uncached: Benchmark the analyser view function without the fragment cache.
+- bench_analyser_not_modified: Benchmark revalidating an unchanged analyser page.
+- bench_account: Benchmark the account view function with databases of several sizes.
+- bench_analyse_comments: Benchmark analysing a fake YouTube video's comments, with a gzip response, end to end.
+- bench_analyse_comments_uncompressed: Benchmark analysing a fake YouTube video's comments with an uncompressed response.
+- bench_analyse_comments_api: Benchmark analysing a fake YouTube video's comments with the JSON API, with a gzip response.
+- bench_analyse_comments_summary: Benchmark summarising the analysis of a fake YouTube video's comments with the JSON API.
+"""
+import os
+from contextlib import contextmanager
+from benchmarks.runner import benchmark, SkipBenchmark
+from benchmarks.workloads import make_corpus, make_predictions, seeded_app, login, StubYouTube, stub_youtube_client
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model")
+
+
+@benchmark("calculate_prediction_confidence", predictions=(10000,))
+@contextmanager
+def bench_calculate_prediction_confidence(predictions: int):
+    from mlapp.protected import calculate_prediction_confidence
+
+    values = [round(value.item(), 3) for value in make_predictions(predictions)[:, 0]]
+    yield lambda: [calculate_prediction_confidence(value) for value in values]
+
+
+@benchmark("combine_analysed_data", comments=(100, 1000, 10000))
+@contextmanager
+def bench_combine_analysed_data(comments: int):
+    from mlapp.protected import combine_analysed_data
+
+    corpus = make_corpus(comments)
+    predictions = make_predictions(comments)
+    # classifications are read from the database so a request context is required.
+    with seeded_app(issues=0) as app, app.test_request_context():
+        yield lambda: combine_analysed_data(predictions, corpus)
+
+
+@benchmark("summarise_analysed_data", comments=(100, 1000, 10000))
+@contextmanager
+def bench_summarise_analysed_data(comments: int):
+    from mlapp.protected import summarise_analysed_data
+
+    corpus = make_corpus(comments)
+    predictions = make_predictions(comments)
+    with seeded_app(issues=0) as app, app.test_request_context():
+        yield lambda: summarise_analysed_data(predictions, corpus)
+
+
+@benchmark("get_youtube_video_comments", pages=(1, 10, 50))
+@contextmanager
+def bench_get_youtube_video_comments(pages: int):
+    from mlapp.protected import get_youtube_video_comments
+
+    with stub_youtube_client(StubYouTube(pages)):
+        yield lambda: get_youtube_video_comments("benchmark")
+
+
+@benchmark("fetch_video_comments", concurrency=(1, 8))
+@contextmanager
+def bench_fetch_video_comments(concurrency: int):
+    import asyncio
+    from mlapp.fake_youtube import FakeYouTubeServer
+    from mlapp.youtube import YouTubeClient, fetch_video_comments
+
+    with FakeYouTubeServer(latency=0.02) as server:
+        client = YouTubeClient(server.url, "key", size=concurrency + 1)
+        yield lambda: asyncio.run(fetch_video_comments(client, "synthetic-1000", concurrency))
+        client.close()
+
+
+@benchmark("comment_thread_page", payload=("full", "full_gzip", "fields", "fields_gzip"))
+@contextmanager
+def bench_comment_thread_page(payload: str):
+    from mlapp.fake_youtube import FakeYouTubeServer
+    from mlapp.youtube import YouTubeClient, THREAD_FIELDS, MAX_RESULTS
+
+    fields = THREAD_FIELDS if payload.startswith("fields") else None
+    with FakeYouTubeServer() as server:
+        client = YouTubeClient(server.url, "key", size=1, compress=payload.endswith("gzip"))
+        yield lambda: client.request("commentThreads", part="snippet,replies", videoId="synthetic-1000",
+                                     maxResults=MAX_RESULTS, fields=fields)
+        client.close()
+
+
+@benchmark("predict_comments", comments=(100, 1000))
+@contextmanager
+def bench_predict_comments(comments: int):
+    from mlapp.protected import predict_comments
+
+    corpus = make_corpus(comments)
+    try:
+        predict_comments(corpus[:1], MODEL_PATH)
+    except Exception as e:
+        raise SkipBenchmark(f"the model could not be loaded or run: {type(e).__name__}: {e}")
+    yield lambda: predict_comments(corpus, MODEL_PATH)
+
+
+@benchmark("predict_comments_stub", comments=(100, 1000))
+@contextmanager
+def bench_predict_comments_stub(comments: int):
+    from mlapp.protected import predict_comments
+
+    corpus = make_corpus(comments)
+    with seeded_app(issues=0, MODEL_BACKEND="stub") as app, app.app_context():
+        yield lambda: predict_comments(corpus)
+
+
+@benchmark("analyser_view", issues=(100, 1000, 10000))
+@contextmanager
+def bench_analyser(issues: int):
+    with seeded_app(issues=issues) as app:
+        client = app.test_client()
+        login(client)
+        yield lambda: client.get("/analyser")
+
+
+@benchmark("analyser_view_uncached", issues=(100, 1000, 10000))
+@contextmanager
+def bench_analyser_uncached(issues: int):
+    with seeded_app(issues=issues, FRAGMENT_CACHE_SIZE=0) as app:
+        client = app.test_client()
+        login(client)
+        yield lambda: client.get("/analyser")
+
+
+@benchmark("analyser_view_not_modified", issues=(100, 1000, 10000))
+@contextmanager
+def bench_analyser_not_modified(issues: int):
+    with seeded_app(issues=issues) as app:
+        client = app.test_client()
+        login(client)
+        etag = client.get("/analyser").headers["ETag"]
+        yield lambda: client.get("/analyser", headers={"If-None-Match": etag})
+
+
+@benchmark("account_view", issues=(100, 1000, 10000))
+@contextmanager
+def bench_account(issues: int):
+    with seeded_app(issues=issues) as app:
+        client = app.test_client()
+        login(client)
+        yield lambda: client.get("/account")
+
+
+@benchmark("analyse_comments_view", comments=(1000, 10000))
+@contextmanager
+def bench_analyse_comments(comments: int):
+    with _analyse_comments_client(comments, "gzip") as request:
+        yield request
+
+
+@benchmark("analyse_comments_view_uncompressed", comments=(1000, 10000))
+@contextmanager
+def bench_analyse_comments_uncompressed(comments: int):
+    with _analyse_comments_client(comments, "identity") as request:
+        yield request
+
+
+@benchmark("analyse_comments_api", comments=(1000, 10000))
+@contextmanager
+def bench_analyse_comments_api(comments: int):
+    with _analyse_comments_client(comments, "gzip", "/api/v1/analyse_comments/youtube_video") as request:
+        yield request
+
+
+@benchmark("analyse_comments_summary", comments=(1000, 10000))
+@contextmanager
+def bench_analyse_comments_summary(comments: int):
+    with _analyse_comments_client(comments, "gzip", "/api/v1/analyse_comments/youtube_video?mode=summary") as request:
+        yield request
+
+
+@contextmanager
+def _analyse_comments_client(comments: int, accept_encoding: str, path: str = "/analyse_comments/youtube_video"):
+    from mlapp.fake_youtube import FakeYouTubeServer
+
+    with FakeYouTubeServer() as server, \
+            seeded_app(issues=100, MODEL_BACKEND="stub", YOUTUBE_API_URL=server.url) as app:
+        client = app.test_client()
+        login(client)
+        # about a fifth of the comments are replies, see synthesise_video.
+        data = {"input": f"synthetic-{int(comments / 1.2)}"}
+        yield lambda: client.post(path, data=data,
+                                  headers={"Accept-Encoding": accept_encoding})
@@ -0,0 +1,435 @@
+"""
+A load test of the application, run by a pool of threads that each act as one logged-in analyst.
+
+Each virtual user logs in through /auth/login, registering its account first if needed, then
+repeatedly picks an operation from a weighted mix until the duration or request count is reached:
+- analyser: GET /analyser
+- account: GET /account
+- analyse_manual: POST /analyse_comments/manually_entered
+- analyse_youtube: POST /analyse_comments/youtube_video
+- create_issue: POST /issues
+- update_issue: POST /issue/update/<issue_id> of one of the user's own issues
+- delete_issue: POST /issue/delete/<issue_id> of one of the user's own issues
+Throughput, error rate and latency percentiles are reported per operation.
+
+Run against a running deployment::
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --users 16 --duration 60
+
+or offline against an in-process server with a seeded database, the stub model backend and a
+local fake YouTube Data API::
+
+    python -m benchmarks.loadtest --serve --users 8 --duration 30 --output loadtest.json
+
+Functions:
+- parse_mix: Parse an operation mix such as "analyser=3,account=1".
+- percentile: Return the nearest-rank percentile of sorted values.
+- run_load_test: Run a load test and return its report.
+- serve_offline: Context manager serving the application offline on a local port.
+- main: Run the load test command.
+
+Classes:
+- VirtualUser: A logged-in analyst making requests over one keep-alive connection.
+"""
+import argparse
+import http.client
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+OPERATIONS = ("analyser", "account", "analyse_manual", "analyse_youtube",
+              "create_issue", "update_issue", "delete_issue")
+DEFAULT_MIX = "analyser=30,account=10,analyse_manual=25,analyse_youtube=10,create_issue=12,update_issue=8,delete_issue=5"
+PERCENTILES = (50, 90, 95, 99)
+# IssueForm requires a user_id but issues are always authored by the logged-in user.
+ISSUE_FORM_USER_ID = 1
+_OWN_ISSUE = re.compile(rb'/issue/update/(\d+)')
+# shown by analyse_comments when comments were analysed rather than an error.
+_ANALYSED = b"Confidence Score"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse an operation mix such as "analyser=3,account=1".
+
+    Parameters
+    ----------
+    mix : str
+        Comma separated operation=weight pairs.
+
+    Returns
+    -------
+    Dict[str, float]
+        The weight of each operation.
+
+    Raises
+    ------
+    ValueError
+        Raised if an operation is unknown or a weight is not a positive number.
+    """
+    weights = {}
+    for pair in mix.split(","):
+        operation, _, weight = pair.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation {operation!r}, expected one of: {', '.join(OPERATIONS)}.")
+        weights[operation] = float(weight or 1)
+        if weights[operation] < 0:
+            raise ValueError(f"The weight of {operation} must not be negative.")
+    if not any(weights.values()):
+        raise ValueError("At least one operation must have a positive weight.")
+    return weights
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of sorted values.
+
+    Parameters
+    ----------
+    values : List[float]
+        The values, sorted in ascending order.
+    percent : float
+        The percentile, from 0 to 100.
+
+    Returns
+    -------
+    float
+        The smallest value that at least percent percent of values are less than or equal to.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class VirtualUser(object):
+    """
+    The class represents a logged-in analyst making requests over one keep-alive connection.
+
+    Parameters
+    ----------
+    url : str
+        The base URL of the application.
+    email : str
+        The email address the user logs in with.
+    password : str
+        The user's password.
+    video_id : str
+        The YouTube videoId analysed by analyse_youtube operations.
+    rng : random.Random
+        The random number generator choosing comments and issues.
+    """
+
+    def __init__(self, url: str, email: str, password: str, video_id: str, rng: random.Random):
+        parts = urlsplit(url)
+        connection = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._connection = connection(parts.hostname, parts.port, timeout=60)
+        self._prefix = parts.path.rstrip("/")
+        self.email = email
+        self.password = password
+        self.video_id = video_id
+        self.rng = rng
+        self.cookies = {}
+        self.issues = []
+
+    def request(self, method: str, path: str, form: Optional[Dict] = None) -> Tuple[int, bytes]:
+        """Make a request with the user's session cookie and return its status and body."""
+        headers = {"Cookie": "; ".join(f"{name}={value}" for name, value in self.cookies.items())}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self._connection.request(method, self._prefix + path, body, headers)
+            response = self._connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # reconnect once if the server closed the keep-alive connection.
+            self._connection.close()
+            self._connection.request(method, self._prefix + path, body, headers)
+            response = self._connection.getresponse()
+        data = response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, data
+
+    def login(self):
+        """Log in, registering the account first if it does not exist.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the user cannot log in.
+        """
+        credentials = {"email": self.email, "password": self.password}
+        status, _ = self.request("POST", "/auth/login", credentials)
+        if status != 302:
+            self.request("POST", "/auth/register", {**credentials, "confirm_password": self.password})
+            status, _ = self.request("POST", "/auth/login", credentials)
+        if status != 302:
+            raise RuntimeError(f"{self.email} could not log in.")
+        self._refresh_issues()
+
+    def _refresh_issues(self):
+        status, data = self.request("GET", "/analyser")
+        if status == 200:
+            self.issues = [int(issue_id) for issue_id in _OWN_ISSUE.findall(data)]
+        return status, data
+
+    def run(self, operation: str) -> bool:
+        """Perform an operation and return whether it succeeded."""
+        if operation == "analyser":
+            status, _ = self._refresh_issues()
+            return status == 200
+        if operation == "account":
+            return self.request("GET", "/account")[0] == 200
+        if operation in ("analyse_manual", "analyse_youtube"):
+            source, value = (("manually_entered", f"load test comment {self.rng.random()}")
+                             if operation == "analyse_manual" else ("youtube_video", self.video_id))
+            status, data = self.request("POST", f"/analyse_comments/{source}", {"input": value})
+            return status == 200 and _ANALYSED in data
+        if operation == "create_issue":
+            status, _ = self.request("POST", "/issues", {
+                "comment": f"load test comment {self.rng.random()}", "issue": "load test issue",
+                "user_id": ISSUE_FORM_USER_ID, "classification_id": self.rng.randint(1, 2)})
+            return status == 302
+        if not self.issues:
+            # there is nothing to update or delete until an issue has been created and listed.
+            self._refresh_issues()
+            if not self.issues:
+                return True
+        issue_id = self.rng.choice(self.issues)
+        if operation == "update_issue":
+            status, _ = self.request("POST", f"/issue/update/{issue_id}", {
+                "comment": "load test comment", "issue": f"updated {self.rng.random()}",
+                "user_id": ISSUE_FORM_USER_ID, "classification_id": 1})
+            return status == 302
+        self.issues.remove(issue_id)
+        return self.request("POST", f"/issue/delete/{issue_id}")[0] == 302
+
+    def close(self):
+        self._connection.close()
+
+
+def run_load_test(url: str, users: int = 4, duration: float = 10.0, requests: Optional[int] = None,
+                  mix: str = DEFAULT_MIX, email: str = "load{n}@bench.test", password: str = "benchmark",
+                  video_id: str = "synthetic-200", seed: int = 0) -> Dict:
+    """Run a load test and return its report.
+
+    Parameters
+    ----------
+    url : str
+        The base URL of the application.
+    users : int, optional
+        The number of concurrent virtual users, by default 4.
+    duration : float, optional
+        The seconds the load test runs for, by default 10.
+    requests : int, optional
+        The total number of operations after which the load test stops, by default None for no limit.
+    mix : str, optional
+        The operation weights, by default DEFAULT_MIX.
+    email : str, optional
+        The email address pattern of the virtual users, where {n} is the user's number, by default "load{n}@bench.test".
+    password : str, optional
+        The password of the virtual users, by default "benchmark".
+    video_id : str, optional
+        The YouTube videoId analysed by analyse_youtube operations, by default "synthetic-200".
+    seed : int, optional
+        The random seed of the virtual users, by default 0.
+
+    Returns
+    -------
+    Dict
+        The configuration of the load test, the totals and the count, errors, error rate, throughput
+        and latency percentiles in milliseconds of each operation.
+    """
+    weights = parse_mix(mix)
+    operations, cumulative = list(weights), list(weights.values())
+    latencies = {operation: [] for operation in operations}
+    errors = {operation: 0 for operation in operations}
+    lock = threading.Lock()
+    remaining = [requests]
+    failures = []
+    ready = threading.Barrier(users + 1)
+    stop = threading.Event()
+
+    def take() -> bool:
+        with lock:
+            if remaining[0] is None:
+                return True
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(number: int):
+        rng = random.Random(seed * 1000 + number)
+        user = VirtualUser(url, email.format(n=number), password, video_id, rng)
+        try:
+            user.login()
+        except Exception as e:
+            failures.append(f"{user.email}: {e}")
+        ready.wait()
+        try:
+            while not failures and not stop.is_set() and take():
+                operation = rng.choices(operations, cumulative)[0]
+                start = time.perf_counter()
+                try:
+                    ok = user.run(operation)
+                except Exception:
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies[operation].append(elapsed)
+                    errors[operation] += not ok
+        finally:
+            user.close()
+
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(1, users + 1)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    if failures:
+        stop.set()
+        raise RuntimeError("Virtual users could not log in: " + "; ".join(failures))
+    start = time.perf_counter()
+    while any(thread.is_alive() for thread in threads) and time.perf_counter() - start < duration:
+        time.sleep(0.05)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {"config": {"url": url, "users": users, "duration": round(elapsed, 3), "requests": requests,
+                         "mix": weights, "video_id": video_id},
+              "operations": {}}
+    for operation in operations:
+        values = sorted(latencies[operation])
+        if not values:
+            continue
+        report["operations"][operation] = {
+            "count": len(values),
+            "errors": errors[operation],
+            "error_rate": errors[operation] / len(values),
+            "throughput": len(values) / elapsed,
+            **{f"p{percent}_ms": percentile(values, percent) * 1000 for percent in PERCENTILES},
+            "max_ms": values[-1] * 1000,
+        }
+    count = sum(len(values) for values in latencies.values())
+    report["total"] = {"count": count, "errors": sum(errors.values()),
+                       "error_rate": sum(errors.values()) / count if count else 0.0,
+                       "throughput": count / elapsed}
+    return report
+
+
+@contextmanager
+def serve_offline(issues: int = 1000, model_latency_ms: float = 0.0, youtube_latency_ms: float = 0.0,
+                  **config) -> Iterator[str]:
+    """Context manager serving the application offline on a local port.
+
+    The application uses a seeded database, the stub model backend and a local fake YouTube
+    Data API, and is served by Werkzeug's threaded development server.
+
+    Parameters
+    ----------
+    issues : int, optional
+        The number of issues in the seeded database, by default 1000.
+    model_latency_ms : float, optional
+        Milliseconds each stub model prediction takes, by default 0.
+    youtube_latency_ms : float, optional
+        Milliseconds each fake YouTube Data API request takes, by default 0.
+    **config
+        Configuration values overriding the application defaults.
+
+    Yields
+    ------
+    str
+        The base URL of the application.
+    """
+    from werkzeug.serving import make_server
+    from benchmarks.workloads import seeded_app
+    from mlapp.fake_youtube import FakeYouTubeServer
+
+    # the development server logs every request and the seeded database's slow and repeated
+    # query warnings would drown out the report.
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    logging.getLogger("mlapp").setLevel(logging.ERROR)
+
+    with FakeYouTubeServer(latency=youtube_latency_ms / 1000) as youtube:
+        with seeded_app(issues, MODEL_BACKEND="stub", MODEL_STUB_LATENCY_MS=model_latency_ms,
+                        YOUTUBE_API_URL=youtube.url, **config) as app:
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+            thread.start()
+            try:
+                yield f"http://127.0.0.1:{server.server_port}"
+            finally:
+                server.shutdown()
+                thread.join()
+                server.server_close()
+
+
+def _print_report(report: Dict):
+    print(f"{report['config']['users']} users for {report['config']['duration']:.1f}s against {report['config']['url']}")
+    print(f"{'operation':<16}{'count':>8}{'errors':>8}{'req/s':>9}" +
+          "".join(f"{f'p{percent}':>9}" for percent in PERCENTILES) + f"{'max':>9}  (ms)")
+    for operation, stats in list(report["operations"].items()) + [("total", report["total"])]:
+        line = f"{operation:<16}{stats['count']:>8}{stats['errors']:>8}{stats['throughput']:>9.1f}"
+        if operation != "total":
+            line += "".join(f"{stats[f'p{percent}_ms']:>9.1f}" for percent in PERCENTILES) + f"{stats['max_ms']:>9.1f}"
+        print(line)
+
+
+def main(argv=None) -> int:
+    """Run the load test command.
+
+    Returns
+    -------
+    int
+        The exit status, 1 if the error rate exceeded --max-error-rate.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest",
+                                     description="Load test the application with concurrent logged-in analysts.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="the base URL of a running application")
+    target.add_argument("--serve", action="store_true",
+                        help="serve the application offline with a seeded database, stub model and fake YouTube API")
+    parser.add_argument("--users", type=int, default=4, help="the number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="the seconds to run for")
+    parser.add_argument("--requests", type=int, help="stop after this many operations")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights, by default {DEFAULT_MIX}")
+    parser.add_argument("--email", default="load{n}@bench.test",
+                        help="virtual user email pattern, {n} is the user's number; accounts are registered if needed")
+    parser.add_argument("--password", default="benchmark", help="the virtual users' password")
+    parser.add_argument("--video-id", default="synthetic-200", help="the videoId analysed by analyse_youtube")
+    parser.add_argument("--issues", type=int, default=1000, help="--serve: issues in the seeded database")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="--serve: milliseconds per stub prediction")
+    parser.add_argument("--youtube-latency", type=float, default=0.0,
+                        help="--serve: milliseconds per fake YouTube API request")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="the error rate above which the run fails")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    options = dict(users=args.users, duration=args.duration, requests=args.requests, mix=args.mix,
+                   email=args.email, password=args.password, video_id=args.video_id)
+    if args.serve:
+        with serve_offline(args.issues, args.model_latency, args.youtube_latency) as url:
+            report = run_load_test(url, **options)
+    else:
+        report = run_load_test(args.url, **options)
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["total"]["error_rate"] > args.max_error_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Functions used to register and time benchmarks and compare their results with a baseline.
+
+A benchmark is a context manager function registered with the benchmark() decorator. It is
+entered once per parameter value to set up its workload, yields the zero-argument callable
+that is timed and is exited to clean up.
+
+Functions:
+- benchmark: Decorator used to register a benchmark and the parameter values it is run with.
+- time_callable: Return timing statistics of a callable.
+- run_benchmarks: Run the registered benchmarks and return their results.
+- compare_results: Compare benchmark results with a baseline.
+- environment: Return a description of the environment the benchmarks ran in.
+
+Classes:
+- Benchmark: A registered benchmark.
+- SkipBenchmark: Exception raised by a benchmark that cannot run in this environment.
+"""
+import gc
+import platform
+import statistics
+import sys
+import time
+from contextlib import AbstractContextManager
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class SkipBenchmark(Exception):
+    """Exception raised by a benchmark that cannot run in this environment."""
+
+
+class Benchmark(NamedTuple):
+    """
+    The class represents a registered benchmark.
+
+    Attributes
+    ----------
+    name : str
+        The benchmark name.
+    function : Callable[..., AbstractContextManager]
+        The context manager function setting up the benchmark's workload.
+    param : str
+        The name of the parameter the benchmark is run with.
+    values : Tuple
+        The values of the parameter, smallest workload first.
+    """
+    name: str
+    function: Callable[..., AbstractContextManager]
+    param: str
+    values: Tuple
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, **params: Tuple) -> Callable:
+    """Decorator used to register a benchmark and the parameter values it is run with.
+
+    Parameters
+    ----------
+    name : str
+        The benchmark name.
+    **params : Tuple
+        A single parameter name and the values it is run with, smallest workload first.
+
+    Returns
+    -------
+    Callable
+        The decorator.
+    """
+    (param, values), = params.items()
+
+    def decorator(function):
+        BENCHMARKS.append(Benchmark(name, function, param, tuple(values)))
+        return function
+    return decorator
+
+
+def time_callable(function: Callable, repeat: int = 5, min_time: float = 0.2) -> Dict:
+    """Return timing statistics of a callable.
+
+    The callable is called once to warm up, then the number of calls per repeat is calibrated
+    so that each repeat takes at least min_time seconds. Garbage collection is disabled while timing.
+
+    Parameters
+    ----------
+    function : Callable
+        The zero-argument callable to time.
+    repeat : int, optional
+        The number of timed repeats, by default 5.
+    min_time : float, optional
+        The minimum seconds of each repeat, by default 0.2.
+
+    Returns
+    -------
+    Dict
+        The minimum, median, mean and standard deviation of the seconds per call, the number of
+        calls per repeat and the number of repeats.
+    """
+    function()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            times.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(selected: Optional[List[str]] = None, quick: bool = False,
+                   echo: Callable[[str], None] = print) -> Dict[str, Dict]:
+    """Run the registered benchmarks and return their results.
+
+    Parameters
+    ----------
+    selected : List[str], optional
+        Only run benchmarks whose names contain one of these strings, by default None for every benchmark.
+    quick : bool, optional
+        Only run each benchmark with its smallest workload and fewer, shorter repeats, by default False.
+    echo : Callable[[str], None], optional
+        Function used to report progress, by default print.
+
+    Returns
+    -------
+    Dict[str, Dict]
+        The timing statistics of each benchmark and parameter value, keyed by "name[param=value]".
+        Skipped benchmarks have a "skipped" reason instead.
+    """
+    results = {}
+    for bench in BENCHMARKS:
+        if selected and not any(name in bench.name for name in selected):
+            continue
+        for value in bench.values[:1] if quick else bench.values:
+            key = f"{bench.name}[{bench.param}={value}]"
+            try:
+                with bench.function(**{bench.param: value}) as function:
+                    result = time_callable(function, repeat=3 if quick else 5, min_time=0.05 if quick else 0.2)
+            except SkipBenchmark as e:
+                results[key] = {"skipped": str(e)}
+                echo(f"{key:<55} skipped: {e}")
+                continue
+            results[key] = result
+            echo(f"{key:<55} {result['median'] * 1000:>12.3f}ms "
+                 f"(min {result['min'] * 1000:.3f}ms, {result['number']}x{result['repeat']})")
+    return results
+
+
+def compare_results(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                    tolerance: float) -> List[Tuple[str, Optional[float], Optional[float], str]]:
+    """Compare benchmark results with a baseline.
+
+    Medians are compared; a benchmark regressed if its median is more than tolerance slower
+    than the baseline median and improved if it is more than tolerance faster.
+
+    Parameters
+    ----------
+    results : Dict[str, Dict]
+        The results returned by run_benchmarks().
+    baseline : Dict[str, Dict]
+        The results of a previous run.
+    tolerance : float
+        The allowed fractional slowdown, such as 0.25 for 25%.
+
+    Returns
+    -------
+    List[Tuple[str, Optional[float], Optional[float], str]]
+        The key, baseline median, current median and status of each benchmark. The status is one
+        of "ok", "regressed", "improved", "new" or "skipped".
+    """
+    rows = []
+    for key, result in results.items():
+        if "skipped" in result:
+            rows.append((key, None, None, "skipped"))
+            continue
+        previous = baseline.get(key, {}).get("median")
+        if previous is None:
+            rows.append((key, None, result["median"], "new"))
+        elif result["median"] > previous * (1 + tolerance):
+            rows.append((key, previous, result["median"], "regressed"))
+        elif result["median"] < previous / (1 + tolerance):
+            rows.append((key, previous, result["median"], "improved"))
+        else:
+            rows.append((key, previous, result["median"], "ok"))
+    return rows
+
+
+def environment() -> Dict[str, str]:
+    """Return a description of the environment the benchmarks ran in.
+
+    Returns
+    -------
+    Dict[str, str]
+        The Python version, platform, processor and time of the run.
+    """
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
@@ -0,0 +1,230 @@
+"""
+Synthetic workloads used by the benchmarks.
+
+Every workload is generated from a seed so that benchmark runs are reproducible.
+
+Functions:
+- make_corpus: Return a corpus of synthetic comments with a realistic length distribution.
+- make_predictions: Return synthetic model predictions shaped like keras.Model.predict output.
+- seeded_app: Context manager yielding an application with a seeded temporary database.
+- login: Log a test client in as a seeded user.
+- stub_youtube_client: Context manager replacing the YouTube API client with a StubYouTube.
+
+Classes:
+- StubYouTube: A stub of the YouTube API client's commentThreads resource.
+"""
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from unittest import mock
+import numpy as np
+from flask import Flask
+from flask.testing import FlaskClient
+from werkzeug.security import generate_password_hash
+
+BENCHMARK_PASSWORD = "benchmark"
+_VOCABULARY_SIZE = 5000
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def _vocabulary(rng: random.Random) -> List[str]:
+    """Return synthetic words of 1 to 12 letters, shortest first as in natural language."""
+    words = {"".join(rng.choices(_LETTERS, k=max(1, min(12, int(rng.gauss(5, 2))))))
+             for _ in range(_VOCABULARY_SIZE)}
+    return sorted(words, key=len)
+
+
+def make_corpus(size: int, seed: int = 0) -> List[str]:
+    """Return a corpus of synthetic comments with a realistic length distribution.
+
+    Comment lengths in words follow a log-normal distribution with a median of 12 words and a
+    long tail of essays up to 500 words, as YouTube comments do. Words are drawn from a
+    synthetic vocabulary with Zipf frequencies.
+
+    Parameters
+    ----------
+    size : int
+        The number of comments.
+    seed : int, optional
+        The random seed, by default 0.
+
+    Returns
+    -------
+    List[str]
+        The comments.
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    corpus = []
+    for _ in range(size):
+        length = max(1, min(500, int(rng.lognormvariate(2.5, 0.9))))
+        words = rng.choices(vocabulary, weights, k=length)
+        corpus.append(" ".join(words).capitalize() + rng.choice((".", "!", "?", "")))
+    return corpus
+
+
+def make_predictions(size: int, seed: int = 0) -> np.ndarray:
+    """Return synthetic model predictions shaped like keras.Model.predict output.
+
+    Parameters
+    ----------
+    size : int
+        The number of predictions.
+    seed : int, optional
+        The random seed, by default 0.
+
+    Returns
+    -------
+    ndarray
+        A (size, 1) float32 array of prediction values in the range (0-1).
+    """
+    return np.random.default_rng(seed).random((size, 1), dtype=np.float32)
+
+
+@contextmanager
+def seeded_app(issues: int, users: int = 10, seed: int = 0, **config) -> Iterator[Flask]:
+    """Context manager yielding an application with a seeded temporary database.
+
+    The database contains the classifications, users u<n>@bench.test with the password
+    BENCHMARK_PASSWORD and issues spread over the last year, created in one transaction.
+    The database is removed on exit.
+
+    Parameters
+    ----------
+    issues : int
+        The number of issues.
+    users : int, optional
+        The number of users, by default 10.
+    seed : int, optional
+        The random seed, by default 0.
+    **config
+        Configuration values overriding the application defaults.
+
+    Yields
+    ------
+    Flask
+        An application using the seeded database.
+    """
+    from mlapp import create_app
+    from mlapp.db import get_db, init_db
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".sqlite")
+    try:
+        # the model is not warmed up in the background while benchmarks are timed.
+        app = create_app({"TESTING": True, "DATABASE": db_path, "READINESS_WARM_UP_ON_REQUEST": False, **config})
+        rng = random.Random(seed)
+        corpus = make_corpus(min(issues, 1000), seed)
+        # hashing is deliberately slow so every user shares one hash.
+        password = generate_password_hash(BENCHMARK_PASSWORD)
+        start = datetime(2023, 1, 1)
+        with app.app_context():
+            init_db()
+            db = get_db()
+            with db:
+                db.executemany("INSERT INTO classification (classification) VALUES (?)",
+                               [("Misinformation",), ("Neutral",)])
+                db.executemany("INSERT INTO user (email, password) VALUES (?, ?)",
+                               [(f"u{n}@bench.test", password) for n in range(1, users + 1)])
+                db.executemany(
+                    "INSERT INTO issue (comment, issue, date_created, author_id, classified_id) VALUES (?, ?, ?, ?, ?)",
+                    [(corpus[n % len(corpus)], f"issue {n}",
+                      start + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                      rng.randint(1, users), rng.randint(1, 2)) for n in range(issues)]
+                )
+        yield app
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+def login(client: FlaskClient, user: int = 1):
+    """Log a test client in as a seeded user.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        A test client of an application yielded by seeded_app().
+    user : int, optional
+        The number of the seeded user, by default 1.
+    """
+    client.post("/auth/login", data={"email": f"u{user}@bench.test", "password": BENCHMARK_PASSWORD})
+
+
+class _StubRequest(object):
+    """A stub of an HttpRequest that returns a prepared response."""
+
+    def __init__(self, response: Dict):
+        self._response = response
+
+    def execute(self) -> Dict:
+        return self._response
+
+
+class StubYouTube(object):
+    """
+    The class represents a stub of the YouTube API client's commentThreads resource.
+
+    Pages of commentThreads are generated once, in the format returned by the YouTube Data API,
+    so that benchmarks measure the client code's handling of responses rather than the stub.
+
+    Parameters
+    ----------
+    pages : int
+        The number of pages of commentThreads.
+    threads_per_page : int, optional
+        The number of commentThreads per page, by default 100.
+    reply_rate : float, optional
+        The fraction of commentThreads with replies, by default 0.2.
+    seed : int, optional
+        The random seed, by default 0.
+    """
+
+    def __init__(self, pages: int, threads_per_page: int = 100, reply_rate: float = 0.2, seed: int = 0):
+        rng = random.Random(seed)
+        corpus = make_corpus(threads_per_page * 2, seed)
+        self.pages = []
+        for page in range(pages):
+            items = []
+            for thread in range(threads_per_page):
+                replies = rng.randint(1, 5) if rng.random() < reply_rate else 0
+                item = {"kind": "youtube#commentThread", "id": f"t{page}.{thread}", "snippet": {
+                    "topLevelComment": {"snippet": {"textOriginal": rng.choice(corpus)}},
+                    "totalReplyCount": replies,
+                }}
+                if replies:
+                    item["replies"] = {"comments": [{"snippet": {"textOriginal": rng.choice(corpus)}}
+                                                    for _ in range(replies)]}
+                items.append(item)
+            response = {"kind": "youtube#commentThreadListResponse", "items": items}
+            if page + 1 < pages:
+                response["nextPageToken"] = f"page{page + 1}"
+            self.pages.append(response)
+
+    def commentThreads(self) -> "StubYouTube":
+        return self
+
+    def list(self, pageToken: Optional[str] = None, **kwargs) -> _StubRequest:
+        page = int(pageToken[len("page"):]) if pageToken else 0
+        return _StubRequest(self.pages[page])
+
+
+@contextmanager
+def stub_youtube_client(youtube: StubYouTube) -> Iterator[StubYouTube]:
+    """Context manager replacing the YouTube API client built by googleapiclient with a stub.
+
+    Parameters
+    ----------
+    youtube : StubYouTube
+        The stub returned in place of the YouTube API client.
+
+    Yields
+    ------
+    StubYouTube
+        The stub.
+    """
+    with mock.patch("googleapiclient.discovery.build", return_value=youtube):
+        yield youtube
@@ -23,6 +23,108 @@ def create_app(test_config: str=None) -> Flask:
         # TODO: CHANGE SECRET_KEY WHEN DEPLOYING!
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'mlapp.sqlite'),
+        # seconds a logged in user's row is cached for and the maximum number of cached users.
+        USER_CACHE_TTL=60,
+        USER_CACHE_SIZE=1024,
+        # number of rows fetched from the database at a time when exporting.
+        EXPORT_BATCH_SIZE=500,
+        # maximum number of issues created by one bulk issue request.
+        BULK_ISSUE_LIMIT=1000,
+        # record the timing of every SQL statement (See query_stats).
+        DB_INSTRUMENTATION=True,
+        # statements slower than this many milliseconds are logged.
+        DB_SLOW_QUERY_MS=100,
+        # statements executed this many times in one request, such as N+1 queries, are logged.
+        DB_REPEATED_QUERY_THRESHOLD=10,
+        # seconds between writing aggregated query statistics to the instance folder.
+        DB_STATS_FLUSH_SECONDS=60,
+        # return per-request database and phase timings in Server-Timing response headers.
+        SERVER_TIMING=False,
+        # expose request, analysis and database metrics on /metrics (See metrics).
+        METRICS_ENABLED=True,
+        # directory shared by every worker process, None when running a single process.
+        METRICS_MULTIPROCESS_DIR=None,
+        # minimum seconds between writing a process's metrics to the shared directory.
+        METRICS_FLUSH_SECONDS=1,
+        # fraction of requests profiled with cProfile, and a token that profiles any request sending
+        # it in an X-Profile-Token header; profiling is disabled when both are unset (See profiling).
+        PROFILE_SAMPLE_RATE=0.0,
+        PROFILE_TOKEN=None,
+        # maximum number of profiles kept in the instance folder.
+        PROFILE_MAX_FILES=100,
+        # YouTube Data API key, the application's developer key is used when unset.
+        YOUTUBE_API_KEY=None,
+        # base URL of the YouTube Data API, such as a local fake API (See fake_youtube); None for Google's API.
+        YOUTUBE_API_URL=None,
+        # fetch every reply of threads with more replies than a commentThread includes, at most
+        # YOUTUBE_REPLY_CONCURRENCY requests at a time, waiting YOUTUBE_TIMEOUT seconds for each (See youtube).
+        YOUTUBE_EXPAND_REPLIES=True,
+        YOUTUBE_REPLY_CONCURRENCY=8,
+        YOUTUBE_TIMEOUT=30,
+        # requests a second and burst of requests allowed by each process, and the YouTube Data API quota
+        # units each process may spend a day, None for no budget (See youtube_guard).
+        YOUTUBE_RATE_LIMIT=50,
+        YOUTUBE_RATE_BURST=20,
+        YOUTUBE_DAILY_QUOTA=10000,
+        # transient errors are retried this many times after a random backoff of at most YOUTUBE_BACKOFF_BASE
+        # seconds, doubled for each retry up to YOUTUBE_BACKOFF_MAX seconds.
+        YOUTUBE_RETRIES=4,
+        YOUTUBE_BACKOFF_BASE=0.5,
+        YOUTUBE_BACKOFF_MAX=8,
+        # requests fail fast for YOUTUBE_CIRCUIT_RESET seconds after YOUTUBE_CIRCUIT_FAILURES failures in a row.
+        YOUTUBE_CIRCUIT_FAILURES=5,
+        YOUTUBE_CIRCUIT_RESET=30,
+        # checkpoint a fetch of a video's comments every FETCH_CHECKPOINT_PAGES pages, 0 to disable, so a
+        # failed analysis resumes from the checkpoint; checkpoints expire after FETCH_CHECKPOINT_TTL seconds.
+        FETCH_CHECKPOINT_PAGES=10,
+        FETCH_CHECKPOINT_TTL=86400,
+        # "keras" for the TensorFlow model at MODEL_PATH or "stub" for deterministic NumPy-only
+        # predictions that each take MODEL_STUB_LATENCY_MS milliseconds (See model_backend).
+        MODEL_BACKEND='keras',
+        MODEL_PATH='mlapp/model',
+        MODEL_STUB_LATENCY_MS=0,
+        # trace Python allocations with tracemalloc to log the peak memory and largest allocations of
+        # requests, a debug mode as tracing slows every allocation (See memory).
+        MEMORY_TRACEMALLOC=False,
+        MEMORY_TRACEMALLOC_FRAMES=1,
+        MEMORY_TRACEMALLOC_TOP=10,
+        # requests that grow the process by at least this many megabytes are logged.
+        MEMORY_LOG_THRESHOLD_MB=50,
+        # an analysis stops fetching comments at this many comments or once the process has grown by this
+        # many megabytes during the request, and analyses the comments fetched so far; None for no limit.
+        ANALYSIS_MAX_COMMENTS=50000,
+        ANALYSIS_MEMORY_BUDGET_MB=512,
+        # start warming up the model on a worker's first request rather than its first probe of /readyz,
+        # the number of comments predicted to warm it up and the seconds before a probe retries a failed
+        # warm-up (See health).
+        READINESS_WARM_UP_ON_REQUEST=True,
+        READINESS_WARM_UP_BATCH_SIZE=32,
+        READINESS_RETRY_SECONDS=30,
+        # maximum number of rendered issue lists cached by each process, 0 to disable the cache (See fragment_cache).
+        FRAGMENT_CACHE_SIZE=256,
+        # number of issues on each page of the analyser page.
+        ISSUES_PER_PAGE=50,
+        # serve the fingerprinted, precompressed copies of the static assets written to this subfolder of
+        # the static folder by the build-assets command, when they have been built (See assets).
+        ASSET_FINGERPRINTS=True,
+        ASSET_BUILD_DIR='dist',
+        # the most confident misinformation comments returned in a summary, the most recent analyses of each
+        # user kept in the database for their comments to be fetched in pages by any worker, the seconds they
+        # are kept for, and the most comments in a page (See api).
+        ANALYSIS_SUMMARY_TOP_K=10,
+        ANALYSIS_STORE_SIZE=16,
+        ANALYSIS_STORE_TTL=3600,
+        ANALYSIS_PAGE_SIZE=1000,
+        # the confidence level of the interval of the share of misinformation of a sampled analysis (See sampling).
+        ANALYSIS_SAMPLE_CONFIDENCE=0.95,
+        # compress responses of these content types with gzip or deflate at this zlib level, unless their
+        # body is in memory and smaller than COMPRESSION_MIN_SIZE bytes (See compression).
+        COMPRESSION_ENABLED=True,
+        COMPRESSION_LEVEL=6,
+        COMPRESSION_MIN_SIZE=1024,
+        COMPRESSION_MIMETYPES=('text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+                               'application/javascript', 'application/json', 'application/x-ndjson',
+                               'image/svg+xml'),
     )
 
     if test_config is None:
@@ -38,20 +140,60 @@ def create_app(test_config: str=None) -> Flask:
     except OSError:
         pass
 
+    from .auth import user_not_required
+
     # a simple page that says hello
     @app.route('/hello')
+    @user_not_required
     def hello():
         return 'Hello, World!'
 
+    # registered first so profiles include the other request hooks.
+    from . import profiling
+    profiling.init_app(app)
+
+    # registered before the other request hooks so responses are compressed after every hook has run.
+    from . import compression
+    compression.init_app(app)
+
     # initialise the app with the Flask tutorial SQLite database.
     from . import db
     db.init_app(app)
 
+    # TensorFlow is only imported when the Keras model is first used.
+    from . import model_backend
+    model_backend.init_app(app)
+
+    # registered after the database so its request hook runs before the query summary is removed.
+    from . import metrics
+    metrics.init_app(app)
+
+    # return the phases timed by view functions in a Server-Timing header (See timing).
+    from . import timing
+    timing.init_app(app)
+
+    # record the memory used by each request (See memory).
+    from . import memory
+    memory.init_app(app)
+
+    # serve the built static assets with long-lived cache headers (See assets).
+    from . import assets
+    assets.init_app(app)
+
     # register Blueprints
-    from . import auth, protected, public
+    from . import api, auth, export, health, protected, public, stats
     app.register_blueprint(auth.auth_bp)
     app.register_blueprint(protected.protected_bp)
     app.register_blueprint(public.public_bp)
+    app.register_blueprint(stats.stats_bp)
+    stats.init_app(app)
+    app.register_blueprint(export.export_bp)
+    export.init_app(app)
+    app.register_blueprint(health.health_bp)
+    health.init_app(app)
+    app.register_blueprint(api.api_bp)
+    from . import fake_youtube
+    fake_youtube.init_app(app)
     # from . import analyser
     # app.register_blueprint(analyser.analyser_bp)
     # associates the endpoint name 'index' with the "/" url 
@@ -0,0 +1,266 @@
+"""
+This module contains a Blueprint to register the versioned JSON API view functions.
+
+The analyser page renders analysed comments in the browser from the compact, columnar JSON returned by
+the API (See static/js/main.js) instead of the HTML rendered by protected.analyse_comments, as the
+markup repeated for every comment dominated both the time spent rendering and the bytes sent.
+
+In summary mode only a summary of a video's analysis is returned. The comments and their predictions
+are kept in the database in chunks of ANALYSIS_PAGE_SIZE comments, for each user's ANALYSIS_STORE_SIZE
+most recent analyses and at most ANALYSIS_STORE_TTL seconds, so pages of the analysed comments can be fetched
+when they are viewed, by whichever worker process the request reaches, reading only the chunks they overlap.
+
+In sampling mode at most a maximum number of a video's comments are analysed, the first comments or a
+uniform random sample of them, and the share of misinformation is estimated with a confidence interval,
+so very large videos are analysed in memory and time bounded by the sample size (See sampling).
+
+Functions:
+- analyse_comments: View function used to analyse comment data and return it, or its summary, as JSON.
+- analysis_comments: View function used to return a page of a stored analysis's comments.
+- store_analysis: Store an analysis made in summary mode and return its analysis_id.
+- load_analysis: Return a page of the comments and predictions of a stored analysis.
+- api_error: Return a JSON error response.
+"""
+import json
+import secrets
+import sqlite3
+import zlib
+from typing import List, Optional, Tuple
+import numpy as np
+from flask import Blueprint, abort, current_app, g, jsonify, request, Response
+from googleapiclient.errors import HttpError
+from mlapp.auth import login_required
+from mlapp.db import get_db
+from mlapp.protected import (
+    get_classification, get_comments, predict_comments, combine_analysed_columns, summarise_analysed_data,
+    log_analysis_timings
+)
+from mlapp.sampling import get_sampler, summarise_sample
+from mlapp.timing import timed
+from mlapp.youtube_guard import error_reason
+from numpy import ndarray
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@api_bp.route("/analyse_comments/<string:source>", methods=["POST"])
+@login_required
+def analyse_comments(source: str) -> Response:
+    """The analyse comments API view function.
+
+    Comments are retrieved and predicted in the same way as protected.analyse_comments and returned
+    as the columns of combine_analysed_columns with the number of comments analysed and, if only the
+    first comments of a video were analysed, the limit that was reached ("comments" or "memory").
+    If the "mode" query parameter is "summary", the "summary" of summarise_analysed_data, the
+    "classifications" dictionary of combine_analysed_columns and, if the analysis was stored, the
+    "analysis_id" used to fetch pages of the comments (See analysis_comments) are returned instead.
+    If the "max_comments" query parameter is given, at most that many comments are analysed, sampled with
+    the "sample" query parameter's method, "first" by default or "reservoir", and the "sample" of
+    summarise_sample, with the estimated share of misinformation and its confidence interval, is returned too.
+
+    Parameters
+    ----------
+    source : str
+        How comment(s) are retieved during the request.
+        Current options are from a YouTube video using the YouTube API or a manual text input.
+
+    Returns
+    -------
+    Response
+        A JSON Response of the analysed comments, or of the error with a 400, 500 or 502 status code.
+    """
+    comments = []
+    summary_mode = request.args.get("mode") == "summary"
+    sampler = None
+    try:
+        if "max_comments" in request.args:
+            sampler = get_sampler(request.args.get("sample", "first"), request.args.get("max_comments", type=int))
+        comments = get_comments(source, request.form['input'], sampler)
+        predictions = predict_comments(comments)
+        with timed("combine"):
+            if summary_mode:
+                analysis = {"summary": summarise_analysed_data(predictions, comments,
+                                                               current_app.config['ANALYSIS_SUMMARY_TOP_K']),
+                            "classifications": dict(map(get_classification, ("Misinformation", "Neutral")))}
+            else:
+                analysis = combine_analysed_columns(predictions, comments)
+            if sampler is not None:
+                analysis["sample"] = summarise_sample(sampler, predictions,
+                                                      confidence=current_app.config['ANALYSIS_SAMPLE_CONFIDENCE'])
+    except HttpError as e:
+        # an error without the API's error details, such as from a proxy, has no reason.
+        return api_error(source, comments, e, 502, f"An error occured while retrieving YouTube comments: "
+                                                   f"{e.status_code} {error_reason(e) or ''}".rstrip())
+    except (ZeroDivisionError, ValueError) as e:
+        return api_error(source, comments, e, 400, e.args[0])
+    except OSError as e:
+        return api_error(source, comments, e, 500, e.args[0])
+    except Exception as e:
+        # the API always returns JSON, the traceback is only logged.
+        current_app.logger.exception("Unexpected error analysing %s comments", source)
+        return api_error(source, comments, e, 500, "Something unexpected occurred while analysing comment data!")
+    if summary_mode:
+        with timed("store"):
+            analysis_id = store_analysis(g.user['user_id'], comments, predictions)
+        # an analysis that was not stored is returned without an analysis_id, so only its summary is shown.
+        if analysis_id is not None:
+            analysis["analysis_id"] = analysis_id
+    with timed("render"):
+        response = jsonify(count=len(comments), truncated=g.get("analysis_truncated"), **analysis)
+    log_analysis_timings(source, len(comments))
+    return response
+
+
+@api_bp.route("/analyses/<string:analysis_id>/comments", methods=["GET"])
+@login_required
+def analysis_comments(analysis_id: str) -> Response:
+    """The analysis comments API view function.
+
+    Returns the columns of combine_analysed_columns for the comments of an analysis made in summary mode
+    from the "offset" query parameter, 0 by default, for at most "limit" comments, by default and at most
+    ANALYSIS_PAGE_SIZE. An analysis that has expired or been evicted from the store, or was made by another user,
+    aborts with a 404 status code and must be analysed again.
+
+    Parameters
+    ----------
+    analysis_id : str
+        The analysis_id returned in summary mode.
+
+    Returns
+    -------
+    Response
+        A JSON Response of the page's analysed comments with the "offset" of its first comment and
+        the "total" number of comments in the analysis.
+    """
+    page_size = current_app.config['ANALYSIS_PAGE_SIZE']
+    offset = max(request.args.get("offset", default=0, type=int), 0)
+    limit = min(max(request.args.get("limit", default=page_size, type=int), 0), page_size)
+    stored = load_analysis(analysis_id, g.user['user_id'], offset, limit)
+    if stored is None:
+        abort(404)
+    page, predictions, total = stored
+    analysis = combine_analysed_columns(predictions, page)
+    return jsonify(count=len(page), offset=offset, total=total, **analysis)
+
+
+def store_analysis(user_id: int, comments: List[str], predictions: ndarray) -> Optional[str]:
+    """Store an analysis made in summary mode in the database and return its analysis_id.
+
+    The comments and predictions are stored in chunks of ANALYSIS_PAGE_SIZE comments, so a page of the
+    analysis is read without decompressing every comment of the video. Analyses older than
+    ANALYSIS_STORE_TTL seconds, and all but the user's ANALYSIS_STORE_SIZE most recent analyses, are deleted.
+    An analysis is not stored if the database cannot be written to, such as a database created before the
+    analysis tables were added, so its comments cannot be fetched.
+
+    Parameters
+    ----------
+    user_id : int
+        The user_id of the user who made the analysis.
+    comments : List[str]
+        A list of comments as strings.
+    predictions : ndarray
+        A NumPy array of the TensorFlow model's predictions for the comments.
+
+    Returns
+    -------
+    Optional[str]
+        The analysis_id of the analysis, or None if it was not stored.
+    """
+    analysis_id = secrets.token_urlsafe(12)
+    chunk_size = current_app.config['ANALYSIS_PAGE_SIZE']
+    values = predictions.reshape(-1).astype(np.float64)
+    db = get_db()
+    try:
+        with db:
+            db.execute("INSERT INTO analysis (analysis_id, user_id, total, chunk_size) VALUES (?, ?, ?, ?)",
+                       (analysis_id, user_id, len(comments), chunk_size))
+            for chunk, start in enumerate(range(0, len(comments), chunk_size)):
+                db.execute("INSERT INTO analysis_chunk (analysis_id, chunk, comments, prediction_values) "
+                           "VALUES (?, ?, ?, ?)",
+                           (analysis_id, chunk,
+                            zlib.compress(json.dumps(comments[start:start + chunk_size]).encode(), 1),
+                            values[start:start + chunk_size].tobytes()))
+            db.execute("DELETE FROM analysis WHERE created < datetime('now', ?)",
+                       (f"-{int(current_app.config['ANALYSIS_STORE_TTL'])} seconds",))
+            db.execute("DELETE FROM analysis WHERE user_id = ? AND rowid NOT IN "
+                       "(SELECT rowid FROM analysis WHERE user_id = ? ORDER BY rowid DESC LIMIT ?)",
+                       (user_id, user_id, current_app.config['ANALYSIS_STORE_SIZE']))
+            db.execute("DELETE FROM analysis_chunk WHERE analysis_id NOT IN (SELECT analysis_id FROM analysis)")
+    except sqlite3.OperationalError as e:
+        current_app.logger.warning("Analysis %s was not stored: %s", analysis_id, e)
+        return None
+    return analysis_id
+
+
+def load_analysis(analysis_id: str, user_id: int, offset: int,
+                  limit: int) -> Optional[Tuple[List[str], ndarray, int]]:
+    """Return a page of the comments and predictions of an analysis made in summary mode by a user.
+
+    Only the chunks of the analysis that the page overlaps are read from the database.
+
+    Parameters
+    ----------
+    analysis_id : str
+        The analysis_id returned in summary mode.
+    user_id : int
+        The user_id of the user requesting the analysis.
+    offset : int
+        The index of the first comment of the page.
+    limit : int
+        The most comments in the page.
+
+    Returns
+    -------
+    Optional[Tuple[List[str], ndarray, int]]
+        The page's comments and predictions, and the total number of comments in the analysis, or None if
+        it has expired or been evicted, or was made by another user.
+    """
+    db = get_db()
+    try:
+        row = db.execute(
+            "SELECT total, chunk_size FROM analysis "
+            "WHERE analysis_id = ? AND user_id = ? AND created >= datetime('now', ?)",
+            (analysis_id, user_id, f"-{int(current_app.config['ANALYSIS_STORE_TTL'])} seconds")).fetchone()
+        if row is None:
+            return None
+        # the first and last chunks the page overlaps, none if the page is past the last comment.
+        first, last = offset // row['chunk_size'], (min(offset + limit, row['total']) - 1) // row['chunk_size']
+        chunks = db.execute(
+            "SELECT comments, prediction_values FROM analysis_chunk "
+            "WHERE analysis_id = ? AND chunk BETWEEN ? AND ? ORDER BY chunk",
+            (analysis_id, first, last)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    comments = [comment for chunk in chunks for comment in json.loads(zlib.decompress(chunk['comments']))]
+    predictions = np.frombuffer(b"".join(chunk['prediction_values'] for chunk in chunks), dtype=np.float64)
+    # the offset within the first chunk read.
+    start = offset % row['chunk_size'] if chunks else 0
+    return comments[start:start + limit], predictions[start:start + limit].reshape(-1, 1), row['total']
+
+
+def api_error(source: str, comments: list, error: Exception, status_code: int, message: str) -> Response:
+    """Return a JSON error response and log the analysis's timings with the error.
+
+    Parameters
+    ----------
+    source : str
+        How comment(s) were retieved during the request.
+    comments : list
+        The comments retrieved before the error.
+    error : Exception
+        The error raised.
+    status_code : int
+        The status code of the response.
+    message : str
+        The error message shown to the user.
+
+    Returns
+    -------
+    Response
+        A JSON Response with the "error" message and the "error_type".
+    """
+    error_type = type(error).__name__
+    log_analysis_timings(source, len(comments), error_type)
+    response = jsonify(error=message, error_type=error_type)
+    response.status_code = status_code
+    return response
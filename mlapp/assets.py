@@ -0,0 +1,263 @@
+"""
+Functions used to build fingerprinted, precompressed copies of the static assets and to serve them.
+
+The build-assets command copies every file in the static folder to the ASSET_BUILD_DIR subfolder
+with a hash of its content in its name, such as dist/css/main.1a2b3c4d5e6f.css, alongside .gz and,
+if the optional brotli package is installed, .br variants that are kept when they are at least 10%
+smaller. A manifest maps each original filename to its hashed copy.
+
+Once the manifest exists, url_for('static', filename=...) returns the URL of the hashed copy and the
+static view sends the smallest variant the client accepts with headers caching it for a year, as a
+changed file has a new name. Files not in the manifest are served as before.
+
+Functions:
+- hashed_filename: Return the fingerprinted filename of an asset.
+- build_assets: Write fingerprinted and precompressed copies of every static asset and their manifest.
+- load_manifest: Return the manifest of the built assets.
+- page_transfer_sizes: Return the bytes transferred to load a page's assets with and without the built assets.
+- hashed_static_url: URL defaults callback used to replace static filenames with their fingerprinted filenames.
+- send_static: View function used to send a static file, or the best encoded variant of a built asset.
+- build_assets_command: Click command used to build the assets and report the bytes saved.
+- init_app: Register the static view, URL defaults callback and build command with the application instance.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from typing import Dict, Iterable
+import click
+from flask import current_app, request, send_from_directory, Response
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    # .br variants are only built when the optional brotli package is installed.
+    brotli = None
+
+MANIFEST = "manifest.json"
+# a variant is only kept if it is at most this fraction of the asset's size.
+MIN_SAVING = 0.9
+# (extension, Content-Encoding) of the precompressed variants, in order of preference.
+ENCODINGS = ((".br", "br"), (".gz", "gzip"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+# assets requested when the analyser page is loaded, see base_layout.html and analyser.html.
+ANALYSER_PAGE_ASSETS = ("favicon.ico", "css/main.css", "js/main.js", "css/sidebar.css", "js/sidebars.js")
+
+
+def hashed_filename(filename: str, content: bytes) -> str:
+    """Return the fingerprinted filename of an asset.
+
+    Parameters
+    ----------
+    filename : str
+        The asset's filename relative to the static folder.
+    content : bytes
+        The asset's content.
+
+    Returns
+    -------
+    str
+        The filename with the first 12 hexadecimal digits of the SHA-256 hash of its content before its extension.
+    """
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+
+
+def _iter_assets(static_folder: str, build_dir: str) -> Iterable[str]:
+    for directory, directories, filenames in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(os.path.join(static_folder, build_dir)):
+            directories[:] = []
+            continue
+        directories.sort()
+        for filename in sorted(filenames):
+            yield os.path.relpath(os.path.join(directory, filename), static_folder).replace(os.sep, "/")
+
+
+def build_assets(static_folder: str, build_dir: str) -> Dict[str, Dict]:
+    """Write fingerprinted and precompressed copies of every static asset and their manifest.
+
+    The build directory is replaced, so assets removed from the static folder are removed from it.
+
+    Parameters
+    ----------
+    static_folder : str
+        The application's static folder.
+    build_dir : str
+        The subfolder of the static folder the copies are written to.
+
+    Returns
+    -------
+    Dict[str, Dict]
+        The manifest, keyed by filename relative to the static folder, of each asset's hashed filename
+        relative to the static folder and the size of the asset and of each variant in bytes.
+    """
+    output = os.path.join(static_folder, build_dir)
+    filenames = list(_iter_assets(static_folder, build_dir))
+    shutil.rmtree(output, ignore_errors=True)
+    manifest = {}
+    for filename in filenames:
+        with open(os.path.join(static_folder, filename), "rb") as f:
+            content = f.read()
+        hashed = f"{build_dir}/{hashed_filename(filename, content)}"
+        path = os.path.join(static_folder, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        entry = {"file": hashed, "size": len(content)}
+        variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(content, quality=11)
+        for extension, encoding in ENCODINGS:
+            compressed = variants.get(encoding)
+            if compressed is not None and len(compressed) <= len(content) * MIN_SAVING:
+                with open(path + extension, "wb") as f:
+                    f.write(compressed)
+                entry[encoding] = len(compressed)
+        manifest[filename] = entry
+    with open(os.path.join(output, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder: str, build_dir: str) -> Dict[str, Dict]:
+    """Return the manifest of the built assets.
+
+    Parameters
+    ----------
+    static_folder : str
+        The application's static folder.
+    build_dir : str
+        The subfolder of the static folder the assets were built in.
+
+    Returns
+    -------
+    Dict[str, Dict]
+        The manifest written by build_assets(), or an empty dictionary if the assets have not been built.
+    """
+    try:
+        with open(os.path.join(static_folder, build_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def page_transfer_sizes(manifest: Dict[str, Dict], filenames: Iterable[str]) -> Dict[str, int]:
+    """Return the bytes of asset bodies transferred to load a page with and without the built assets.
+
+    Parameters
+    ----------
+    manifest : Dict[str, Dict]
+        The manifest of the built assets.
+    filenames : Iterable[str]
+        The assets requested by the page.
+
+    Returns
+    -------
+    Dict[str, int]
+        The bytes transferred on a first visit by the original assets ("original"), by the smallest
+        variants a browser accepting gzip ("gzip") or gzip and brotli ("br") is sent, and the number
+        of requests made on a repeat visit without ("revalidations") and with immutable caching (0).
+    """
+    sizes = {"original": 0, "gzip": 0, "br": 0, "revalidations": 0}
+    for filename in dict.fromkeys(filenames):
+        entry = manifest[filename]
+        sizes["original"] += entry["size"]
+        sizes["gzip"] += entry.get("gzip", entry["size"])
+        sizes["br"] += min(entry.get("br", entry["size"]), entry.get("gzip", entry["size"]))
+        sizes["revalidations"] += 1
+    return sizes
+
+
+def hashed_static_url(endpoint: str, values: dict):
+    """Replace the filename of a static URL with its fingerprinted filename when the assets have been built.
+
+    Parameters
+    ----------
+    endpoint : str
+        The endpoint a URL is being built for.
+    values : dict
+        The URL's values, changed in place.
+    """
+    if endpoint != "static":
+        return
+    entry = current_app.extensions['asset_manifest'].get(values.get("filename"))
+    if entry is not None:
+        values["filename"] = entry["file"]
+
+
+def send_static(filename: str) -> Response:
+    """The static view function.
+
+    A built asset is sent as the smallest precompressed variant the client's Accept-Encoding header
+    accepts with a Cache-Control header caching it for a year. Other files are sent by Flask's static view.
+
+    Parameters
+    ----------
+    filename : str
+        The file's path relative to the static folder.
+
+    Returns
+    -------
+    Response
+        The file.
+    """
+    built = current_app.extensions['asset_files'].get(filename)
+    if built is None:
+        return current_app.send_static_file(filename)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for extension, encoding in ENCODINGS:
+        if encoding in built and request.accept_encodings[encoding]:
+            response = send_from_directory(current_app.static_folder, filename + extension, mimetype=mimetype)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(current_app.static_folder, filename, mimetype=mimetype)
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Build fingerprinted and precompressed copies of the static assets.
+    """
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    manifest = build_assets(current_app.static_folder, build_dir)
+    for filename, entry in manifest.items():
+        click.echo(f"{filename:<30} {entry['size']:>8} B  gzip {entry.get('gzip', '-'):>8}  "
+                   f"br {entry.get('br', '-'):>8}  -> {entry['file']}")
+    if brotli is None:
+        click.echo("brotli is not installed; only .gz variants were built.")
+    sizes = page_transfer_sizes(manifest, [name for name in ANALYSER_PAGE_ASSETS if name in manifest])
+    click.echo(f"Analyser page assets: {sizes['original']} B uncompressed, {sizes['gzip']} B with gzip "
+               f"({1 - sizes['gzip'] / max(sizes['original'], 1):.0%} less), {sizes['br']} B with brotli; "
+               f"repeat visits make 0 requests instead of {sizes['revalidations']} revalidations.")
+    _set_manifest(current_app, manifest)
+
+
+def _set_manifest(app, manifest: Dict[str, Dict]):
+    app.extensions['asset_manifest'] = manifest
+    app.extensions['asset_files'] = {entry["file"]: entry for entry in manifest.values()}
+
+
+def init_app(app):
+    """Register send_static(), hashed_static_url() and build_assets_command() with the application instance.
+
+    The manifest is read once, when the application is created, if ASSET_FINGERPRINTS is enabled.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    manifest = {}
+    if app.config['ASSET_FINGERPRINTS']:
+        manifest = load_manifest(app.static_folder, app.config['ASSET_BUILD_DIR'])
+    _set_manifest(app, manifest)
+    app.view_functions['static'] = send_static
+    app.url_defaults(hashed_static_url)
+    app.cli.add_command(build_assets_command)
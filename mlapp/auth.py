@@ -2,19 +2,166 @@
 This module contains a Blueprint to register view functions for authorisation.
 
 Functions:
-- 
+- register: View function used to register a user.
+- login: View function used to log a user in.
+- load_logged_in_user: Store the logged in user's data on g.user before each request.
+- user_required: Return whether an endpoint's view function may use g.user.
+- get_user: Return a user's data from the user cache or the database.
+- invalidate_user: Remove a user from the user cache.
+- get_user_cache: Return the application's user cache.
+- logout: View function used to log a user out.
+- login_required: Decorator for views that require a logged in user.
+- user_not_required: Decorator for views that never use g.user.
+
+Classes:
+- UserCache: A TTL cache of user rows keyed by user_id.
 """
 import functools
-from typing import Union
+import threading
+import time
+from collections import OrderedDict
+from sqlite3 import Row
+from typing import Optional, Union
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for, Response
+    Blueprint, current_app, flash, g, redirect, render_template, request, session, url_for, Response
 )
 from werkzeug.security import check_password_hash, generate_password_hash
 from mlapp.db import get_db
 from mlapp.forms import RegistrationForm, LoginForm
+from mlapp.metrics import CACHE_REQUESTS
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+# endpoints that are never rendered with the logged in user's data.
+USER_NOT_REQUIRED_ENDPOINTS = {'static'}
+
+
+class UserCache(object):
+    """
+    The class represents a thread-safe TTL cache of user rows keyed by user_id.
+
+    Entries expire ttl seconds after they are stored and the least recently used entry
+    is evicted once maxsize entries are stored.
+
+    Methods
+    -------
+    get(user_id)
+        Return a cached user row or None if it is missing or expired.
+    set(user_id, user)
+        Store a user row.
+    invalidate(user_id)
+        Remove a user row.
+    clear()
+        Remove all user rows.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        """
+        Constructor for the UserCache class.
+
+        Parameters
+        ----------
+        ttl : float
+            The number of seconds a user row is cached for.
+        maxsize : int
+            The maximum number of user rows cached.
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Row]:
+        """Return a cached user row or None if it is missing or expired."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user_id: int, user: Row):
+        """Store a user row, evicting the least recently used row if the cache is full."""
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + self.ttl, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Remove a user row."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        """Remove all user rows."""
+        with self._lock:
+            self._users.clear()
+
+
+def get_user_cache() -> UserCache:
+    """Return the application's user cache, creating it on first use.
+
+    The cache is stored in the application's extensions so each application instance,
+    and hence each database, has its own cache.
+
+    Returns
+    -------
+    UserCache
+        The application's user cache.
+    """
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_cache', UserCache(
+            ttl=current_app.config['USER_CACHE_TTL'],
+            maxsize=current_app.config['USER_CACHE_SIZE'],
+        ))
+    return cache
+
+
+def get_user(user_id: int) -> Optional[Row]:
+    """Return a user's data from the user cache, querying the database on a cache miss.
+
+    Parameters
+    ----------
+    user_id : int
+        The user primary key id number in the database.
+
+    Returns
+    -------
+    Optional[Row]
+        The user as a sqlite.Row object or None if no user exists with the user_id.
+    """
+    cache = get_user_cache()
+    user = cache.get(user_id)
+    CACHE_REQUESTS.inc(cache="user", result="miss" if user is None else "hit")
+    if user is None:
+        user = get_db().execute(
+            'SELECT * FROM user WHERE user_id = ?', 
+            (user_id,)
+        ).fetchone()
+        if user is not None:
+            cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id: int):
+    """Remove a user from the user cache.
+
+    Must be called whenever a user's row is changed or deleted so the next request
+    reads the updated row from the database.
+
+    Parameters
+    ----------
+    user_id : int
+        The user primary key id number in the database.
+    """
+    get_user_cache().invalidate(user_id)
+
 @auth_bp.route('/register', methods=('GET', 'POST'))
 def register() -> Union[Response, str]:
     """The register view function.           
@@ -112,21 +259,39 @@ def login() -> Union[Response, str]:
 
 @auth_bp.before_app_request
 def load_logged_in_user():
-    """Check if a user_id is stored in the session, gets that user's data from the database 
-    and store it on g.user. 
+    """Check if a user_id is stored in the session, gets that user's data from the user cache
+    or the database and store it on g.user. 
 
     For any requested URL load_logged_in_user will be run. This allows a logged in user's
     information to be made available to other view functions. If there is no user_id, g.user
     will be None. 
+    Endpoints that never use g.user, such as static files, skip the lookup and g.user is None.
     """
     user_id = session.get('user_id')
-    if user_id is None:
+    if user_id is None or not user_required(request.endpoint):
         g.user = None
     else:
-        g.user = get_db().execute(
-            'SELECT * FROM user WHERE user_id = ?', 
-            (user_id,)
-        ).fetchone()
+        g.user = get_user(user_id)
+
+
+def user_required(endpoint: Optional[str]) -> bool:
+    """Return whether an endpoint's view function may use g.user.
+
+    Parameters
+    ----------
+    endpoint : Optional[str]
+        The endpoint name of the current request, None if no URL rule matched.
+
+    Returns
+    -------
+    bool
+        False for endpoints in USER_NOT_REQUIRED_ENDPOINTS or views decorated with
+        user_not_required; otherwise, True.
+    """
+    if endpoint in USER_NOT_REQUIRED_ENDPOINTS:
+        return False
+    view = current_app.view_functions.get(endpoint)
+    return not getattr(view, 'user_not_required', False)
 
 @auth_bp.route('/logout')
 def logout() -> Response:
@@ -137,6 +302,9 @@ def logout() -> Response:
     Returns:
         Response: _description_
     """
+    user_id = session.get('user_id')
+    if user_id is not None:
+        invalidate_user(user_id)
     session.clear()
     return redirect(url_for('index'))
 
@@ -162,3 +330,18 @@ def login_required(view) -> Union[Response, str]:
         return view(**kwargs)
 
     return wrapped_view
+
+
+def user_not_required(view):
+    """A decorator that marks a view function as never using g.user.
+
+    load_logged_in_user() will not look up the logged in user for requests to the view.
+
+    Args:
+        view (_type_): A view function.
+
+    Returns:
+        _type_: The same view function, marked as not requiring g.user.
+    """
+    view.user_not_required = True
+    return view
@@ -0,0 +1,193 @@
+"""
+Functions and classes used to checkpoint long fetches of a video's comments so they can be resumed.
+
+Every FETCH_CHECKPOINT_PAGES pages of commentThreads, the next page token and the comments fetched
+since the previous checkpoint are written to the fetch_checkpoint and fetch_checkpoint_chunk tables.
+Only the new comments are written, as a zlib compressed JSON chunk, so checkpointing a video takes
+time proportional to its comments rather than to the square of its pages. A fetch that fails part way,
+or that stops once the quota is spent, keeps its checkpoint and the next analysis of the video, by any
+worker, resumes from the checkpointed page instead of the first. A fetch that completes deletes its
+checkpoint, and checkpoints not updated for FETCH_CHECKPOINT_TTL seconds, whose page tokens may no longer
+be valid, are deleted when a fetch starts or completes.
+
+Only the most recent fetch of a video writes its checkpoint: a fetch that loads a checkpoint takes it
+over and a concurrent fetch of the same video stops checkpointing.
+
+Functions:
+- collect_checkpoints: Delete the checkpoints that have not been updated within their time to live.
+
+Classes:
+- FetchCheckpoint: The checkpoint of a fetch of a video's comments.
+"""
+import json
+import secrets
+import sqlite3
+import zlib
+from typing import List
+from flask import current_app
+from mlapp.db import get_db
+from mlapp.metrics import FETCH_CHECKPOINTS
+
+
+def collect_checkpoints(db: sqlite3.Connection, ttl: int) -> int:
+    """Delete the checkpoints that have not been updated within their time to live, and their chunks.
+
+    Parameters
+    ----------
+    db : Connection
+        The database connection.
+    ttl : int
+        The seconds a checkpoint is kept after it was last updated.
+
+    Returns
+    -------
+    int
+        The number of checkpoints deleted.
+    """
+    with db:
+        collected = db.execute("DELETE FROM fetch_checkpoint WHERE updated < datetime('now', ?)",
+                               (f"-{int(ttl)} seconds",)).rowcount
+        db.execute("DELETE FROM fetch_checkpoint_chunk WHERE video_id NOT IN (SELECT video_id FROM fetch_checkpoint)")
+    if collected:
+        FETCH_CHECKPOINTS.inc(collected, event="collected")
+    return collected
+
+
+class FetchCheckpoint(object):
+    """
+    The class represents the checkpoint of a fetch of a video's comments.
+
+    The checkpoint of a previous fetch of the video with the same mode is loaded, and taken over, when
+    it is created. Checkpointing is disabled when FETCH_CHECKPOINT_PAGES is 0 or the database was created
+    before the checkpoint tables were added.
+
+    Parameters
+    ----------
+    video_id : str
+        The YouTube video videoId.
+    mode : str
+        How the comments are fetched, such as "expanded" when every reply is fetched, as a checkpoint
+        of another mode holds different comments.
+
+    Attributes
+    ----------
+    page_token : Optional[str]
+        The token of the page to resume from, or None to start from the first page.
+    pages : int
+        The number of pages fetched before the checkpoint.
+    comments : List[str]
+        The comments fetched before the checkpoint.
+
+    Methods
+    -------
+    due(pages)
+        Return whether a checkpoint should be written after a number of pages.
+    save(page_token, pages, comments)
+        Write a checkpoint of the comments fetched since the previous checkpoint.
+    complete()
+        Delete the checkpoint of a fetch that has completed.
+    discard()
+        Delete the checkpoint and start from the first page.
+    """
+
+    def __init__(self, video_id: str, mode: str):
+        self.video_id = video_id
+        self.mode = mode
+        self.every_pages = current_app.config['FETCH_CHECKPOINT_PAGES']
+        self.ttl = current_app.config['FETCH_CHECKPOINT_TTL']
+        self.fetch_id = secrets.token_hex(8)
+        self.page_token = None
+        self.pages = 0
+        self.comments = []
+        self._saved_pages = 0
+        self._chunks = 0
+        self.db = get_db() if self.every_pages else None
+        if self.db is not None:
+            try:
+                self._load()
+            except sqlite3.OperationalError:
+                self.db = None
+
+    def _load(self):
+        collect_checkpoints(self.db, self.ttl)
+        with self.db:
+            row = self.db.execute("SELECT page_token, pages, mode FROM fetch_checkpoint WHERE video_id = ?",
+                                  (self.video_id,)).fetchone()
+            if row is None:
+                return
+            if row['mode'] != self.mode:
+                self._delete()
+                return
+            self.db.execute("UPDATE fetch_checkpoint SET fetch_id = ? WHERE video_id = ?", (self.fetch_id, self.video_id))
+            chunks = self.db.execute("SELECT comments FROM fetch_checkpoint_chunk WHERE video_id = ? ORDER BY chunk",
+                                     (self.video_id,)).fetchall()
+        for chunk in chunks:
+            self.comments.extend(json.loads(zlib.decompress(chunk['comments'])))
+        self.page_token = row['page_token']
+        self.pages = self._saved_pages = row['pages']
+        self._chunks = len(chunks)
+        FETCH_CHECKPOINTS.inc(event="resumed")
+
+    def _delete(self):
+        self.db.execute("DELETE FROM fetch_checkpoint WHERE video_id = ?", (self.video_id,))
+        self.db.execute("DELETE FROM fetch_checkpoint_chunk WHERE video_id = ?", (self.video_id,))
+
+    def due(self, pages: int) -> bool:
+        """Return whether a checkpoint should be written after a number of pages."""
+        return self.db is not None and pages - self._saved_pages >= self.every_pages
+
+    def save(self, page_token: str, pages: int, comments: List[str]):
+        """Write a checkpoint of the comments fetched since the previous checkpoint.
+
+        Checkpointing stops if another fetch of the video has taken over the checkpoint.
+
+        Parameters
+        ----------
+        page_token : str
+            The token of the next page.
+        pages : int
+            The number of pages fetched.
+        comments : List[str]
+            The comments fetched since the previous checkpoint.
+        """
+        chunk = zlib.compress(json.dumps(comments).encode(), 1)
+        with self.db:
+            if self._saved_pages:
+                taken_over = self.db.execute(
+                    "UPDATE fetch_checkpoint SET page_token = ?, pages = ?, updated = CURRENT_TIMESTAMP "
+                    "WHERE video_id = ? AND fetch_id = ?", (page_token, pages, self.video_id, self.fetch_id)
+                ).rowcount == 0
+            else:
+                self._delete()
+                self.db.execute("INSERT INTO fetch_checkpoint (video_id, fetch_id, mode, page_token, pages) "
+                                "VALUES (?, ?, ?, ?, ?)", (self.video_id, self.fetch_id, self.mode, page_token, pages))
+                taken_over = False
+            if not taken_over:
+                self.db.execute("INSERT INTO fetch_checkpoint_chunk (video_id, chunk, comments) VALUES (?, ?, ?)",
+                                (self.video_id, self._chunks, chunk))
+        if taken_over:
+            self.db = None
+            return
+        self._saved_pages = pages
+        self._chunks += 1
+        FETCH_CHECKPOINTS.inc(event="saved")
+
+    def complete(self):
+        """Delete the checkpoint of a fetch that has completed, and any expired checkpoints."""
+        if self.db is None:
+            return
+        with self.db:
+            if self.db.execute("DELETE FROM fetch_checkpoint WHERE video_id = ? AND fetch_id = ?",
+                               (self.video_id, self.fetch_id)).rowcount:
+                self.db.execute("DELETE FROM fetch_checkpoint_chunk WHERE video_id = ?", (self.video_id,))
+                FETCH_CHECKPOINTS.inc(event="completed")
+        collect_checkpoints(self.db, self.ttl)
+
+    def discard(self):
+        """Delete the checkpoint, such as when its page token is no longer valid, and start from the first page."""
+        if self.db is not None:
+            with self.db:
+                self._delete()
+        self.page_token = None
+        self.pages = self._saved_pages = self._chunks = 0
+        self.comments = []
@@ -0,0 +1,129 @@
+"""
+Functions used to compress responses with gzip or deflate.
+
+Responses with a Content-Type in COMPRESSION_MIMETYPES are compressed with the encoding the client
+prefers of those in its Accept-Encoding header. Responses whose whole body is in memory are only
+compressed if it is at least COMPRESSION_MIN_SIZE bytes; streamed responses, such as exports and
+files, are compressed chunk by chunk as they are sent, so they are never held in memory. Responses
+that already have a Content-Encoding, such as precompressed assets (See assets), are sent unchanged.
+
+Functions:
+- choose_encoding: Return the content coding the client prefers of those supported.
+- compress_stream: Compress an iterable of byte strings as it is iterated.
+- compress_response: Compress a response if the client accepts a supported encoding.
+- init_app: Register the response compression hook with the application instance.
+"""
+import zlib
+from typing import Iterable, Iterator, Optional
+from flask import current_app, request, Response
+
+# content coding -> the zlib wbits that write its header and trailer, in order of preference.
+ENCODINGS = {"gzip": 31, "deflate": 15}
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Return the content coding the client prefers of those supported.
+
+    Parameters
+    ----------
+    accept_encodings : Accept
+        The request's parsed Accept-Encoding header.
+
+    Returns
+    -------
+    Optional[str]
+        "gzip" or "deflate", or None if the client accepts neither.
+    """
+    qualities = {encoding: accept_encodings[encoding] for encoding in ENCODINGS}
+    encoding = max(qualities, key=lambda encoding: qualities[encoding])
+    return encoding if qualities[encoding] > 0 else None
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    """Compress an iterable of byte strings as it is iterated.
+
+    The iterable is closed when the compressed stream is finished or closed, as a WSGI server
+    would close the response's own iterable.
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        The byte strings to compress.
+    encoding : str
+        "gzip" or "deflate".
+    level : int
+        The zlib compression level.
+
+    Yields
+    ------
+    bytes
+        The compressed stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, ENCODINGS[encoding])
+    try:
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def compress_response(response: Response) -> Response:
+    """Compress a response if it is compressible and the client accepts gzip or deflate.
+
+    A strong ETag is made weak, as the compressed body is not byte for byte the body it was computed from.
+
+    Parameters
+    ----------
+    response : Response
+        The response of the request.
+
+    Returns
+    -------
+    Response
+        The response, compressed with a Content-Encoding header if it was compressed.
+    """
+    config = current_app.config
+    if (not config['COMPRESSION_ENABLED'] or response.status_code != 200 or request.method == "HEAD"
+            or "Content-Encoding" in response.headers or response.mimetype not in config['COMPRESSION_MIMETYPES']):
+        return response
+    # caches must store a response for each encoding whether or not this response is compressed.
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed or response.direct_passthrough:
+        if response.content_length is not None and response.content_length < config['COMPRESSION_MIN_SIZE']:
+            return response
+        chunks = response.response
+        response.response = compress_stream(response.iter_encoded(), encoding, config['COMPRESSION_LEVEL'])
+        if hasattr(chunks, "close"):
+            response.call_on_close(chunks.close)
+        response.direct_passthrough = False
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        compressor = zlib.compressobj(config['COMPRESSION_LEVEL'], zlib.DEFLATED, ENCODINGS[encoding])
+        response.set_data(compressor.compress(data) + compressor.flush())
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Register compress_response() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.after_request(compress_response)
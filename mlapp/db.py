@@ -14,6 +14,8 @@ import sqlite3
 from sqlite3 import Connection
 import click
 from flask import current_app, g
+from mlapp import query_stats
+from mlapp.query_stats import InstrumentedConnection
 
 def get_db() -> Connection:
     """Return the SQLite3 database connection.
@@ -26,6 +28,8 @@ def get_db() -> Connection:
     configuration key.
     Columns can be accessed by name as sqlite3.Row tells the connection to return rows that
     act similarly to dictionaries.
+    If the DB_INSTRUMENTATION configuration key is set, the connection is an InstrumentedConnection
+    that records the timing, row count and call site of every statement (See query_stats).
 
     Returns
     -------
@@ -35,7 +39,8 @@ def get_db() -> Connection:
     if 'db' not in g:
         g.db = sqlite3.connect(
             current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            factory=InstrumentedConnection if current_app.config['DB_INSTRUMENTATION'] else Connection
         )
         g.db.row_factory = sqlite3.Row
     return g.db
@@ -55,11 +60,17 @@ def close_db(e=None):
 
 def init_db():
     """Initialise the SQLite3 database.
+
+    Any cached user rows and classifications are cleared as their tables are recreated.
     """
     db = get_db()
 
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
+    user_cache = current_app.extensions.get('user_cache')
+    if user_cache is not None:
+        user_cache.clear()
+    current_app.extensions.pop('classifications', None)
 
 
 @click.command('init-db')
@@ -73,10 +84,12 @@ def init_app(app):
     """Register the close_db() and init_db_command() with the application instance. 
 
     close_db() will be called after a response and init_db_command() will add a new command
-    that can be called with the 'flask' command
+    that can be called with the 'flask' command. The query instrumentation hooks and
+    query-stats command are also registered.
 
     Args:
         app (Flask): A Flask application instance.
     """
     app.teardown_appcontext(close_db)
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    app.cli.add_command(init_db_command)
+    query_stats.init_app(app)
\ No newline at end of file
@@ -0,0 +1,399 @@
+"""
+This module contains a Blueprint to register view functions that export issues and analysed comments,
+and a matching Click command.
+
+Rows are read from the database cursor in batches with fetchmany and written through generators,
+so the memory used by an export does not grow with the number of exported rows.
+
+Functions:
+- export_issues: View function used to stream issues as CSV or JSON Lines.
+- export_analysis: View function used to stream analysed comments as CSV or JSON Lines.
+- get_export_format: Return the export format from the request.
+- make_export_response: Return a streamed Response for encoded export records.
+- validate_dates: Check export filter dates are YYYY-MM-DD dates.
+- query_issues: Return a cursor over the issues matching the export filters.
+- iter_rows: Yield rows from a cursor in batches using fetchmany.
+- iter_analysed_comments: Yield analysed comment rows from comments and their predictions.
+- iter_records: Yield rows encoded as CSV or JSON Lines.
+- gzip_stream: Yield gzip compressed chunks of a stream of bytes.
+- export_issues_command: Click command used to export issues to a file or stdout.
+- init_app: Register the export Click command with the application instance.
+"""
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date
+from sqlite3 import Cursor
+from typing import Iterable, Iterator, List, Optional
+import click
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from flask.cli import with_appcontext
+from numpy import ndarray
+from googleapiclient.errors import HttpError
+from mlapp.db import get_db
+from mlapp.auth import login_required
+from mlapp.protected import (
+    get_comments, predict_comments, calculate_prediction_confidence, classify_prediction
+)
+
+export_bp = Blueprint('export', __name__, url_prefix='/export')
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+ISSUE_COLUMNS = ["issue_id", "comment", "issue", "date_created", "author_id", "email", "classification"]
+ANALYSIS_COLUMNS = ["comment_number", "comment", "prediction_value", "prediction_confidence",
+                    "classification_id", "classification"]
+
+
+@export_bp.route('/issues', methods=["GET"])
+@login_required
+def export_issues() -> Response:
+    """The export issues view function.
+
+    Streams the issues matching the "start", "end", "author" and "classification" query parameters
+    in the format given by the "format" query parameter, csv by default.
+    An invalid "start" or "end" date aborts with a 400 status code.
+    If the "gzip" query parameter is set the export is sent as a gzip file.
+
+    Returns
+    -------
+    Response
+        A streamed Response of the exported issues.
+    """
+    export_format = get_export_format()
+    filters = {name: request.args.get(name) for name in ("start", "end", "author", "classification")}
+    try:
+        validate_dates(filters["start"], filters["end"])
+    except ValueError as e:
+        abort(400, e.args[0])
+
+    def generate_records():
+        # the query is executed by the generator so it runs on the connection of the streamed context.
+        cursor = query_issues(**filters)
+        rows = iter_rows(cursor, current_app.config['EXPORT_BATCH_SIZE'])
+        yield from iter_records(rows, ISSUE_COLUMNS, export_format)
+
+    return make_export_response(generate_records(), "issues", export_format)
+
+
+@export_bp.route('/analysis/<string:source>', methods=["POST"])
+@login_required
+def export_analysis(source: str) -> Response:
+    """The export analysis view function.
+
+    Analyses comments in the same way as analyse_comments and streams each analysed comment
+    in the format given by the "format" query parameter, csv by default.
+    The "classification" query parameter restricts the export to one classification and
+    if the "gzip" query parameter is set the export is sent as a gzip file.
+
+    Parameters
+    ----------
+    source : str
+        How comment(s) are retieved during the request.
+        Current options are from a YouTube video using the YouTube API or a manual text input.
+
+    Returns
+    -------
+    Response
+        A streamed Response of the analysed comments.
+    """
+    export_format = get_export_format()
+    try:
+        comments = get_comments(source, request.form['input'])
+        predictions = predict_comments(comments)
+    except HttpError as e:
+        abort(502, f"An error occured while retrieving YouTube comments: {e.status_code}")
+    except (ValueError, OSError) as e:
+        abort(400, e.args[0])
+    rows = iter_analysed_comments(predictions, comments, request.args.get("classification"))
+    return make_export_response(iter_records(rows, ANALYSIS_COLUMNS, export_format),
+                                "analysis", export_format)
+
+
+def get_export_format() -> str:
+    """Return the export format from the request's "format" query parameter.
+
+    Returns
+    -------
+    str
+        The export format, either "csv" or "jsonl".
+    """
+    export_format = request.args.get("format", default="csv")
+    if export_format not in EXPORT_FORMATS:
+        abort(400, f"Unknown export format '{export_format}'.")
+    return export_format
+
+
+def make_export_response(records: Iterator[bytes], name: str, export_format: str) -> Response:
+    """Return a streamed Response for encoded export records.
+
+    The request context is kept for the generator so the database connection stays open
+    until the last row has been streamed.
+
+    Parameters
+    ----------
+    records : Iterator[bytes]
+        The encoded export records.
+    name : str
+        The name of the exported file without an extension.
+    export_format : str
+        The export format, either "csv" or "jsonl".
+
+    Returns
+    -------
+    Response
+        A streamed Response sent as an attachment.
+    """
+    filename = f"{name}.{export_format}"
+    mimetype = EXPORT_FORMATS[export_format]
+    if request.args.get("gzip", type=int):
+        records = gzip_stream(records)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    response = Response(stream_with_context(records), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def validate_dates(*dates: Optional[str]):
+    """Check each date is either None, empty or a YYYY-MM-DD date.
+
+    Raises
+    ------
+    ValueError
+        Raised if a date is not a YYYY-MM-DD date.
+    """
+    for value in dates:
+        if value:
+            date.fromisoformat(value)
+
+
+def query_issues(start: Optional[str] = None, end: Optional[str] = None,
+                 author: Optional[str] = None, classification: Optional[str] = None) -> Cursor:
+    """Return a cursor over the issues matching the export filters.
+
+    The issues are not fetched; the caller is expected to iterate the cursor in batches.
+
+    Parameters
+    ----------
+    start : Optional[str], optional
+        Only issues created on or after this YYYY-MM-DD date, by default None.
+    end : Optional[str], optional
+        Only issues created on or before this YYYY-MM-DD date, by default None.
+    author : Optional[str], optional
+        Only issues raised by the user with this email address, by default None.
+    classification : Optional[str], optional
+        Only issues with this classification name, by default None.
+
+    Returns
+    -------
+    Cursor
+        A SQLite3 Cursor over the matching issues ordered by issue_id.
+
+    Raises
+    ------
+    ValueError
+        Raised if start or end is not a YYYY-MM-DD date.
+    """
+    conditions = []
+    parameters = []
+    if start:
+        conditions.append("date(i.date_created) >= ?")
+        parameters.append(date.fromisoformat(start).isoformat())
+    if end:
+        conditions.append("date(i.date_created) <= ?")
+        parameters.append(date.fromisoformat(end).isoformat())
+    if author:
+        conditions.append("u.email = ?")
+        parameters.append(author)
+    if classification:
+        conditions.append("c.classification = ?")
+        parameters.append(classification)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return get_db().execute(
+        f"SELECT i.issue_id, i.comment, i.issue, i.date_created, i.author_id, \
+        u.email, c.classification \
+        FROM issue AS i \
+        INNER JOIN user AS u ON i.author_id = u.user_id \
+        INNER JOIN classification AS c ON i.classified_id = c.classification_id \
+        {where} \
+        ORDER BY i.issue_id",
+        parameters
+    )
+
+
+def iter_rows(cursor: Cursor, batch_size: int) -> Iterator[tuple]:
+    """Yield rows from a cursor in batches using fetchmany.
+
+    Parameters
+    ----------
+    cursor : Cursor
+        A SQLite3 Cursor of an executed query.
+    batch_size : int
+        The number of rows fetched at a time.
+
+    Yields
+    ------
+    tuple
+        Each row of the query.
+    """
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def iter_analysed_comments(predictions: ndarray, comments: List[str], classification: Optional[str] = None,
+                           prediction_threshold: float = 0.5) -> Iterator[tuple]:
+    """Yield analysed comment rows from comments and their predictions.
+
+    Unlike combine_analysed_data, no dictionary of every analysed comment is built and the
+    classifications are only looked up once.
+
+    Parameters
+    ----------
+    predictions : ndarray
+        A NumPy array of the TensorFlow model's predictions for the comments.
+    comments : List[str]
+        A list of comments as strings.
+    classification : Optional[str], optional
+        Only yield comments with this classification name, by default None.
+    prediction_threshold : float, optional
+        Any TensorFlow model prediction values equal to or greater than the prediction_threshold
+        are classified as "Misinformation", by default 0.5.
+
+    Yields
+    ------
+    tuple
+        The comment number, comment, prediction value, prediction confidence,
+        classification_id and classification of each comment.
+
+    Raises
+    ------
+    ValueError
+        Raised if the number of predictions does not match the number of comments.
+    """
+    if predictions.size != len(comments):
+        raise ValueError("The number of prediction values does not match the number of comments!")
+    classifications = {}
+    for prediction_number, (prediction, comment) in enumerate(zip(predictions, comments)):
+        prediction_value = round(prediction[0].item(), 3)
+        # classify_prediction only depends on which side of the threshold the prediction is.
+        key = prediction_value >= prediction_threshold
+        if key not in classifications:
+            classifications[key] = classify_prediction(prediction_value, prediction_threshold)
+        classification_id, classification_name = classifications[key]
+        if classification and classification != classification_name:
+            continue
+        yield (prediction_number + 1, comment, prediction_value,
+               calculate_prediction_confidence(prediction_value, prediction_threshold),
+               classification_id, classification_name)
+
+
+def iter_records(rows: Iterable[tuple], columns: List[str], export_format: str) -> Iterator[bytes]:
+    """Yield rows encoded as CSV or JSON Lines.
+
+    Parameters
+    ----------
+    rows : Iterable[tuple]
+        The rows to encode, with values in the same order as columns.
+    columns : List[str]
+        The column names.
+    export_format : str
+        The export format, either "csv" or "jsonl".
+
+    Yields
+    ------
+    bytes
+        The UTF-8 encoded header, for CSV, and each encoded row.
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= 8192:
+                yield buffer.getvalue().encode("utf8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf8")
+    else:
+        for row in rows:
+            # default=str writes timestamps in the same format as the CSV export.
+            record = json.dumps(dict(zip(columns, row)), default=str)
+            yield (record + "\n").encode("utf8")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Yield gzip compressed chunks of a stream of bytes.
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        The uncompressed stream.
+    level : int, optional
+        The zlib compression level, by default 6.
+
+    Yields
+    ------
+    bytes
+        The gzip compressed stream.
+    """
+    # wbits=31 writes a gzip header and trailer.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@click.command('export-issues')
+@click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='The file to write to, by default stdout.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip compress the export.')
+@click.option('--start', default=None, help='Only issues created on or after this YYYY-MM-DD date.')
+@click.option('--end', default=None, help='Only issues created on or before this YYYY-MM-DD date.')
+@click.option('--author', default=None, help='Only issues raised by this email address.')
+@click.option('--classification', default=None, help='Only issues with this classification.')
+@with_appcontext
+def export_issues_command(export_format, output, compress, start, end, author, classification):
+    """Export issues as CSV or JSON Lines.
+    """
+    try:
+        validate_dates(start, end)
+    except ValueError as e:
+        raise click.BadParameter(e.args[0])
+    cursor = query_issues(start=start, end=end, author=author, classification=classification)
+    records = iter_records(iter_rows(cursor, current_app.config['EXPORT_BATCH_SIZE']),
+                           ISSUE_COLUMNS, export_format)
+    if compress:
+        records = gzip_stream(records)
+    f = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for record in records:
+            f.write(record)
+    finally:
+        if output:
+            f.close()
+
+
+def init_app(app):
+    """Register the export_issues_command() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.cli.add_command(export_issues_command)
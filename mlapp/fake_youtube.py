@@ -0,0 +1,605 @@
+"""
+A local stand-in for the YouTube Data API used to test and load test comment retrieval offline.
+
+The server implements commentThreads.list and comments.list, with pagination tokens,
+totalReplyCount, the at most 5 replies included in a commentThread, API key checks, a
+request quota, configurable latency and injected errors, either a random fraction of 503
+backendErrors or errors queued with fail(). Like the real API, responses are projected to the
+fields parameter's partial response selection, such as "nextPageToken,items(id,snippet/videoId)",
+and gzip compressed for clients that accept it. Errors are returned in the YouTube Data API's
+error format so that googleapiclient raises the same HttpErrors as for the real API.
+
+Videos are either replayed from JSON fixtures recorded from the real API with the
+fake-youtube record command, or synthesised from their videoId:
+- synthetic-<N>: a video with N deterministic commentThreads.
+- empty-<anything>: a video without comments.
+- disabled-<anything>: a video with comments disabled.
+Any other videoId that is not a fixture is not found.
+
+The application's YouTube API client is pointed at the server by setting the YOUTUBE_API_URL
+configuration value to the server's URL.
+
+Functions:
+- synthesise_video: Return deterministic commentThreads for a synthetic video.
+- record_video: Return every commentThread and reply of a video retrieved from the YouTube Data API.
+- fake_youtube_command: Click command group used to run the server and record fixtures.
+- serve_command: Click command used to run the server.
+- record_command: Click command used to record a video's comments as a fixture.
+- init_app: Register the Click commands with the application instance.
+
+Classes:
+- Thread: A commentThread and all of its replies.
+- FakeYouTubeServer: An HTTP server implementing the commentThreads and comments resources.
+"""
+import base64
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+import click
+from flask.cli import with_appcontext
+from mlapp.protected import build_youtube_client
+
+logger = logging.getLogger(__name__)
+
+# commentThreads only include the first replies of a thread; the rest are listed by comments.list.
+INLINE_REPLIES = 5
+_SYNTHETIC_VIDEO = re.compile(r"^synthetic-(\d+)$")
+# the domain and message of the errors that can be injected, keyed by reason.
+_INJECTED_ERRORS = {
+    "backendError": ("global", "Backend Error"),
+    "internalError": ("global", "Internal Error"),
+    "rateLimitExceeded": ("usageLimits", "The request cannot be completed due to rate limiting."),
+    "quotaExceeded": ("youtube.quota", "The request cannot be completed because you have exceeded your quota."),
+}
+_WORDS = ("the", "video", "this", "is", "not", "true", "great", "vaccine", "study", "people", "they",
+          "say", "fake", "news", "science", "really", "why", "would", "anyone", "believe", "source",
+          "data", "government", "lol", "agree", "wrong", "proof", "watch", "again", "thanks")
+
+
+class Thread(NamedTuple):
+    """
+    The class represents a commentThread and all of its replies.
+
+    Attributes
+    ----------
+    comment : Dict
+        The top level comment resource.
+    replies : List[Dict]
+        The reply comment resources, oldest first.
+    """
+    comment: Dict
+    replies: List[Dict]
+
+
+def _comment(comment_id: str, video_id: str, text: str, published: str, parent_id: Optional[str] = None) -> Dict:
+    """Return a comment resource."""
+    snippet = {
+        "videoId": video_id,
+        "textDisplay": text,
+        "textOriginal": text,
+        "authorDisplayName": f"@user{zlib.crc32(comment_id.encode()) % 10000}",
+        "canRate": True,
+        "viewerRating": "none",
+        "likeCount": 0,
+        "publishedAt": published,
+        "updatedAt": published,
+    }
+    if parent_id is not None:
+        snippet["parentId"] = parent_id
+    return {"kind": "youtube#comment", "etag": comment_id, "id": comment_id, "snippet": snippet}
+
+
+def synthesise_video(video_id: str, threads: int, reply_rate: float = 0.2,
+                     max_replies: int = 12, seed: int = 0) -> List[Thread]:
+    """Return deterministic commentThreads for a synthetic video.
+
+    Parameters
+    ----------
+    video_id : str
+        The videoId of the synthetic video.
+    threads : int
+        The number of commentThreads.
+    reply_rate : float, optional
+        The fraction of commentThreads with replies, by default 0.2.
+    max_replies : int, optional
+        The maximum number of replies of a commentThread, by default 12.
+    seed : int, optional
+        The random seed, combined with the videoId, by default 0.
+
+    Returns
+    -------
+    List[Thread]
+        The commentThreads, newest first.
+    """
+    rng = random.Random(f"{seed}:{video_id}")
+
+    def text():
+        return " ".join(rng.choices(_WORDS, k=max(1, int(rng.lognormvariate(2.5, 0.9))))).capitalize()
+
+    result = []
+    for number in range(threads):
+        thread_id = f"Ug{video_id}.{number}"
+        published = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1672531200 + (threads - number) * 60))
+        replies = rng.randint(1, max_replies) if rng.random() < reply_rate else 0
+        result.append(Thread(
+            _comment(thread_id, video_id, text(), published),
+            [_comment(f"{thread_id}.{reply}", video_id, text(), published, thread_id) for reply in range(replies)]
+        ))
+    return result
+
+
+def _encode_token(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+
+def _decode_token(token: str) -> int:
+    """Return the offset of a page token, raising ValueError if the token is invalid."""
+    try:
+        prefix, offset = base64.urlsafe_b64decode(token.encode()).decode().split(":")
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(token)
+    if prefix != "offset" or not offset.isdigit():
+        raise ValueError(token)
+    return int(offset)
+
+
+class _ApiError(Exception):
+    """An error returned in the YouTube Data API's error format."""
+
+    def __init__(self, status: int, reason: str, message: str, domain: str = "youtube.commentThread"):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": {"code": status, "message": message,
+                               "errors": [{"message": message, "domain": domain, "reason": reason}]}}
+
+
+def _parse_fields(fields: str) -> Optional[Dict]:
+    """Return the tree of fields selected by a fields parameter.
+
+    The tree maps each selected field to the tree of its selected sub-fields, or to None if all of its
+    sub-fields are selected.
+
+    Raises
+    ------
+    _ApiError
+        Raised if the fields parameter is not a valid selection.
+    """
+    tokens = re.findall(r"[^,/()\s]+|[,/()]", fields)
+    position = 0
+
+    def invalid():
+        return _ApiError(400, "invalidParameter", f"Invalid field selection {fields}", "global")
+
+    def merge(tree: Dict, name: str, subtree: Optional[Dict]):
+        if name in tree and (tree[name] is None or subtree is None):
+            tree[name] = None
+        elif name in tree:
+            for child, grandchildren in subtree.items():
+                merge(tree[name], child, grandchildren)
+        else:
+            tree[name] = subtree
+
+    def selection() -> Dict:
+        nonlocal position
+        tree = {}
+        while True:
+            name, subtree = field()
+            merge(tree, name, subtree)
+            if position < len(tokens) and tokens[position] == ",":
+                position += 1
+            else:
+                return tree
+
+    def field() -> Tuple[str, Optional[Dict]]:
+        nonlocal position
+        if position >= len(tokens) or tokens[position] in ",/()":
+            raise invalid()
+        name = tokens[position]
+        position += 1
+        if position < len(tokens) and tokens[position] == "/":
+            position += 1
+            child, subtree = field()
+            return name, {child: subtree}
+        if position < len(tokens) and tokens[position] == "(":
+            position += 1
+            subtree = selection()
+            if position >= len(tokens) or tokens[position] != ")":
+                raise invalid()
+            position += 1
+            return name, subtree
+        return name, None
+
+    tree = selection()
+    if position != len(tokens):
+        raise invalid()
+    return tree
+
+
+def _project(value, tree: Optional[Dict]):
+    """Return the fields of a value selected by a tree of fields, applying the selection to each item of a list."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {name: _project(value[name], subtree) for name, subtree in tree.items() if name in value}
+    return value
+
+
+class _FakeYouTubeHandler(BaseHTTPRequestHandler):
+    """Request handler of the FakeYouTubeServer."""
+
+    server: "FakeYouTubeServer"
+    # keep connections open between requests, as the YouTube Data API does.
+    protocol_version = "HTTP/1.1"
+    # send the headers and body of small responses without waiting for the client to acknowledge the headers.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            self.server.before_request(query.get("key"))
+            if url.path == "/youtube/v3/commentThreads":
+                body = self.server.list_comment_threads(query)
+            elif url.path == "/youtube/v3/comments":
+                body = self.server.list_comments(query)
+            else:
+                raise _ApiError(404, "notFound", f"{url.path} is not implemented by the fake YouTube API.", "global")
+            if query.get("fields"):
+                body = _project(body, _parse_fields(query["fields"]))
+            status = 200
+        except _ApiError as e:
+            status, body = e.status, e.body
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, 6)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class FakeYouTubeServer(ThreadingHTTPServer):
+    """
+    The class represents an HTTP server implementing the YouTube Data API's commentThreads and comments resources.
+
+    The server can be run in a background thread with start() or as a context manager.
+
+    Parameters
+    ----------
+    address : Tuple[str, int], optional
+        The host and port to listen on, by default ("127.0.0.1", 0) for any free port.
+    fixtures : str, optional
+        A directory of <videoId>.json fixtures recorded by record_video(), by default None.
+    api_key : str, optional
+        The only API key accepted, by default None to accept any key.
+    quota : int, optional
+        The number of requests allowed before quotaExceeded errors are returned, by default None for no quota.
+    latency : float, optional
+        Seconds each request is delayed by, by default 0.
+    jitter : float, optional
+        Maximum random seconds added to the latency, by default 0.
+    error_rate : float, optional
+        The fraction of requests that fail with a 503 backendError, by default 0.
+    reply_rate : float, optional
+        The fraction of synthetic commentThreads with replies, by default 0.2.
+    seed : int, optional
+        The random seed of synthetic videos, by default 0.
+
+    Attributes
+    ----------
+    requests : int
+        The number of requests served, which is the quota used.
+    resource_requests : Counter
+        The number of requests served for each resource, "commentThreads" and "comments".
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), fixtures: Optional[str] = None,
+                 api_key: Optional[str] = None, quota: Optional[int] = None, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, reply_rate: float = 0.2, seed: int = 0):
+        super().__init__(address, _FakeYouTubeHandler)
+        self.fixtures = fixtures
+        self.api_key = api_key
+        self.quota = quota
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reply_rate = reply_rate
+        self.seed = seed
+        self.requests = 0
+        self.resource_requests = Counter()
+        # the (status, reason) of errors returned by the next requests, queued by fail().
+        self._failures = deque()
+        self._videos = {}
+        # replies keyed by the id of their top level comment, for comments.list.
+        self._replies = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server, used as the YOUTUBE_API_URL configuration value."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> str:
+        """Serve requests in a background thread.
+
+        Returns
+        -------
+        str
+            The base URL of the server.
+        """
+        # a short poll interval so that stop() returns quickly.
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), name="fake-youtube", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """Stop serving requests and close the server's socket.
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> "FakeYouTubeServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail(self, status: int, reason: str, count: int = 1):
+        """Return an error to the next requests, after their API key and quota are checked.
+
+        Parameters
+        ----------
+        status : int
+            The status code, such as 500, 503 or 403.
+        reason : str
+            The reason: "backendError", "internalError", "rateLimitExceeded" or "quotaExceeded".
+        count : int, optional
+            The number of requests that fail, by default 1.
+        """
+        with self._lock:
+            self._failures.extend([(status, reason)] * count)
+
+    def before_request(self, key: Optional[str]):
+        """Check the API key and quota of a request, apply the configured latency and return injected errors."""
+        if self.api_key is not None and key != self.api_key:
+            raise _ApiError(400, "keyInvalid", "API key not valid. Please pass a valid API key.", "usageLimits")
+        with self._lock:
+            if self.quota is not None and self.requests >= self.quota:
+                raise _ApiError(403, "quotaExceeded", "The request cannot be completed because you have "
+                                "exceeded your quota.", "youtube.quota")
+            self.requests += 1
+            failure = self._failures.popleft() if self._failures else None
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if failure is None and self.error_rate and random.random() < self.error_rate:
+            failure = (503, "backendError")
+        if failure is not None:
+            status, reason = failure
+            domain, message = _INJECTED_ERRORS[reason]
+            raise _ApiError(status, reason, message, domain)
+
+    def get_video(self, video_id: str) -> List[Thread]:
+        """Return the commentThreads of a fixture or synthetic video.
+
+        Raises
+        ------
+        _ApiError
+            Raised if the video is not found or has comments disabled.
+        """
+        with self._lock:
+            if video_id in self._videos:
+                return self._videos[video_id]
+        path = os.path.join(self.fixtures, f"{os.path.basename(video_id)}.json") if self.fixtures else None
+        synthetic = _SYNTHETIC_VIDEO.match(video_id)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                threads = [Thread(thread["comment"], thread["replies"]) for thread in json.load(f)["threads"]]
+        elif synthetic:
+            threads = synthesise_video(video_id, int(synthetic.group(1)), self.reply_rate, seed=self.seed)
+        elif video_id.startswith("empty-"):
+            threads = []
+        elif video_id.startswith("disabled-"):
+            raise _ApiError(403, "commentsDisabled", "The video identified by the videoId parameter has "
+                            "disabled comments.")
+        else:
+            raise _ApiError(404, "videoNotFound", "The video identified by the videoId parameter could not be found.")
+        with self._lock:
+            threads = self._videos.setdefault(video_id, threads)
+            for thread in threads:
+                self._replies[thread.comment["id"]] = thread.replies
+            return threads
+
+    @staticmethod
+    def _page(query: Dict[str, str], items: list) -> Tuple[list, Optional[str]]:
+        """Return the page of items selected by the maxResults and pageToken parameters and the next page token."""
+        try:
+            max_results = int(query.get("maxResults", 20))
+        except ValueError:
+            max_results = 0
+        if not 1 <= max_results <= 100:
+            raise _ApiError(400, "invalidParameter", "The maxResults parameter must be between 1 and 100.", "youtube.parameter")
+        try:
+            offset = _decode_token(query["pageToken"]) if query.get("pageToken") else 0
+        except ValueError:
+            raise _ApiError(400, "invalidPageToken", "The pageToken parameter specifies an invalid page token.")
+        end = offset + max_results
+        return items[offset:end], _encode_token(end) if end < len(items) else None
+
+    @staticmethod
+    def _parts(query: Dict[str, str]) -> List[str]:
+        parts = [part.strip() for part in query.get("part", "").split(",") if part.strip()]
+        if not parts:
+            raise _ApiError(400, "missingRequiredParameter", "No filter selected. Expected one of: part", "youtube.parameter")
+        return parts
+
+    def list_comment_threads(self, query: Dict[str, str]) -> Dict:
+        """Return a commentThreads.list response for the videoId parameter."""
+        self.resource_requests["commentThreads"] += 1
+        parts = self._parts(query)
+        if "videoId" not in query:
+            raise _ApiError(400, "missingRequiredParameter", "No filter selected. Expected one of: videoId, "
+                            "allThreadsRelatedToChannelId, id", "youtube.parameter")
+        video_id = query["videoId"]
+        threads, next_page_token = self._page(query, self.get_video(video_id))
+        items = []
+        for thread in threads:
+            item = {"kind": "youtube#commentThread", "etag": thread.comment["id"], "id": thread.comment["id"]}
+            if "snippet" in parts:
+                item["snippet"] = {"channelId": "", "videoId": video_id, "topLevelComment": thread.comment,
+                                   "canReply": True, "totalReplyCount": len(thread.replies), "isPublic": True}
+            if "replies" in parts and thread.replies:
+                item["replies"] = {"comments": thread.replies[:INLINE_REPLIES]}
+            items.append(item)
+        return self._response("youtube#commentThreadListResponse", items, query, next_page_token)
+
+    def list_comments(self, query: Dict[str, str]) -> Dict:
+        """Return a comments.list response of the replies to the parentId parameter."""
+        self.resource_requests["comments"] += 1
+        self._parts(query)
+        parent_id = query.get("parentId")
+        if parent_id is None:
+            raise _ApiError(400, "missingRequiredParameter", "No filter selected. Expected one of: parentId, id",
+                            "youtube.parameter")
+        if parent_id not in self._replies and _SYNTHETIC_VIDEO.match(parent_id[2:].rsplit(".", 1)[0]):
+            # a reply to a synthetic video that has not been listed yet.
+            self.get_video(parent_id[2:].rsplit(".", 1)[0])
+        replies = self._replies.get(parent_id)
+        if replies is None:
+            raise _ApiError(404, "commentNotFound", "One or more of the comments identified by the parentId "
+                            "parameter could not be found.", "youtube.comment")
+        items, next_page_token = self._page(query, replies)
+        return self._response("youtube#commentListResponse", items, query, next_page_token)
+
+    @staticmethod
+    def _response(kind: str, items: list, query: Dict[str, str], next_page_token: Optional[str]) -> Dict:
+        response = {"kind": kind, "etag": kind}
+        if next_page_token is not None:
+            response["nextPageToken"] = next_page_token
+        response["pageInfo"] = {"totalResults": len(items), "resultsPerPage": int(query.get("maxResults", 20))}
+        response["items"] = items
+        return response
+
+
+def record_video(youtube, video_id: str) -> Dict:
+    """Return every commentThread and reply of a video retrieved from the YouTube Data API.
+
+    Replies that are not included in their commentThread are retrieved with comments.list.
+
+    Parameters
+    ----------
+    youtube : Resource
+        A YouTube Data API client.
+    video_id : str
+        The YouTube video videoId.
+
+    Returns
+    -------
+    Dict
+        The fixture, with the videoId and a list of threads with their comment and replies.
+    """
+    threads = []
+    page_token = None
+    while True:
+        response = youtube.commentThreads().list(part="snippet,replies", videoId=video_id, maxResults=100,
+                                                 pageToken=page_token).execute()
+        for item in response["items"]:
+            replies = item.get("replies", {}).get("comments", [])
+            if item["snippet"]["totalReplyCount"] > len(replies):
+                replies, reply_token = [], None
+                while True:
+                    reply_page = youtube.comments().list(part="snippet", parentId=item["id"], maxResults=100,
+                                                         pageToken=reply_token).execute()
+                    replies.extend(reply_page["items"])
+                    reply_token = reply_page.get("nextPageToken")
+                    if not reply_token:
+                        break
+            threads.append({"comment": item["snippet"]["topLevelComment"], "replies": replies})
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return {"videoId": video_id, "threads": threads}
+
+
+@click.group('fake-youtube')
+def fake_youtube_command():
+    """Run a local fake YouTube Data API or record fixtures for it.
+    """
+
+
+@fake_youtube_command.command('serve')
+@click.option('--host', default='127.0.0.1', help='The interface to listen on.')
+@click.option('--port', type=int, default=8081, help='The port to listen on.')
+@click.option('--fixtures', type=click.Path(file_okay=False), help='A directory of recorded <videoId>.json fixtures.')
+@click.option('--api-key', help='The only API key accepted; any key is accepted if unset.')
+@click.option('--quota', type=int, help='The number of requests allowed before quotaExceeded errors.')
+@click.option('--latency', type=float, default=0.0, help='Milliseconds each request is delayed by.')
+@click.option('--jitter', type=float, default=0.0, help='Maximum random milliseconds added to the latency.')
+@click.option('--error-rate', type=float, default=0.0, help='The fraction of requests failing with a 503 backendError.')
+def serve_command(host: str, port: int, fixtures: str, api_key: str, quota: int, latency: float, jitter: float,
+                  error_rate: float):
+    """Run the fake YouTube Data API until interrupted.
+
+    Point the application at it by setting YOUTUBE_API_URL to the printed URL.
+    """
+    server = FakeYouTubeServer((host, port), fixtures=fixtures, api_key=api_key, quota=quota,
+                               latency=latency / 1000, jitter=jitter / 1000, error_rate=error_rate)
+    click.echo(f'Fake YouTube Data API listening on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@fake_youtube_command.command('record')
+@click.argument('video_id')
+@click.option('--fixtures', type=click.Path(file_okay=False), default='fixtures',
+              help='The directory the <videoId>.json fixture is written to.')
+@with_appcontext
+def record_command(video_id: str, fixtures: str):
+    """Record the comments of a YouTube video as a fixture using the configured YouTube API.
+    """
+    fixture = record_video(build_youtube_client(), video_id)
+    os.makedirs(fixtures, exist_ok=True)
+    path = os.path.join(fixtures, f'{video_id}.json')
+    with open(path, 'w') as f:
+        json.dump(fixture, f)
+    click.echo(f'Recorded {len(fixture["threads"])} comment threads to {path}.')
+
+
+def init_app(app):
+    """Register fake_youtube_command() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.cli.add_command(fake_youtube_command)
@@ -0,0 +1,180 @@
+"""
+Functions and classes used to cache rendered template fragments and to return conditional responses.
+
+Issues are viewed far more often than they change, so the rendered issue lists of the analyser and
+account pages are cached in the memory of each process. A fragment's cache key includes the current
+generation of the issues, a counter in the cache_generation table that SQLite triggers increment
+whenever an issue is inserted, updated or deleted (See schema.sql). A change to any issue therefore
+invalidates the fragments cached by every worker process, as each reads the generation from the
+shared database on every request, and fragments of older generations are evicted as the least
+recently used.
+
+Pages are returned with an ETag so a browser revalidating an unchanged page is sent a 304 Not Modified response.
+
+Functions:
+- get_fragment_cache: Return the application's fragment cache.
+- get_generation: Return the generation of a cached table.
+- cached_fragment: Return a rendered fragment from the cache, rendering and storing it on a cache miss.
+- skip_fragment_cache: Prevent the fragment being rendered from being cached.
+- conditional_response: Return a response with an ETag, or 304 Not Modified if the client has the same page.
+
+Classes:
+- FragmentCache: A thread-safe LRU cache of rendered fragments.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+from flask import current_app, g, make_response, request, Response
+from markupsafe import Markup
+from mlapp.db import get_db
+from mlapp.metrics import CACHE_REQUESTS
+
+
+class FragmentCache(object):
+    """
+    The class represents a thread-safe LRU cache of rendered fragments.
+
+    Methods
+    -------
+    get(key)
+        Return a cached fragment or None if it is missing.
+    set(key, fragment)
+        Store a fragment.
+    clear()
+        Remove all fragments.
+    """
+
+    def __init__(self, maxsize: int):
+        """
+        Constructor for the FragmentCache class.
+
+        Parameters
+        ----------
+        maxsize : int
+            The maximum number of fragments cached.
+        """
+        self.maxsize = maxsize
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Markup]:
+        """Return a cached fragment or None if it is missing."""
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+            return fragment
+
+    def set(self, key: Hashable, fragment: Markup):
+        """Store a fragment, evicting the least recently used fragment if the cache is full."""
+        with self._lock:
+            self._fragments[key] = fragment
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.maxsize:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        """Remove all fragments."""
+        with self._lock:
+            self._fragments.clear()
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+
+def get_fragment_cache() -> FragmentCache:
+    """Return the application's fragment cache, creating it on first use.
+
+    Returns
+    -------
+    FragmentCache
+        The application's fragment cache.
+    """
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('fragment_cache',
+                                                  FragmentCache(current_app.config['FRAGMENT_CACHE_SIZE']))
+    return cache
+
+
+def get_generation(name: str = "issues") -> Optional[int]:
+    """Return the generation of a cached table.
+
+    Parameters
+    ----------
+    name : str, optional
+        The name of the table in the cache_generation table, by default "issues".
+
+    Returns
+    -------
+    Optional[int]
+        The generation, or None if the database was created before the cache_generation table was added.
+    """
+    try:
+        row = get_db().execute("SELECT generation FROM cache_generation WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row['generation'] if row is not None else None
+
+
+def cached_fragment(view: str, render: Callable[[], str], *key: Hashable) -> Markup:
+    """Return a rendered fragment from the cache, rendering and storing it on a cache miss.
+
+    Fragments are not cached when FRAGMENT_CACHE_SIZE is 0, the issue generation cannot be read or
+    the render function calls skip_fragment_cache(), such as when the issues could not be loaded.
+
+    Parameters
+    ----------
+    view : str
+        The name of the view the fragment is rendered for.
+    render : Callable[[], str]
+        A function returning the rendered fragment.
+    *key : Hashable
+        The other values the fragment depends on, such as the page cursor and user_id.
+
+    Returns
+    -------
+    Markup
+        The rendered fragment, safe to include in a template.
+    """
+    generation = get_generation()
+    if generation is None or not current_app.config['FRAGMENT_CACHE_SIZE']:
+        return Markup(render())
+    cache = get_fragment_cache()
+    cache_key = (view, generation) + key
+    fragment = cache.get(cache_key)
+    CACHE_REQUESTS.inc(cache="fragment", result="miss" if fragment is None else "hit")
+    if fragment is None:
+        fragment = Markup(render())
+        if not g.pop("skip_fragment_cache", False):
+            cache.set(cache_key, fragment)
+    return fragment
+
+
+def skip_fragment_cache():
+    """Prevent the fragment being rendered by cached_fragment() from being cached.
+    """
+    g.skip_fragment_cache = True
+
+
+def conditional_response(body: str) -> Response:
+    """Return a response with an ETag, or 304 Not Modified if the client's If-None-Match has the same ETag.
+
+    The ETag is a hash of the whole page, so it also changes with flashed messages and the signed-in user.
+    Browsers must revalidate the page on every view as it is private to the signed-in user.
+
+    Parameters
+    ----------
+    body : str
+        The rendered page.
+
+    Returns
+    -------
+    Response
+        The response.
+    """
+    response = make_response(body)
+    response.headers['Cache-Control'] = "private, no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
@@ -0,0 +1,217 @@
+"""
+This module contains a Blueprint to register the health and readiness view functions and the model warm-up they report.
+
+/healthz reports that the process is serving requests. /readyz only reports the worker as ready
+once a background warm-up has verified the database connection, cached the classification table,
+loaded the model and predicted a warm-up batch, so the first analyses routed to a worker do not pay
+for loading the model and tracing its graph. The warm-up starts on the first request to the worker,
+or on the first probe of /readyz when READINESS_WARM_UP_ON_REQUEST is disabled, and a failed warm-up
+is retried by the first probe of /readyz at least READINESS_RETRY_SECONDS after it failed.
+
+Functions:
+- healthz: View function used to report the process is alive.
+- readyz: View function used to report whether the worker is ready for traffic.
+- get_readiness: Return the application's readiness.
+- start_warm_up: Start the warm-up of the application on its first request.
+- init_app: Create the readiness of the application instance and register its request hook.
+
+Classes:
+- Readiness: The warm-up state of an application.
+"""
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from flask import Blueprint, current_app, jsonify, Response
+from mlapp.auth import user_not_required
+from mlapp.db import get_db
+from mlapp.metrics import WARM_UP_DURATION
+from mlapp.model_backend import get_model_backend
+from mlapp.protected import get_classifications
+
+health_bp = Blueprint('health', __name__)
+
+WARM_UP_COMMENTS = (
+    "This video explains the study really well, thanks for sharing.",
+    "They do not want you to know the truth about this, do your own research!",
+)
+
+
+class Readiness(object):
+    """
+    The class represents the warm-up state of an application.
+
+    The state is "pending" until the warm-up starts, "warming" while it runs in a background
+    thread, then "ready" or "failed". The duration of each warm-up step is kept in checks.
+
+    Methods
+    -------
+    start(app, retry_after)
+        Start the warm-up in a background thread unless it is running or has finished.
+    wait(timeout)
+        Wait for a running warm-up to finish.
+    report()
+        Return the state, the warm-up steps and any error as a dictionary.
+    """
+
+    def __init__(self):
+        self.state = "pending"
+        self.checks = {}
+        self.error = None
+        self.failed_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, app, retry_after: float = None) -> bool:
+        """Start the warm-up in a background thread.
+
+        Parameters
+        ----------
+        app : Flask
+            The application to warm up.
+        retry_after : float, optional
+            Start the warm-up again if it failed at least this many seconds ago, by default None to not retry.
+
+        Returns
+        -------
+        bool
+            True if the warm-up was started.
+        """
+        with self._lock:
+            retry = (self.state == "failed" and retry_after is not None
+                     and time.monotonic() - self.failed_at >= retry_after)
+            if not (self.state == "pending" or retry):
+                return False
+            self.state = "warming"
+            self.checks = {}
+            self.error = None
+            self._thread = threading.Thread(target=self._warm_up, args=(app,), name="mlapp-warm-up", daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout: float = None):
+        """Wait for a running warm-up to finish.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum seconds to wait, by default None to wait until it finishes.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @contextmanager
+    def _check(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            WARM_UP_DURATION.observe(duration, stage=name)
+            self.checks[name] = round(duration * 1000, 1)
+
+    def _warm_up(self, app):
+        start = time.perf_counter()
+        try:
+            with app.app_context():
+                with self._check("database_ms"):
+                    get_db().execute("SELECT 1").fetchone()
+                with self._check("classifications_ms"):
+                    if not get_classifications():
+                        raise RuntimeError("The classification table is empty.")
+                backend = get_model_backend()
+                with self._check("model_load_ms"):
+                    backend.load()
+                with self._check("warm_up_ms"):
+                    comments = np.empty(app.config['READINESS_WARM_UP_BATCH_SIZE'], dtype=object)
+                    comments[:] = [WARM_UP_COMMENTS[i % len(WARM_UP_COMMENTS)] for i in range(comments.size)]
+                    backend.predict(comments)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.failed_at = time.monotonic()
+            self.state = "failed"
+            app.logger.exception("Warm-up failed after %.1f ms", (time.perf_counter() - start) * 1000)
+        else:
+            self.state = "ready"
+            app.logger.info("Warm-up finished in %.1f ms %s", (time.perf_counter() - start) * 1000, self.checks)
+
+    def report(self) -> dict:
+        """Return the state, the warm-up steps and any error as a dictionary."""
+        return {"status": self.state, "checks": dict(self.checks), "error": self.error}
+
+
+@health_bp.route('/healthz', methods=["GET"])
+@user_not_required
+def healthz() -> Response:
+    """The health view function.
+
+    The process is alive if it can respond; neither the database nor the model is used.
+
+    Returns
+    -------
+    Response
+        A JSON Response with the status "ok".
+    """
+    return jsonify({"status": "ok"})
+
+
+@health_bp.route('/readyz', methods=["GET"])
+@user_not_required
+def readyz() -> Response:
+    """The readiness view function.
+
+    Starts the warm-up if it has not started, or retries it if it failed at least READINESS_RETRY_SECONDS ago,
+    and checks the database connection.
+
+    Returns
+    -------
+    Response
+        A JSON Response of the warm-up state, the milliseconds taken by each warm-up step and any error,
+        with a 200 status code when the worker is ready and a 503 status code otherwise.
+    """
+    readiness = get_readiness()
+    readiness.start(current_app._get_current_object(), current_app.config['READINESS_RETRY_SECONDS'])
+    report = readiness.report()
+    report["model_backend"] = current_app.config['MODEL_BACKEND']
+    if report["status"] == "ready":
+        # the warm-up verified the database once, each probe verifies it is still available.
+        try:
+            get_db().execute("SELECT 1").fetchone()
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = f"{type(e).__name__}: {e}"
+    report["ready"] = report["status"] == "ready"
+    return jsonify(report), 200 if report["ready"] else 503
+
+
+def get_readiness() -> Readiness:
+    """Return the application's readiness.
+
+    Returns
+    -------
+    Readiness
+        The application's warm-up state.
+    """
+    return current_app.extensions['readiness']
+
+
+def start_warm_up():
+    """Start the warm-up of the application on its first request.
+    """
+    readiness = get_readiness()
+    if readiness.state == "pending":
+        readiness.start(current_app._get_current_object())
+
+
+def init_app(app):
+    """Create the readiness of the application instance and register start_warm_up() with it.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.extensions['readiness'] = Readiness()
+    if app.config['READINESS_WARM_UP_ON_REQUEST']:
+        app.before_request(start_warm_up)
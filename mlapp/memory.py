@@ -0,0 +1,164 @@
+"""
+Functions used to track the memory used by each request and to bound the memory used by an analysis.
+
+The resident set size (RSS) of the process is read at the start and end of every request and its
+growth is recorded in the mlapp_request_rss_delta_bytes metric. When MEMORY_TRACEMALLOC is enabled,
+as a debug mode, tracemalloc also records the peak memory allocated by Python during each request
+and the source lines holding the most memory are logged for requests that grow the process by more
+than MEMORY_LOG_THRESHOLD_MB. Both are measurements of the whole process, so under a threaded server
+they include the memory of concurrent requests.
+
+An analysis stops fetching comments once it has ANALYSIS_MAX_COMMENTS comments, or once the process
+has grown by more than ANALYSIS_MEMORY_BUDGET_MB during the request, and the comments fetched so far
+are analysed instead of the worker running out of memory.
+
+Functions:
+- current_rss: Return the resident set size of the process in bytes.
+- start_memory_tracking: Record the memory of the process at the start of a request.
+- request_memory: Return the memory used by the current request.
+- record_request_memory: Record the memory used by a request in metrics and log large requests.
+- budget_exceeded: Return why an analysis has exceeded its comment or memory budget.
+- init_app: Register the memory tracking request hooks with the application instance.
+"""
+import os
+import tracemalloc
+from typing import Dict, Optional
+from flask import current_app, g, has_app_context, has_request_context, request, Response
+from mlapp.metrics import REQUEST_RSS_DELTA, REQUEST_TRACED_PEAK
+
+MB = 1024 * 1024
+
+
+def current_rss() -> Optional[int]:
+    """Return the resident set size of the process in bytes.
+
+    Returns
+    -------
+    Optional[int]
+        The resident set size, or None where /proc is not available such as on Windows and macOS.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def start_memory_tracking():
+    """Record the resident set size of the process at the start of a request on g.
+
+    In MEMORY_TRACEMALLOC mode tracemalloc is started, if it is not already tracing, and its peak is reset.
+    """
+    g.rss_start = current_rss()
+    if current_app.config['MEMORY_TRACEMALLOC']:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(current_app.config['MEMORY_TRACEMALLOC_FRAMES'])
+        tracemalloc.reset_peak()
+        g.traced_start = tracemalloc.get_traced_memory()[0]
+
+
+def request_memory() -> Dict[str, Optional[int]]:
+    """Return the memory used by the current request so far.
+
+    Returns
+    -------
+    Dict[str, Optional[int]]
+        The process's resident set size, its growth since the request started and, in MEMORY_TRACEMALLOC mode,
+        the peak memory allocated by Python above that allocated when the request started, all in bytes.
+        Values that were not measured are None.
+    """
+    rss = current_rss()
+    rss_start = g.get("rss_start")
+    traced_start = g.get("traced_start")
+    traced_peak = None
+    if traced_start is not None and tracemalloc.is_tracing():
+        traced_peak = max(tracemalloc.get_traced_memory()[1] - traced_start, 0)
+    return {
+        "rss_bytes": rss,
+        "rss_delta_bytes": rss - rss_start if rss is not None and rss_start is not None else None,
+        "traced_peak_bytes": traced_peak,
+    }
+
+
+def record_request_memory(response: Response) -> Response:
+    """Record the memory used by a request in metrics and log requests that used more than MEMORY_LOG_THRESHOLD_MB.
+
+    In MEMORY_TRACEMALLOC mode the source lines holding the most memory at the end of the request are logged with it.
+
+    Parameters
+    ----------
+    response : Response
+        The response of the request.
+
+    Returns
+    -------
+    Response
+        The unchanged response.
+    """
+    if "rss_start" not in g:
+        return response
+    memory = request_memory()
+    g.pop("rss_start")
+    g.pop("traced_start", None)
+    endpoint = request.endpoint or "unmatched"
+    if memory["rss_delta_bytes"] is not None:
+        # the resident set size shrinks when memory is returned to the operating system.
+        REQUEST_RSS_DELTA.observe(max(memory["rss_delta_bytes"], 0), endpoint=endpoint)
+    if memory["traced_peak_bytes"] is not None:
+        REQUEST_TRACED_PEAK.observe(memory["traced_peak_bytes"], endpoint=endpoint)
+
+    used = max(memory["rss_delta_bytes"] or 0, memory["traced_peak_bytes"] or 0)
+    if used < current_app.config['MEMORY_LOG_THRESHOLD_MB'] * MB:
+        return response
+    message = "Request to %s used %.1f MB (RSS %s MB, delta %s MB, traced peak %s MB)"
+    arguments = [endpoint, used / MB] + [
+        f"{memory[key] / MB:.1f}" if memory[key] is not None else "n/a"
+        for key in ("rss_bytes", "rss_delta_bytes", "traced_peak_bytes")
+    ]
+    if memory["traced_peak_bytes"] is not None:
+        statistics = tracemalloc.take_snapshot().statistics("lineno")[:current_app.config['MEMORY_TRACEMALLOC_TOP']]
+        message += "; largest allocations:" + "\n  %s" * len(statistics)
+        arguments += [str(statistic) for statistic in statistics]
+    current_app.logger.warning(message, *arguments, extra={"memory": memory})
+    return response
+
+
+def budget_exceeded(comment_count: int) -> Optional[str]:
+    """Return why an analysis has exceeded its comment or memory budget.
+
+    The memory budget is only checked during a request, as it is measured from the start of the request.
+
+    Parameters
+    ----------
+    comment_count : int
+        The number of comments fetched by the analysis so far.
+
+    Returns
+    -------
+    Optional[str]
+        "comments" if ANALYSIS_MAX_COMMENTS comments have been fetched, "memory" if the process has grown
+        by more than ANALYSIS_MEMORY_BUDGET_MB during the request or None if neither budget is exceeded.
+    """
+    if not has_app_context():
+        return None
+    max_comments = current_app.config['ANALYSIS_MAX_COMMENTS']
+    if max_comments and comment_count >= max_comments:
+        return "comments"
+    budget_mb = current_app.config['ANALYSIS_MEMORY_BUDGET_MB']
+    if budget_mb and has_request_context():
+        rss_delta = request_memory()["rss_delta_bytes"]
+        if rss_delta is not None and rss_delta > budget_mb * MB:
+            return "memory"
+    return None
+
+
+def init_app(app):
+    """Register start_memory_tracking() and record_request_memory() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.before_request(start_memory_tracking)
+    app.after_request(record_request_memory)
@@ -0,0 +1,463 @@
+"""
+An in-process metrics registry of counters, gauges and histograms exposed in the Prometheus text exposition format.
+
+Metrics are recorded in the memory of each process. When the METRICS_MULTIPROCESS_DIR
+configuration value is set, as it should be under multiple gunicorn workers, every process
+writes its metrics to its own file in that directory at most every METRICS_FLUSH_SECONDS
+seconds and a scrape of /metrics adds together the files of every process, gauges included, so a
+gauge should measure the process's share of a total.
+
+Functions:
+- metrics: View function used to return the metrics in the text exposition format.
+- generate_latest: Return metrics in the text exposition format.
+- merge_snapshots: Add together the metric snapshots of several processes.
+- flush_metrics: Write this process's metrics to the multiprocess directory.
+- collect_metrics: Return the metrics of this process, or of every process in multiprocess mode.
+- start_request_timer: Record the start time of a request.
+- observe_request: Record the latency of a request.
+- init_app: Register the metrics view and request hooks with the application instance.
+
+Classes:
+- Metric: A named metric with labelled values.
+- Counter: A metric that only increases.
+- Gauge: A metric that is set to its current value.
+- Histogram: A metric that counts observations into buckets.
+- Registry: A collection of metrics.
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+from flask import current_app, g, request, Response
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = tuple(kb * 1024 for kb in (1, 4, 16, 64, 256, 1024))
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric(object):
+    """
+    The class represents a named metric with labelled values.
+
+    Parameters
+    ----------
+    name : str
+        The metric name.
+    documentation : str
+        The metric's help text.
+    labelnames : Iterable[str], optional
+        The names of the metric's labels, by default ().
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, not {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        """Return the metric as a JSON serialisable dictionary."""
+        with self._lock:
+            samples = [[list(key), value if not isinstance(value, list) else list(value)]
+                       for key, value in self._values.items()]
+        return {"type": self.type, "help": self.documentation,
+                "labelnames": list(self.labelnames), "samples": samples}
+
+
+class Counter(Metric):
+    """
+    The class represents a metric that only increases.
+
+    Methods
+    -------
+    inc(amount=1, **labels)
+        Increase the counter for the labels by amount.
+    """
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        """Increase the counter for the labels by amount."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    The class represents a metric that is set to its current value.
+
+    Methods
+    -------
+    set(value, **labels)
+        Set the gauge for the labels to value.
+    """
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        """Set the gauge for the labels to value."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    The class represents a metric that counts observations into buckets.
+
+    Each labelled value is stored as a list of the count in each bucket, followed by
+    the count above the last bucket, the sum and the count of observations.
+
+    Methods
+    -------
+    observe(value, **labels)
+        Record an observation.
+    time(**labels)
+        Context manager that observes the seconds taken by its body.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """Record an observation."""
+        key = self._key(labels)
+        index = len(self.buckets)
+        for bucket_index, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = bucket_index
+                break
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 3)
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager that observes the seconds taken by its body."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class Registry(object):
+    """
+    The class represents a collection of metrics.
+
+    Methods
+    -------
+    counter(name, documentation, labelnames=())
+        Create and register a Counter.
+    gauge(name, documentation, labelnames=())
+        Create and register a Gauge.
+    histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS)
+        Create and register a Histogram.
+    snapshot()
+        Return every metric as a JSON serialisable dictionary keyed by metric name.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the Registry class.
+        """
+        self._metrics = {}
+        self.last_flush = 0.0
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"The metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        """Create and register a Counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        """Create and register a Gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Create and register a Histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        """Return every metric as a JSON serialisable dictionary keyed by metric name."""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "mlapp_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method", "status"))
+COMMENTS_FETCHED = REGISTRY.counter(
+    "mlapp_youtube_comments_fetched_total", "YouTube comments fetched.")
+PAGES_FETCHED = REGISTRY.counter(
+    "mlapp_youtube_pages_fetched_total", "YouTube commentThreads pages fetched.")
+PREDICTION_BATCH_SIZE = REGISTRY.histogram(
+    "mlapp_prediction_batch_size", "Comments per prediction batch.", buckets=SIZE_BUCKETS)
+MODEL_LATENCY = REGISTRY.histogram(
+    "mlapp_model_duration_seconds", "Model load and predict latency.", ("stage",))
+CACHE_REQUESTS = REGISTRY.counter(
+    "mlapp_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+DB_TIME = REGISTRY.histogram(
+    "mlapp_db_duration_seconds", "Database time per request.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+DB_QUERIES = REGISTRY.counter(
+    "mlapp_db_queries_total", "SQL statements executed during requests.")
+REQUEST_RSS_DELTA = REGISTRY.histogram(
+    "mlapp_request_rss_delta_bytes", "Resident set size growth per request.", ("endpoint",),
+    buckets=MEMORY_BUCKETS)
+REQUEST_TRACED_PEAK = REGISTRY.histogram(
+    "mlapp_request_traced_peak_bytes", "Peak memory allocated by Python per request in tracemalloc mode.",
+    ("endpoint",), buckets=MEMORY_BUCKETS)
+WARM_UP_DURATION = REGISTRY.histogram(
+    "mlapp_warm_up_duration_seconds", "Readiness warm-up step durations.", ("stage",))
+YOUTUBE_RESPONSE_BYTES = REGISTRY.histogram(
+    "mlapp_youtube_response_bytes", "YouTube Data API response bytes transferred per page.", ("resource", "encoding"),
+    buckets=BYTE_BUCKETS)
+YOUTUBE_PARSE_DURATION = REGISTRY.histogram(
+    "mlapp_youtube_parse_duration_seconds", "Time to decompress and parse a YouTube Data API page.", ("resource",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05))
+YOUTUBE_QUOTA_UNITS = REGISTRY.counter(
+    "mlapp_youtube_quota_units_total", "YouTube Data API quota units spent.", ("resource",))
+YOUTUBE_QUOTA_BUDGET = REGISTRY.gauge(
+    "mlapp_youtube_quota_budget_units", "YouTube Data API quota units that may be spent a day.")
+YOUTUBE_QUOTA_REMAINING = REGISTRY.gauge(
+    "mlapp_youtube_quota_remaining_units", "YouTube Data API quota units left today.")
+YOUTUBE_RETRIES = REGISTRY.counter(
+    "mlapp_youtube_retries_total", "YouTube Data API requests retried after a transient error.", ("reason",))
+YOUTUBE_REJECTED = REGISTRY.counter(
+    "mlapp_youtube_rejected_total", "YouTube Data API requests not sent as the circuit was open or the quota spent.",
+    ("reason",))
+YOUTUBE_CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "mlapp_youtube_circuit_transitions_total", "YouTube Data API circuit breaker state changes.", ("state",))
+YOUTUBE_RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "mlapp_youtube_rate_limit_wait_seconds", "Time YouTube Data API requests waited for the rate limiter.",
+    buckets=(0, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+FETCH_CHECKPOINTS = REGISTRY.counter(
+    "mlapp_youtube_fetch_checkpoints_total", "Comment fetch checkpoints saved, resumed, completed and collected.",
+    ("event",))
+ANALYSES_TRUNCATED = REGISTRY.counter(
+    "mlapp_analyses_truncated_total", "Analyses that stopped fetching comments at a budget.", ("reason",))
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def generate_latest(snapshot: dict) -> str:
+    """Return metrics in the text exposition format.
+
+    Parameters
+    ----------
+    snapshot : dict
+        Metrics as returned by Registry.snapshot() or merge_snapshots().
+
+    Returns
+    -------
+    str
+        The metrics in the Prometheus text exposition format, version 0.0.4.
+    """
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for labels, value in sorted(metric["samples"]):
+            if metric["type"] in ("counter", "gauge"):
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + [math.inf], value[:-2]):
+                cumulative += count
+                bucket_labels = _format_labels(labelnames + ["le"], labels + [_format_value(bound)])
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    """Add together the metric snapshots of several processes.
+
+    Parameters
+    ----------
+    snapshots : Iterable[dict]
+        Metrics as returned by Registry.snapshot() for each process.
+
+    Returns
+    -------
+    dict
+        The combined metrics.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                if metric["type"] in ("counter", "gauge"):
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+                else:
+                    current = target["samples"].get(key)
+                    target["samples"][key] = value if current is None else [
+                        a + b for a, b in zip(current, value)]
+    for metric in merged.values():
+        metric["samples"] = [[list(key), value] for key, value in metric["samples"].items()]
+    return merged
+
+
+def flush_metrics(directory: str):
+    """Write this process's metrics to the multiprocess directory.
+
+    The metrics are written to a temporary file which then replaces the process's file,
+    so a scrape never reads a partially written file.
+
+    Parameters
+    ----------
+    directory : str
+        The directory shared by every process.
+    """
+    REGISTRY.last_flush = time.monotonic()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"metrics_{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(path + ".tmp", path)
+
+
+def collect_metrics(directory: Optional[str] = None) -> dict:
+    """Return the metrics of this process, or of every process in multiprocess mode.
+
+    Parameters
+    ----------
+    directory : Optional[str], optional
+        The multiprocess directory, by default None for this process only.
+
+    Returns
+    -------
+    dict
+        The metrics snapshot.
+    """
+    if not directory:
+        return REGISTRY.snapshot()
+    flush_metrics(directory)
+    snapshots = []
+    for name in os.listdir(directory):
+        if name.startswith("metrics_") and name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # a file removed or replaced by its process while being listed.
+                continue
+    return merge_snapshots(snapshots)
+
+
+def metrics() -> Response:
+    """The metrics view function.
+
+    Returns
+    -------
+    Response
+        The metrics in the Prometheus text exposition format.
+    """
+    snapshot = collect_metrics(current_app.config['METRICS_MULTIPROCESS_DIR'])
+    return Response(generate_latest(snapshot), content_type=CONTENT_TYPE)
+
+
+def start_request_timer():
+    """Record the start time of a request on g.
+    """
+    g.request_start = time.perf_counter()
+
+
+def observe_request(response: Response) -> Response:
+    """Record the latency of a request and its database time.
+
+    In multiprocess mode the process's metrics are written to the shared directory at most
+    every METRICS_FLUSH_SECONDS seconds.
+
+    Parameters
+    ----------
+    response : Response
+        The response of the request.
+
+    Returns
+    -------
+    Response
+        The unchanged response.
+    """
+    start = g.pop("request_start", None)
+    if start is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - start,
+                                endpoint=request.endpoint or "unmatched",
+                                method=request.method,
+                                status=response.status_code)
+    queries = g.get("queries")
+    if queries:
+        DB_QUERIES.inc(len(queries))
+        DB_TIME.observe(sum(query.duration for query in queries))
+    directory = current_app.config['METRICS_MULTIPROCESS_DIR']
+    if directory and time.monotonic() - REGISTRY.last_flush >= current_app.config['METRICS_FLUSH_SECONDS']:
+        flush_metrics(directory)
+    return response
+
+
+def init_app(app):
+    """Register the metrics view and the request timing hooks with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    # imported here as the auth module records its cache lookups in this module's metrics.
+    from mlapp.auth import user_not_required
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.add_url_rule('/metrics', 'metrics', user_not_required(metrics))
+    app.before_request(start_request_timer)
+    app.after_request(observe_request)
@@ -0,0 +1,226 @@
+"""
+Classes and functions used to predict comment classifications with a pluggable model backend.
+
+The MODEL_BACKEND configuration value selects the backend:
+- "keras": The TensorFlow SavedModel at MODEL_PATH, loaded once and kept in memory.
+- "stub": Deterministic scores hashed from each comment using only NumPy, with a configurable
+  MODEL_STUB_LATENCY_MS per call, for tests and load tests of the web application.
+TensorFlow is only imported when the Keras backend loads its model, so the application can be
+created and served with the stub backend without TensorFlow installed.
+
+Functions:
+- create_model_backend: Return a new model backend selected by the application's configuration.
+- get_model_backend: Return the application's model backend.
+- init_app: Create the model backend of the application instance.
+
+Classes:
+- ModelBackend: The interface of a model backend.
+- KerasBackend: A model backend using a TensorFlow SavedModel.
+- StubBackend: A deterministic NumPy-only model backend.
+"""
+import abc
+import hashlib
+import threading
+import time
+from typing import Mapping
+import numpy as np
+from numpy import ndarray
+from flask import current_app, has_app_context
+
+DEFAULT_MODEL_PATH = "mlapp/model"
+
+
+class ModelBackend(abc.ABC):
+    """
+    The class represents the interface of a model backend.
+
+    Methods
+    -------
+    load()
+        Load the model if it has not been loaded, returning whether it was loaded.
+    predict(comments)
+        Return the prediction values of an array of comments.
+    """
+
+    def load(self) -> bool:
+        """Load the model if it has not been loaded.
+
+        Returns
+        -------
+        bool
+            Whether the model was loaded by this call, False if it had already been loaded or the
+            backend has no model to load.
+        """
+        return False
+
+    @abc.abstractmethod
+    def predict(self, comments: ndarray) -> ndarray:
+        """Return the prediction values of an array of comments.
+
+        Parameters
+        ----------
+        comments : ndarray
+            A 1-dimensional NumPy array of comments as strings, or an object array of str.
+
+        Returns
+        -------
+        ndarray
+            A (number of comments, 1) NumPy array of prediction values ranging (0-1).
+
+        Raises
+        ------
+        ValueError
+            Raised if there is an issue with the shape or dtype of the comments, such as an empty array.
+        """
+
+
+class KerasBackend(ModelBackend):
+    """
+    The class represents a model backend using a TensorFlow SavedModel.
+
+    The model is loaded on first use, or by load(), and kept for later predictions.
+
+    Parameters
+    ----------
+    model_path : str
+        The file path of the TensorFlow SavedModel directory.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH):
+        self.model_path = model_path
+        self.model = None
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Load the SavedModel if it has not been loaded.
+
+        Returns
+        -------
+        bool
+            Whether the model was loaded by this call.
+
+        Raises
+        ------
+        OSError
+            Raised if the model directory cannot be found.
+        """
+        if self.model is not None:
+            return False
+        with self._lock:
+            if self.model is not None:
+                return False
+            self.model = self._load_model()
+            return True
+
+    def _load_model(self):
+        # imported here so the application does not import TensorFlow unless this backend is used.
+        from tensorflow import keras
+
+        # dealing with TensorFlow model's TextVectorisation conflict
+        # Define your custom TextVectorization layer
+        class MyCustomTextVectorization(keras.layers.experimental.preprocessing.TextVectorization):
+            def __init__(self, *args, **kwargs):
+                super(MyCustomTextVectorization, self).__init__(*args, **kwargs)
+
+        # Load the saved model and replace its TextVectorization layer with your custom layer
+        model = keras.models.load_model(self.model_path)
+        for layer in model.layers:
+            if isinstance(layer, keras.layers.experimental.preprocessing.TextVectorization):
+                custom_layer = MyCustomTextVectorization.from_config(layer.get_config())
+                custom_layer.set_weights(layer.get_weights())
+                layer_index = model.layers.index(layer)
+                model.layers[layer_index] = custom_layer
+        return model
+
+    def predict(self, comments: ndarray) -> ndarray:
+        self.load()
+        return self.model.predict(comments, verbose=0)
+
+
+class StubBackend(ModelBackend):
+    """
+    The class represents a deterministic NumPy-only model backend.
+
+    The prediction value of a comment is derived from a hash of its text, so the same comment
+    always has the same prediction value and values are spread evenly over the range (0-1).
+
+    Parameters
+    ----------
+    latency_ms : float, optional
+        Milliseconds each call to predict() sleeps for to simulate a model, by default 0.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    def predict(self, comments: ndarray) -> ndarray:
+        comments = np.asarray(comments)
+        if comments.ndim != 1 or comments.size == 0 or not (
+                comments.dtype.kind in "US"
+                or (comments.dtype.kind == "O" and all(isinstance(comment, str) for comment in comments))):
+            raise ValueError("The stub model expects a non-empty 1-dimensional array of strings.")
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        digests = np.array([int.from_bytes(hashlib.blake2b(str(comment).encode(), digest_size=8).digest(), "little")
+                            for comment in comments], dtype=np.uint64)
+        # the top 24 bits of each hash are exactly representable as a float32 fraction.
+        return ((digests >> np.uint64(40)).astype(np.float32) / np.float32(2 ** 24)).reshape(-1, 1)
+
+
+def create_model_backend(config: Mapping) -> ModelBackend:
+    """Return a new model backend selected by the MODEL_BACKEND configuration value.
+
+    Parameters
+    ----------
+    config : Mapping
+        The application's configuration.
+
+    Returns
+    -------
+    ModelBackend
+        The model backend.
+
+    Raises
+    ------
+    ValueError
+        Raised if MODEL_BACKEND is not the name of a backend.
+    """
+    name = config.get("MODEL_BACKEND", "keras")
+    if name == "keras":
+        return KerasBackend(config.get("MODEL_PATH", DEFAULT_MODEL_PATH))
+    if name == "stub":
+        return StubBackend(config.get("MODEL_STUB_LATENCY_MS", 0.0))
+    raise ValueError(f"Unknown MODEL_BACKEND {name!r}, expected 'keras' or 'stub'.")
+
+
+def get_model_backend() -> ModelBackend:
+    """Return the application's model backend.
+
+    Outside an application context a KerasBackend for the default model path is returned.
+
+    Returns
+    -------
+    ModelBackend
+        The model backend.
+    """
+    if not has_app_context():
+        return KerasBackend()
+    return current_app.extensions['model_backend']
+
+
+def init_app(app):
+    """Create the model backend of the application instance.
+
+    The backend's model is not loaded until it is first used.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+
+    Raises
+    ------
+    ValueError
+        Raised if MODEL_BACKEND is not the name of a backend.
+    """
+    app.extensions['model_backend'] = create_model_backend(app.config)
@@ -0,0 +1,190 @@
+"""
+Functions used to profile sampled requests with cProfile and summarise the captured profiles.
+
+Profiling is opt-in. A PROFILE_SAMPLE_RATE fraction of requests is profiled, as is any
+request with an X-Profile-Token header matching the PROFILE_TOKEN configuration value.
+Each profile is written in the pstats format to the instance folder's profiles directory,
+named with the request's endpoint, duration and time, where the profiles command reads them.
+
+Only one request per process is profiled at a time, as a profiler enabled on one thread does
+not see the work of the others and concurrent profilers conflict from Python 3.12.
+
+Functions:
+- should_profile: Return whether the current request should be profiled.
+- start_profile: Start profiling the current request if it should be profiled.
+- finish_profile: Stop profiling the current request and write its profile.
+- list_profiles: Return the captured profiles, newest first.
+- profiles_command: Click command used to list and summarise the captured profiles.
+- init_app: Register the profiling hooks and Click command with the application instance.
+
+Classes:
+- Profile: A captured profile file.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import List, NamedTuple, Optional
+import click
+from flask import current_app, g, request
+from flask.cli import with_appcontext
+
+PROFILE_HEADER = "X-Profile-Token"
+_profile_lock = threading.Lock()
+# <endpoint>.<duration>ms.<time in ms>.prof
+_PROFILE_NAME = re.compile(r"^(?P<endpoint>.+)\.(?P<duration>\d+)ms\.(?P<created>\d+)\.prof$")
+
+
+class Profile(NamedTuple):
+    """
+    The class represents a captured profile file.
+
+    Attributes
+    ----------
+    name : str
+        The profile's file name.
+    endpoint : str
+        The endpoint of the profiled request.
+    duration_ms : int
+        The duration of the profiled request in milliseconds.
+    created : float
+        The time the profile was captured in seconds since the epoch.
+    """
+    name: str
+    endpoint: str
+    duration_ms: int
+    created: float
+
+
+def _profiles_dir() -> str:
+    return os.path.join(current_app.instance_path, 'profiles')
+
+
+def should_profile() -> bool:
+    """Return whether the current request should be profiled.
+
+    Returns
+    -------
+    bool
+        True if the request carries the authorised profiling token or is randomly sampled.
+    """
+    token = current_app.config['PROFILE_TOKEN']
+    header = request.headers.get(PROFILE_HEADER)
+    if token and header and hmac.compare_digest(header.encode(), token.encode()):
+        return True
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def start_profile():
+    """Start profiling the current request if it should be profiled and no other request is.
+    """
+    if not should_profile() or not _profile_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    g.profile = (profiler, time.perf_counter())
+    profiler.enable()
+
+
+def finish_profile(exception: Optional[BaseException] = None):
+    """Stop profiling the current request and write its profile to the instance folder.
+
+    The oldest profiles are removed once there are more than PROFILE_MAX_FILES.
+
+    Parameters
+    ----------
+    exception : BaseException, optional
+        An unhandled exception raised during the request, by default None.
+    """
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+    profiler, start = profile
+    try:
+        profiler.disable()
+        duration_ms = round((time.perf_counter() - start) * 1000)
+        endpoint = re.sub(r"[^A-Za-z0-9_.-]", "_", request.endpoint or "unmatched")
+        os.makedirs(_profiles_dir(), exist_ok=True)
+        name = f"{endpoint}.{duration_ms}ms.{round(time.time() * 1000)}.prof"
+        profiler.dump_stats(os.path.join(_profiles_dir(), name))
+        for old in list_profiles()[current_app.config['PROFILE_MAX_FILES']:]:
+            os.remove(os.path.join(_profiles_dir(), old.name))
+    finally:
+        _profile_lock.release()
+
+
+def list_profiles(endpoint: Optional[str] = None) -> List[Profile]:
+    """Return the captured profiles, newest first.
+
+    Parameters
+    ----------
+    endpoint : str, optional
+        Only return profiles of this endpoint, by default None for every endpoint.
+
+    Returns
+    -------
+    List[Profile]
+        The captured profiles.
+    """
+    if not os.path.isdir(_profiles_dir()):
+        return []
+    profiles = []
+    for name in os.listdir(_profiles_dir()):
+        match = _PROFILE_NAME.match(name)
+        if match and endpoint in (None, match["endpoint"]):
+            profiles.append(Profile(name, match["endpoint"], int(match["duration"]),
+                                    int(match["created"]) / 1000))
+    return sorted(profiles, key=lambda profile: profile.created, reverse=True)
+
+
+@click.command('profiles')
+@click.argument('names', nargs=-1)
+@click.option('--endpoint', help='Summarise every profile of this endpoint together.')
+@click.option('--sort', type=click.Choice(['cumulative', 'tottime', 'ncalls']), default='cumulative',
+              help='The statistic to sort functions by.')
+@click.option('--limit', type=int, default=20, help='The number of functions to print.')
+@with_appcontext
+def profiles_command(names: tuple, endpoint: str, sort: str, limit: int):
+    """List the captured request profiles, or summarise the named profiles or an endpoint's profiles.
+    """
+    if names:
+        paths = [os.path.join(_profiles_dir(), name) for name in names]
+    else:
+        profiles = list_profiles(endpoint)
+        if not profiles:
+            click.echo('No profiles have been captured.')
+            return
+        if endpoint is None:
+            for profile in profiles:
+                created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(profile.created))
+                click.echo(f'{created} {profile.duration_ms:>8}ms  {profile.endpoint:<40} {profile.name}')
+            return
+        durations = sorted(profile.duration_ms for profile in profiles)
+        click.echo(f'{len(profiles)} profiles of {endpoint}: median {durations[len(durations) // 2]}ms, '
+                   f'max {durations[-1]}ms')
+        paths = [os.path.join(_profiles_dir(), profile.name) for profile in profiles]
+    try:
+        stream = io.StringIO()
+        pstats.Stats(*paths, stream=stream).strip_dirs().sort_stats(sort).print_stats(limit)
+    except OSError as e:
+        raise click.ClickException(f'The profile could not be read: {e}')
+    click.echo(stream.getvalue())
+
+
+def init_app(app):
+    """Register the profiling hooks, if profiling is enabled, and profiles_command() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    if app.config['PROFILE_SAMPLE_RATE'] > 0 or app.config['PROFILE_TOKEN']:
+        app.before_request(start_profile)
+        app.teardown_request(finish_profile)
+    app.cli.add_command(profiles_command)
@@ -0,0 +1,375 @@
+"""
+Classes and functions used to instrument SQLite queries made through get_db().
+
+Every statement executed on an InstrumentedConnection is timed, its row count recorded and
+the line of application code that made the query noted. Statements slower than the
+DB_SLOW_QUERY_MS configuration value are logged, a per-request summary is logged and can be
+returned in a Server-Timing header, and statistics aggregated per normalised query are
+periodically written to the instance folder where the query-stats command reads them.
+
+Functions:
+- normalise_query: Return a query with its whitespace collapsed and literals replaced by placeholders.
+- get_query_stats: Return the application's aggregated query statistics.
+- reset_request_queries: Start recording the queries of a request.
+- summarise_request_queries: Log the query summary of a request and add its Server-Timing header.
+- flush_query_stats: Write the aggregated query statistics of this process to the instance folder.
+- load_query_stats: Return the aggregated query statistics written by every process.
+- query_stats_command: Click command used to print the aggregated query statistics.
+- init_app: Register the query instrumentation hooks and Click command with the application instance.
+
+Classes:
+- QueryRecord: The timing and row count of one executed statement.
+- QueryStats: Statistics aggregated per normalised query.
+- InstrumentedCursor: A sqlite3.Cursor that records the statements it executes.
+- InstrumentedConnection: A sqlite3.Connection whose cursors are InstrumentedCursors.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, request, Response
+import click
+from flask.cli import with_appcontext
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# frames from these files are skipped when finding the call site of a query.
+_SKIPPED_FILES = (os.path.normcase(__file__), os.path.normcase(sqlite3.__file__))
+
+
+def normalise_query(sql: str) -> str:
+    """Return a query with its whitespace collapsed and literals replaced by placeholders.
+
+    Queries that only differ by their literal values or formatting are aggregated together.
+
+    Parameters
+    ----------
+    sql : str
+        A SQL statement.
+
+    Returns
+    -------
+    str
+        The normalised SQL statement.
+    """
+    return _LITERALS.sub("?", _WHITESPACE.sub(" ", sql).strip())
+
+
+def _call_site() -> str:
+    """Return the file, line and function of the first caller outside this module."""
+    frame = sys._getframe(2)
+    while frame is not None and os.path.normcase(frame.f_code.co_filename) in _SKIPPED_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+
+
+class QueryRecord(object):
+    """
+    The class represents the timing and row count of one executed statement.
+
+    Attributes
+    ----------
+    sql : str
+        The normalised statement.
+    call_site : str
+        The file, line and function that executed the statement.
+    duration : float
+        The seconds spent executing the statement and fetching its rows.
+    rows : int
+        The number of rows fetched, or modified for data changing statements.
+    """
+
+    __slots__ = ("sql", "call_site", "duration", "rows", "logged")
+
+    def __init__(self, sql: str, call_site: str):
+        self.sql = sql
+        self.call_site = call_site
+        self.duration = 0.0
+        self.rows = 0
+        self.logged = False
+
+    def add(self, duration: float, rows: int):
+        """Add the duration and rows of an execute or fetch, logging the statement once it is slow."""
+        self.duration += duration
+        self.rows += rows
+        if not self.logged and has_app_context():
+            threshold = current_app.config['DB_SLOW_QUERY_MS'] / 1000
+            if self.duration >= threshold:
+                self.logged = True
+                logger.warning("Slow query %.1fms at %s: %s",
+                               self.duration * 1000, self.call_site, self.sql)
+
+
+class QueryStats(object):
+    """
+    The class represents statistics aggregated per normalised query.
+
+    Methods
+    -------
+    record(query)
+        Add a finished query to the statistics.
+    snapshot()
+        Return the statistics as a JSON serialisable dictionary.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the QueryStats class.
+        """
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, query: QueryRecord):
+        """Add a finished query to the statistics."""
+        with self._lock:
+            stats = self._stats.get(query.sql)
+            if stats is None:
+                stats = self._stats[query.sql] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "call_sites": {}}
+            duration_ms = query.duration * 1000
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["rows"] += query.rows
+            stats["call_sites"][query.call_site] = stats["call_sites"].get(query.call_site, 0) + 1
+
+    def snapshot(self) -> dict:
+        """Return the statistics as a JSON serialisable dictionary keyed by normalised query."""
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    The class represents a sqlite3.Cursor that records the statements it executes.
+
+    Each executed statement is recorded on g.queries during a request, or straight into the
+    aggregated statistics otherwise. The time spent fetching rows is added to the record of
+    the last executed statement.
+    """
+
+    _query = None
+
+    def _timed(self, sql, method, *args):
+        query = self._query = QueryRecord(normalise_query(sql), _call_site())
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        finally:
+            # rowcount is -1 for SELECT statements; their rows are counted as they are fetched.
+            query.add(time.perf_counter() - start, max(self.rowcount, 0))
+            if has_app_context():
+                queries = g.get("queries")
+                if queries is not None:
+                    queries.append(query)
+                else:
+                    get_query_stats().record(query)
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sql, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sql, super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(sql_script, super().executescript, sql_script)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        rows = method(*args)
+        if self._query is not None:
+            count = len(rows) if isinstance(rows, list) else int(rows is not None)
+            self._query.add(time.perf_counter() - start, count)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    The class represents a sqlite3.Connection whose cursors are InstrumentedCursors.
+
+    Connection.execute() and its variants are shortcuts that create a cursor and are
+    redirected to an InstrumentedCursor so every statement is recorded.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def get_query_stats() -> QueryStats:
+    """Return the application's aggregated query statistics, creating them on first use.
+
+    Returns
+    -------
+    QueryStats
+        The application's aggregated query statistics.
+    """
+    stats = current_app.extensions.get('query_stats')
+    if stats is None:
+        stats = current_app.extensions.setdefault('query_stats', QueryStats())
+    return stats
+
+
+def reset_request_queries():
+    """Start recording the queries of a request on g.queries.
+    """
+    g.queries = []
+
+
+def summarise_request_queries(response: Response) -> Response:
+    """Log the query summary of a request and add its Server-Timing header.
+
+    The query count and total database time are logged at debug level, statements repeated
+    at least DB_REPEATED_QUERY_THRESHOLD times, such as N+1 queries, are logged as warnings
+    and the aggregated statistics are written to the instance folder every
+    DB_STATS_FLUSH_SECONDS seconds.
+
+    Parameters
+    ----------
+    response : Response
+        The response of the request.
+
+    Returns
+    -------
+    Response
+        The response, with a "db" Server-Timing metric if SERVER_TIMING is enabled.
+    """
+    queries = g.pop("queries", None)
+    if queries is None:
+        return response
+    total_ms = sum(query.duration for query in queries) * 1000
+    logger.debug("%s %s: %d queries in %.1fms", request.method, request.path, len(queries), total_ms)
+    threshold = current_app.config['DB_REPEATED_QUERY_THRESHOLD']
+    for sql, count in Counter(query.sql for query in queries).items():
+        if count >= threshold:
+            logger.warning("Query repeated %d times in %s: %s", count, request.path, sql)
+    if current_app.config['SERVER_TIMING']:
+        response.headers.add("Server-Timing", f'db;dur={total_ms:.1f};desc="{len(queries)} queries"')
+
+    stats = get_query_stats()
+    for query in queries:
+        stats.record(query)
+    if time.monotonic() - stats.last_flush >= current_app.config['DB_STATS_FLUSH_SECONDS']:
+        flush_query_stats()
+    return response
+
+
+def _stats_dir() -> str:
+    return os.path.join(current_app.instance_path, 'query_stats')
+
+
+def flush_query_stats():
+    """Write the aggregated query statistics of this process to the instance folder.
+
+    Each process writes its own file, named by its process id, so statistics from every
+    worker can be combined by load_query_stats().
+    """
+    stats = get_query_stats()
+    stats.last_flush = time.monotonic()
+    os.makedirs(_stats_dir(), exist_ok=True)
+    path = os.path.join(_stats_dir(), f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(stats.snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def load_query_stats() -> dict:
+    """Return the aggregated query statistics written by every process.
+
+    Returns
+    -------
+    dict
+        The statistics keyed by normalised query, combined over every process.
+    """
+    combined = {}
+    if not os.path.isdir(_stats_dir()):
+        return combined
+    for name in os.listdir(_stats_dir()):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(_stats_dir(), name)) as f:
+            for sql, stats in json.load(f).items():
+                total = combined.setdefault(sql, {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "call_sites": {}})
+                total["count"] += stats["count"]
+                total["total_ms"] += stats["total_ms"]
+                total["max_ms"] = max(total["max_ms"], stats["max_ms"])
+                total["rows"] += stats["rows"]
+                for call_site, count in stats["call_sites"].items():
+                    total["call_sites"][call_site] = total["call_sites"].get(call_site, 0) + count
+    return combined
+
+
+@click.command('query-stats')
+@click.option('--sort', type=click.Choice(['total', 'count', 'max']), default='total',
+              help='The statistic to sort queries by.')
+@click.option('--limit', type=int, default=20, help='The number of queries to print.')
+@click.option('--reset', is_flag=True, help='Remove the recorded statistics after printing.')
+@with_appcontext
+def query_stats_command(sort: str, limit: int, reset: bool):
+    """Print query statistics aggregated per normalised query.
+    """
+    key = {"total": "total_ms", "count": "count", "max": "max_ms"}[sort]
+    combined = load_query_stats()
+    if not combined:
+        click.echo('No query statistics have been recorded.')
+    for sql, stats in sorted(combined.items(), key=lambda item: item[1][key], reverse=True)[:limit]:
+        click.echo(f'{stats["count"]:>8} calls {stats["total_ms"]:>10.1f}ms total '
+                   f'{stats["max_ms"]:>8.1f}ms max {stats["rows"]:>8} rows  {sql}')
+        for call_site, count in sorted(stats["call_sites"].items(), key=lambda item: -item[1]):
+            click.echo(f'{"":>10}{count:>8} from {call_site}')
+    if reset and os.path.isdir(_stats_dir()):
+        for name in os.listdir(_stats_dir()):
+            os.remove(os.path.join(_stats_dir(), name))
+
+
+def init_app(app):
+    """Register the query recording hooks and query_stats_command() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    if app.config['DB_INSTRUMENTATION']:
+        app.before_request(reset_request_queries)
+        app.after_request(summarise_request_queries)
+    app.cli.add_command(query_stats_command)
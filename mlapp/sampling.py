@@ -0,0 +1,244 @@
+"""
+Functions and classes used to analyse a bounded sample of a video's comments.
+
+A video with hundreds of thousands of comments does not need every comment predicted to estimate its share
+of misinformation. In sampling mode an analysis holds at most max_comments comments, so both the memory used
+and the time spent predicting are bounded by the sample size rather than the size of the video. Comments are
+added to the sample as the pages of commentThreads are streamed (See protected and youtube):
+
+- "first" keeps the first max_comments comments and stops fetching pages once it has them, the cheapest
+  sample, but only representative if the order comments are listed in is unrelated to their content.
+- "reservoir" fetches every page and keeps a uniform random sample of max_comments comments of the video,
+  with reservoir sampling (Vitter's Algorithm R).
+
+The share of misinformation in the sample is reported with its Wilson score interval, which stays within
+(0-1) and keeps its coverage for small samples and shares close to 0 or 1.
+
+Functions:
+- get_sampler: Return a sampler for the sampling method and maximum comment count of an analysis.
+- wilson_interval: Return the Wilson score interval of a proportion.
+- summarise_sample: Return the sample's size and the estimated share of misinformation with its confidence interval.
+
+Classes:
+- FirstSampler: A sample of the first comments of a video.
+- ReservoirSampler: A uniform random sample of the comments of a video.
+"""
+import math
+import random
+from statistics import NormalDist
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from flask import current_app, has_app_context
+from numpy import ndarray
+
+
+class FirstSampler(object):
+    """
+    The class represents a sample of the first comments of a video.
+
+    Comments are added with append and extend, as to a list, and those after the first size comments are
+    ignored.
+
+    Parameters
+    ----------
+    size : int
+        The most comments in the sample.
+
+    Attributes
+    ----------
+    method : str
+        The sampling method, "first".
+    seen : int
+        The number of comments added to the sampler.
+
+    Methods
+    -------
+    append(comment)
+        Add a comment to the sample.
+    extend(comments)
+        Add comments to the sample.
+    """
+    method = "first"
+
+    def __init__(self, size: int):
+        self.size = size
+        self.seen = 0
+        self._comments = []
+
+    def __len__(self) -> int:
+        return len(self._comments)
+
+    def append(self, comment: str):
+        """Add a comment to the sample, unless it already has size comments."""
+        self.seen += 1
+        if len(self._comments) < self.size:
+            self._comments.append(comment)
+
+    def extend(self, comments: Iterable[str]):
+        """Add comments to the sample, unless it already has size comments."""
+        for comment in comments:
+            self.append(comment)
+
+    @property
+    def complete(self) -> bool:
+        """Whether adding more comments would not change the sample, so no more pages need to be fetched."""
+        return len(self._comments) >= self.size
+
+    @property
+    def comments(self) -> List[str]:
+        """The comments of the sample in the order they were added."""
+        return self._comments
+
+
+class ReservoirSampler(FirstSampler):
+    """
+    The class represents a uniform random sample of the comments of a video.
+
+    The first size comments fill the reservoir, then the nth comment replaces a random comment of the
+    reservoir with probability size / n, so every comment added is equally likely to be in the sample.
+
+    Parameters
+    ----------
+    size : int
+        The most comments in the sample.
+    rng : Optional[random.Random], optional
+        The random number generator, by default a new one seeded from the operating system.
+
+    Attributes
+    ----------
+    method : str
+        The sampling method, "reservoir".
+    seen : int
+        The number of comments added to the sampler.
+
+    Methods
+    -------
+    append(comment)
+        Add a comment to the sample.
+    extend(comments)
+        Add comments to the sample.
+    """
+    method = "reservoir"
+
+    def __init__(self, size: int, rng: Optional[random.Random] = None):
+        super().__init__(size)
+        self.rng = rng or random.Random()
+        # the position of each comment of the reservoir, to return them in the order they were added.
+        self._positions = []
+
+    def append(self, comment: str):
+        """Add a comment to the reservoir, replacing a random comment once it is full."""
+        if len(self._comments) < self.size:
+            self._comments.append(comment)
+            self._positions.append(self.seen)
+        else:
+            index = self.rng.randrange(self.seen + 1)
+            if index < self.size:
+                self._comments[index] = comment
+                self._positions[index] = self.seen
+        self.seen += 1
+
+    @property
+    def complete(self) -> bool:
+        """Whether adding more comments would not change the sample, never as every comment may be sampled."""
+        return False
+
+    @property
+    def comments(self) -> List[str]:
+        """The comments of the sample in the order they were added."""
+        return [comment for _, comment in sorted(zip(self._positions, self._comments))]
+
+
+SAMPLERS = {sampler.method: sampler for sampler in (FirstSampler, ReservoirSampler)}
+
+
+def get_sampler(method: str, max_comments: Optional[int]) -> FirstSampler:
+    """Return a sampler for the sampling method and maximum comment count of an analysis.
+
+    Parameters
+    ----------
+    method : str
+        The sampling method, "first" or "reservoir".
+    max_comments : Optional[int]
+        The most comments analysed, at most ANALYSIS_MAX_COMMENTS.
+
+    Returns
+    -------
+    FirstSampler
+        The sampler.
+
+    Raises
+    ------
+    ValueError
+        Raised if the sampling method is unknown or the maximum comment count is not a positive integer
+        within ANALYSIS_MAX_COMMENTS.
+    """
+    if method not in SAMPLERS:
+        raise ValueError(f"The sampling method must be one of: {', '.join(SAMPLERS)}.")
+    limit = current_app.config['ANALYSIS_MAX_COMMENTS'] if has_app_context() else None
+    if not max_comments or max_comments < 1 or (limit and max_comments > limit):
+        raise ValueError(f"The maximum comment count must be a whole number from 1 to {limit or 'any'}.")
+    return SAMPLERS[method](max_comments)
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Return the Wilson score interval of a proportion.
+
+    Parameters
+    ----------
+    successes : int
+        The number of trials that were successes.
+    trials : int
+        The number of trials.
+    confidence : float, optional
+        The confidence level of the interval, by default 0.95.
+
+    Returns
+    -------
+    Tuple[float, float]
+        The lower and upper bounds of the interval, (0.0, 1.0) if there were no trials.
+    """
+    if not trials:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    share = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (share + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(share * (1 - share) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def summarise_sample(sampler: FirstSampler, predictions: ndarray, prediction_threshold: float = 0.5,
+                     confidence: float = 0.95) -> Dict:
+    """Return the sample's size and the estimated share of misinformation with its confidence interval.
+
+    Parameters
+    ----------
+    sampler : FirstSampler
+        The sampler of the analysed comments.
+    predictions : ndarray
+        A NumPy array of the TensorFlow model's predictions for the sampled comments.
+    prediction_threshold : float, optional
+        Any TensorFlow model prediction values equal to or greater than the prediction_threshold
+        are classified as "Misinformation", by default 0.5.
+    confidence : float, optional
+        The confidence level of the interval, by default 0.95.
+
+    Returns
+    -------
+    Dict
+        The sampling "method", the "size" of the sample, the comments "seen" by the sampler, the
+        "misinformation_share" of the sample, the "confidence" level and the Wilson score "interval"
+        of the share.
+    """
+    # the same rounding and threshold as the classifications of the analysed comments (See protected).
+    values = np.round(predictions.reshape(-1).astype(np.float64), 3)
+    misinformation = int(np.count_nonzero(values >= prediction_threshold))
+    low, high = wilson_interval(misinformation, values.size, confidence)
+    return {"method": sampler.method,
+            "size": int(values.size),
+            "seen": sampler.seen,
+            "misinformation_share": misinformation / values.size if values.size else 0.0,
+            "confidence": confidence,
+            "interval": [round(low, 4), round(high, 4)],
+            }
@@ -2,6 +2,14 @@
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS issue;
 DROP TABLE IF EXISTS classification;
+DROP TABLE IF EXISTS issue_count_by_classification;
+DROP TABLE IF EXISTS issue_count_by_author;
+DROP TABLE IF EXISTS issue_count_by_day;
+DROP TABLE IF EXISTS cache_generation;
+DROP TABLE IF EXISTS fetch_checkpoint;
+DROP TABLE IF EXISTS fetch_checkpoint_chunk;
+DROP TABLE IF EXISTS analysis;
+DROP TABLE IF EXISTS analysis_chunk;
 -- Foreign-key constraints are not enforced by default in SQLite
 -- The command below enables foreign keys
 PRAGMA foreign_keys = ON;
@@ -23,7 +31,157 @@ CREATE TABLE issue (
   FOREIGN KEY (classified_id) REFERENCES classification (classification_id)
 );
 
+-- Issues are listed newest first and paginated by (date_created, issue_id).
+CREATE INDEX issue_date_created ON issue (date_created DESC, issue_id DESC);
+
 CREATE TABLE classification (
   classification_id INTEGER PRIMARY KEY AUTOINCREMENT,
   classification TEXT UNIQUE NOT NULL
-)
\ No newline at end of file
+);
+
+-- Summary tables of issue counts.
+-- These are maintained incrementally by the triggers below so that statistics
+-- can be read without aggregating over the issue table.
+CREATE TABLE issue_count_by_classification (
+  classification_id INTEGER PRIMARY KEY,
+  issue_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE issue_count_by_author (
+  author_id INTEGER PRIMARY KEY,
+  issue_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE issue_count_by_day (
+  day TEXT PRIMARY KEY,
+  issue_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Increment the summary counts for a new issue.
+CREATE TRIGGER issue_count_insert AFTER INSERT ON issue
+BEGIN
+  INSERT INTO issue_count_by_classification (classification_id, issue_count)
+  VALUES (NEW.classified_id, 1)
+  ON CONFLICT (classification_id) DO UPDATE SET issue_count = issue_count + 1;
+  INSERT INTO issue_count_by_author (author_id, issue_count)
+  VALUES (NEW.author_id, 1)
+  ON CONFLICT (author_id) DO UPDATE SET issue_count = issue_count + 1;
+  INSERT INTO issue_count_by_day (day, issue_count)
+  VALUES (date(NEW.date_created), 1)
+  ON CONFLICT (day) DO UPDATE SET issue_count = issue_count + 1;
+END;
+
+-- Decrement the summary counts for a deleted issue and remove empty counts.
+CREATE TRIGGER issue_count_delete AFTER DELETE ON issue
+BEGIN
+  UPDATE issue_count_by_classification SET issue_count = issue_count - 1
+  WHERE classification_id = OLD.classified_id;
+  DELETE FROM issue_count_by_classification
+  WHERE classification_id = OLD.classified_id AND issue_count <= 0;
+  UPDATE issue_count_by_author SET issue_count = issue_count - 1
+  WHERE author_id = OLD.author_id;
+  DELETE FROM issue_count_by_author
+  WHERE author_id = OLD.author_id AND issue_count <= 0;
+  UPDATE issue_count_by_day SET issue_count = issue_count - 1
+  WHERE day = date(OLD.date_created);
+  DELETE FROM issue_count_by_day
+  WHERE day = date(OLD.date_created) AND issue_count <= 0;
+END;
+
+-- Move an issue's counts when any of its counted columns change.
+CREATE TRIGGER issue_count_update AFTER UPDATE OF classified_id, author_id, date_created ON issue
+BEGIN
+  UPDATE issue_count_by_classification SET issue_count = issue_count - 1
+  WHERE classification_id = OLD.classified_id;
+  DELETE FROM issue_count_by_classification
+  WHERE classification_id = OLD.classified_id AND issue_count <= 0;
+  UPDATE issue_count_by_author SET issue_count = issue_count - 1
+  WHERE author_id = OLD.author_id;
+  DELETE FROM issue_count_by_author
+  WHERE author_id = OLD.author_id AND issue_count <= 0;
+  UPDATE issue_count_by_day SET issue_count = issue_count - 1
+  WHERE day = date(OLD.date_created);
+  DELETE FROM issue_count_by_day
+  WHERE day = date(OLD.date_created) AND issue_count <= 0;
+  INSERT INTO issue_count_by_classification (classification_id, issue_count)
+  VALUES (NEW.classified_id, 1)
+  ON CONFLICT (classification_id) DO UPDATE SET issue_count = issue_count + 1;
+  INSERT INTO issue_count_by_author (author_id, issue_count)
+  VALUES (NEW.author_id, 1)
+  ON CONFLICT (author_id) DO UPDATE SET issue_count = issue_count + 1;
+  INSERT INTO issue_count_by_day (day, issue_count)
+  VALUES (date(NEW.date_created), 1)
+  ON CONFLICT (day) DO UPDATE SET issue_count = issue_count + 1;
+END;
+
+-- Generations of cached data, incremented by the triggers below whenever the data changes
+-- so that every worker process stops using its cached copies (See fragment_cache).
+CREATE TABLE cache_generation (
+  name TEXT PRIMARY KEY,
+  generation INTEGER NOT NULL DEFAULT 0
+);
+INSERT INTO cache_generation (name, generation) VALUES ('issues', 0);
+
+CREATE TRIGGER issue_generation_insert AFTER INSERT ON issue
+BEGIN
+  UPDATE cache_generation SET generation = generation + 1 WHERE name = 'issues';
+END;
+
+CREATE TRIGGER issue_generation_delete AFTER DELETE ON issue
+BEGIN
+  UPDATE cache_generation SET generation = generation + 1 WHERE name = 'issues';
+END;
+
+CREATE TRIGGER issue_generation_update AFTER UPDATE ON issue
+BEGIN
+  UPDATE cache_generation SET generation = generation + 1 WHERE name = 'issues';
+END;
+
+-- Checkpoints of long fetches of a video's comments, so that a failed or restarted analysis of
+-- the video resumes from the checkpointed page token instead of the first page (See checkpoints).
+CREATE TABLE fetch_checkpoint (
+  video_id TEXT PRIMARY KEY,
+  fetch_id TEXT NOT NULL,
+  mode TEXT NOT NULL,
+  page_token TEXT NOT NULL,
+  pages INTEGER NOT NULL,
+  updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Expired checkpoints are deleted by their last update.
+CREATE INDEX fetch_checkpoint_updated ON fetch_checkpoint (updated);
+
+-- The comments fetched between consecutive checkpoints, as zlib compressed JSON arrays.
+CREATE TABLE fetch_checkpoint_chunk (
+  video_id TEXT NOT NULL,
+  chunk INTEGER NOT NULL,
+  comments BLOB NOT NULL,
+  PRIMARY KEY (video_id, chunk)
+);
+
+-- Analyses made in summary mode, so that pages of their comments can be fetched from any worker
+-- process (See api), with the number of comments and the number of comments in each chunk.
+CREATE TABLE analysis (
+  analysis_id TEXT PRIMARY KEY,
+  user_id INTEGER NOT NULL,
+  total INTEGER NOT NULL,
+  chunk_size INTEGER NOT NULL,
+  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES user (user_id) ON DELETE CASCADE
+);
+
+-- Expired analyses are deleted by their creation time.
+CREATE INDEX analysis_created ON analysis (created);
+
+-- A user's analyses beyond their most recent are deleted by user.
+CREATE INDEX analysis_user_id ON analysis (user_id);
+
+-- The chunks of an analysis's comments, as zlib compressed JSON arrays, and their prediction values,
+-- as the bytes of float64 arrays.
+CREATE TABLE analysis_chunk (
+  analysis_id TEXT NOT NULL,
+  chunk INTEGER NOT NULL,
+  comments BLOB NOT NULL,
+  prediction_values BLOB NOT NULL,
+  PRIMARY KEY (analysis_id, chunk)
+);
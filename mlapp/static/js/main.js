@@ -1,3 +1,10 @@
+// results with more comments than this are rendered as a virtual list, see render_virtual_list.
+const VIRTUAL_LIST_MIN_COMMENTS = 20;
+// the fixed height in pixels of a virtual list row, matching .virtual-list-row in main.css.
+const VIRTUAL_LIST_ROW_HEIGHT = 136;
+// rows rendered above and below the visible rows so fast scrolling does not show blank space.
+const VIRTUAL_LIST_OVERSCAN = 10;
+
 async function analyse_comments(comment_source) {
     // change button to have bootstrap spinner while analysing comment data.
     document.getElementById(`analyse_${comment_source}_comments_button_body`).classList.add("spinner-border", "spinner-border-sm");
@@ -7,25 +14,41 @@ async function analyse_comments(comment_source) {
     let input = document.getElementById(`${comment_source}_comments_input`);
     let data = new FormData()
     data.append("input", input.value)
-    // use fetch api to send request and return a response.
-    fetch(`${window.origin}/analyse_comments/${comment_source}`, {
+    let analyserResult = document.querySelector(`#analyser_${comment_source}_result`);
+    // use fetch api to send request to the JSON API and render its columns of analysed comments.
+    // a video's analysis is summarised and its comments are fetched in pages when they are shown.
+    let mode = comment_source === "youtube_video" ? "?mode=summary" : "";
+    fetch(`${window.origin}/api/v1/analyse_comments/${comment_source}${mode}`, {
         method: "POST",
         credentials: "include",
         body: data,
         cache: "no-cache",
     }).then(function (response) {
-        if (!response.ok) {
-            throw new Error(`Response status was not 200-299: ${response.status}`)
-        }
-        return response.text()
-    }).then(function (html) {
-        // use DOMParser to parse string into a DOM Document.
-        let parser = new DOMParser();
-        let doc = parser.parseFromString(html, "text/html");
-        let analyserResult = document.querySelector(`#analyser_${comment_source}_result`);
-        analyserResult.innerHTML = doc.body.innerHTML;
+        // an HTML error page, or the login page the request is redirected to once the session has expired,
+        // is not JSON.
+        let contentType = response.headers.get("Content-Type") || "";
+        if (!contentType.includes("application/json")) {
+            analyserResult.innerHTML = response.redirected
+                ? render_analyser_error("LoginRequired", "Your session has expired, log in again to analyse comments.")
+                : render_analyser_error(response.status, "The server returned an unexpected response, try analysing the comments again.");
+            return;
+        }
+        return response.json().then(function (analysis) {
+            if (!response.ok) {
+                analyserResult.innerHTML = render_analyser_error(analysis.error_type || response.status, analysis.error);
+                return;
+            }
+            if (analysis.summary) {
+                render_analysis_summary(analyserResult, analysis);
+            } else if (analysis.count > VIRTUAL_LIST_MIN_COMMENTS) {
+                render_virtual_list(analyserResult, analysis);
+            } else {
+                analyserResult.innerHTML = render_analysed_comments(analysis, analyserResult.dataset);
+            }
+        });
     }).catch(function (error) {
         console.error(`Error analysing ${comment_source} comments: ${error.message}`);
+        analyserResult.innerHTML = render_analyser_error("Error", `The comments could not be analysed: ${error.message}`);
     });
     // revert button after 1 second.
     setTimeout(() => {
@@ -34,3 +57,416 @@ async function analyse_comments(comment_source) {
         document.getElementById(`analyse_${comment_source}_comments_button_text`).textContent = "Analyse";
     }, 1000)
 }
+
+function escape_html(text) {
+    return String(text).replace(/[&<>"']/g, (character) => ({
+        "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;",
+    })[character]);
+}
+
+function truncation_message(analysis) {
+    // the same message as protected/analysed_comments.html.
+    if (analysis.truncated === "quota") {
+        return `Only the first ${analysis.count} comments were analysed as the YouTube Data API quota was used up.`;
+    }
+    return `Only the first ${analysis.count} comments were analysed as the video exceeded the
+            analysis's ${analysis.truncated === "comments" ? "comment" : "memory"} limit.`;
+}
+
+function render_analyser_error(error_type, error_message) {
+    // the same markup as protected/analyser_error.html.
+    return `<div class="row justify-content-center"><div class="col-8">
+        <div class="alert alert-warning alert-dismissible fade show" role="alert">
+            <strong>${escape_html(error_type)}:</strong> ${escape_html(error_message)}
+            <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
+        </div></div></div>`;
+}
+
+function render_analysed_comments(analysis, options) {
+    // build the markup of protected/analysed_comments.html from the API's columns in one string,
+    // so the browser parses it once.
+    let parts = [`<div class="row justify-content-center analysed-comments">
+        <div class="col-8 d-flex justify-content-between align-items-center mb-3">
+            <span class="bulk-issue-result"></span>
+            <button class="btn btn-dark" type="button" onclick="submit_bulk_issues(this)">Submit Selected Issues</button>
+        </div>`];
+    if (analysis.truncated) {
+        parts.push(`<div class="col-8"><div class="alert alert-warning analysis-truncated" role="alert">
+            ${truncation_message(analysis)}</div></div>`);
+    }
+    let userId = escape_html(options.userId);
+    let issueUrl = escape_html(options.issueUrl);
+    for (let i = 0; i < analysis.count; i++) {
+        let n = i + 1;
+        let comment = escape_html(analysis.comments[i]);
+        let classificationId = analysis.classification_ids[i];
+        let classification = escape_html(analysis.classifications[classificationId]);
+        let alertClass = analysis.classifications[classificationId] === "Misinformation" ? "alert-danger" : "alert-success";
+        parts.push(`<div class="col-8">
+        <div class="alert ${alertClass}" id="comment_classification${n}" role="alert">
+            <div class="d-flex justify-content-between">
+                <div class="d-flex">
+                    <input class="form-check-input me-2 bulk-issue-select" type="checkbox" value="${n}"
+                        id="bulk_issue_select${n}" aria-label="Select to raise an issue">
+                    <h4 class="alert-heading" id="classification${n}">${classification}</h4>
+                </div>
+                <div>
+                    <button type="button" class="btn" data-bs-toggle="tooltip" data-bs-placement="top" data-bs-title="This is how confident the model is on its prediction">
+                        Confidence Score: ${analysis.prediction_confidences[i]}%
+                    </button>
+                </div>
+            </div>
+            <p>"${comment}"</p>
+            <hr>
+            <p class="mb-0">Do you agree with DOLOS? If not, raise an issue for the developer!</p>
+        </div>
+        <p>
+            <button class="btn btn-dark" type="button" data-bs-toggle="collapse" data-bs-target="#collapseExample${n}"
+                aria-expanded="false" aria-controls="collapseExample${n}">Raise an Issue</button>
+        </p>
+        <div class="collapse" id="collapseExample${n}">
+            <div class="card card-body">
+                <form action="${issueUrl}" method="POST">
+                    <div class="mb-3">
+                        <label for="classifcation_input${n}" class="form-label">Classification</label>
+                        <input class="form-control" id="classifcation_input${n}" type="text" name="classification"
+                            value="${classification}" aria-label="readonly input example" readonly>
+                    </div>
+                    <input id="classification_id${n}" name="classification_id" value="${classificationId}" hidden>
+                    <div class="mb-3">
+                        <label for="comment_input${n}" class="form-label">Comment</label>
+                        <input class="form-control" id="comment_input${n}" type="text" name="comment"
+                            value="${comment}" aria-label="readonly input example" readonly>
+                    </div>
+                    <div class="mb-3">
+                        <label for="issue${n}" class="form-label">Issue Details</label>
+                        <textarea type="text" rows="3" class="form-control" id="issue${n}" name="issue"></textarea>
+                    </div>
+                    <input id="user_id${n}" name="user_id" value="${userId}" hidden>
+                    <button class="btn btn-dark" type="submit" value="Submit Issue">Submit Issue</button>
+                </form>
+                <p class="mt-2">
+                    Once DOLOS has analysed and classified a comment, sometimes it gets it wrong. By
+                    submitting the issue above you are letting the developer and others know about issues
+                    that allow improvements to be made to DOLOS!
+                </p>
+            </div>
+        </div>
+    </div>`);
+    }
+    parts.push("</div>");
+    return parts.join("");
+}
+
+async function submit_bulk_issues(button) {
+    // raise an issue for every selected comment of an analysed result in one request.
+    let result = button.closest(".analysed-comments");
+    let issues = [];
+    let list = result.parentElement.virtualList;
+    if (list && result.classList.contains("virtual-analysed-comments")) {
+        // rows of a virtual list are not all in the DOM, so the selection is read from its state.
+        let issue = result.querySelector(".bulk-issue-details").value;
+        list.selected.forEach(function (row) {
+            issues.push({
+                comment: list.analysis.comments[row],
+                issue: issue,
+                classification_id: list.analysis.classification_ids[row],
+            });
+        });
+    } else {
+        result.querySelectorAll(".bulk-issue-select:checked").forEach(function (checkbox) {
+            let index = checkbox.value;
+            issues.push({
+                comment: result.querySelector(`#comment_input${index}`).value,
+                issue: result.querySelector(`#issue${index}`).value,
+                classification_id: result.querySelector(`#classification_id${index}`).value,
+            });
+        });
+    }
+    let message = result.querySelector(".bulk-issue-result");
+    if (issues.length === 0) {
+        message.textContent = "Select comments to raise issues for.";
+        return;
+    }
+    button.disabled = true;
+    fetch(`${window.origin}/issues/bulk`, {
+        method: "POST",
+        credentials: "include",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ issues: issues }),
+        cache: "no-cache",
+    }).then(function (response) {
+        return response.json();
+    }).then(function (data) {
+        let errorCount = Object.keys(data.errors || {}).length;
+        message.textContent = `${data.created} issues raised` + (errorCount ? `, ${errorCount} invalid.` : ".");
+    }).catch(function (error) {
+        message.textContent = `Error raising issues: ${error.message}`;
+    }).finally(function () {
+        button.disabled = false;
+    });
+}
+
+function render_analysis_summary(container, analysis) {
+    // render the summary of a video's analysis, whose size does not depend on the number of comments.
+    let summary = analysis.summary;
+    let misinformationId = Object.keys(analysis.classifications).find(
+        (id) => analysis.classifications[id] === "Misinformation");
+    let histogram = summary.confidence_histogram;
+    let largest = Math.max(1, ...histogram.counts);
+    let bars = histogram.counts.map((count, bin) => `<div class="d-flex align-items-center mb-1">
+            <span class="summary-bin">${histogram.edges[bin]}-${histogram.edges[bin + 1]}%</span>
+            <div class="progress flex-grow-1 mx-2"><div class="progress-bar bg-dark" style="width: ${100 * count / largest}%"></div></div>
+            <span class="summary-count">${count}</span>
+        </div>`).join("");
+    let percentiles = Object.entries(summary.percentiles).map(([percentile, value]) =>
+        `<td>${percentile}th: ${value === null ? "-" : value}</td>`).join("");
+    let top = summary.top_misinformation.map((comment) => `<li class="list-group-item">
+            <span class="badge bg-danger me-2">${comment.prediction_confidence}%</span>
+            #${comment.comment_number} "${escape_html(comment.comment)}"</li>`).join("");
+    container.innerHTML = `<div class="row justify-content-center analysis-summary">
+        <div class="col-8">
+            ${analysis.truncated ? `<div class="alert alert-warning analysis-truncated" role="alert">
+                ${truncation_message(analysis)}</div>` : ""}
+            <div class="card card-body mb-3">
+                <h4>${analysis.count} comments analysed</h4>
+                <p class="fs-5">${(100 * summary.misinformation_share).toFixed(1)}% misinformation
+                    (${summary.counts[misinformationId] || 0} comments)</p>
+                <table class="table table-sm mb-3"><tr><th>Prediction value percentiles</th>${percentiles}</tr></table>
+                <h5>Confidence distribution</h5>
+                ${bars}
+                <h5 class="mt-3">Most confident misinformation</h5>
+                <ul class="list-group mb-3">${top || '<li class="list-group-item">None</li>'}</ul>
+                ${analysis.analysis_id ? `<div><button class="btn btn-dark analysis-show-comments" type="button">Show Comments</button></div>`
+                    : `<p class="text-muted analysis-not-stored">The analysed comments could not be kept, analyse the video again to view them.</p>`}
+            </div>
+        </div>
+    </div>
+    <div class="analysis-comments"></div>`;
+    let comments = container.querySelector(".analysis-comments");
+    comments.dataset.userId = container.dataset.userId;
+    comments.dataset.issueUrl = container.dataset.issueUrl;
+    if (!analysis.analysis_id) {
+        // the analysis was not stored, so only its summary can be shown.
+        return;
+    }
+    container.querySelector(".analysis-show-comments").addEventListener("click", function (event) {
+        event.target.disabled = true;
+        let loaded = null;
+        let load_page = function () {
+            // fetch the next page of the analysis's comments and append its columns to those loaded.
+            let offset = loaded ? loaded.count : 0;
+            return fetch(`${window.origin}/api/v1/analyses/${analysis.analysis_id}/comments?offset=${offset}`, {
+                credentials: "include",
+                cache: "no-cache",
+            }).then(function (response) {
+                if (!response.ok) {
+                    throw new Error(`The analysis has expired, analyse the video again: ${response.status}`);
+                }
+                return response.json();
+            }).then(function (page) {
+                if (loaded === null) {
+                    loaded = page;
+                    loaded.truncated = analysis.truncated;
+                } else {
+                    for (let column of ["comments", "prediction_values", "prediction_confidences", "classification_ids"]) {
+                        loaded[column].push(...page[column]);
+                    }
+                    loaded.count += page.count;
+                }
+                return page.count > 0 && loaded.count < loaded.total;
+            });
+        };
+        load_page().then(function (more) {
+            render_virtual_list(comments, loaded, more ? load_page : null);
+        }).catch(function (error) {
+            comments.innerHTML = render_analyser_error("Error", error.message);
+        });
+    });
+}
+
+function render_virtual_list(container, analysis, load_more = null) {
+    // keep every analysed comment in the analysis's columns and only add the rows in view to the DOM.
+    // filtering and sorting build an array of the matching row numbers, so neither needs the server.
+    // if load_more is given, it is called to fetch more comments when the last loaded rows are in view.
+    let values = null;
+    let confidences = null;
+    let options = Object.entries(analysis.classifications).map(([id, name]) =>
+        `<option value="${escape_html(id)}">${escape_html(name)}</option>`).join("");
+    container.innerHTML = `<div class="row justify-content-center analysed-comments virtual-analysed-comments">
+        <div class="col-8">
+            ${analysis.truncated ? `<div class="alert alert-warning analysis-truncated" role="alert">
+                ${truncation_message(analysis)}</div>` : ""}
+            <div class="row g-2 align-items-end mb-3 virtual-list-controls">
+                <div class="col-md-3">
+                    <label class="form-label">Classification</label>
+                    <select class="form-select virtual-list-classification"><option value="">All</option>${options}</select>
+                </div>
+                <div class="col-md-2">
+                    <label class="form-label">Min confidence</label>
+                    <input class="form-control virtual-list-min" type="number" min="0" max="100" value="0">
+                </div>
+                <div class="col-md-2">
+                    <label class="form-label">Max confidence</label>
+                    <input class="form-control virtual-list-max" type="number" min="0" max="100" value="100">
+                </div>
+                <div class="col-md-3">
+                    <label class="form-label">Sort by</label>
+                    <select class="form-select virtual-list-sort">
+                        <option value="">Comment order</option>
+                        <option value="desc">Prediction value, highest first</option>
+                        <option value="asc">Prediction value, lowest first</option>
+                    </select>
+                </div>
+                <div class="col-md-2 text-end"><span class="virtual-list-count"></span></div>
+            </div>
+            <div class="virtual-list-viewport">
+                <div class="virtual-list-spacer"><div class="virtual-list-window"></div></div>
+            </div>
+            <div class="my-3">
+                <label class="form-label">Issue details for the selected comments</label>
+                <textarea class="form-control bulk-issue-details" rows="2"></textarea>
+            </div>
+            <div class="d-flex justify-content-between align-items-center mb-3">
+                <span class="bulk-issue-result"></span>
+                <button class="btn btn-dark" type="button" onclick="submit_bulk_issues(this)">Submit Selected Issues</button>
+            </div>
+            <div class="card card-body virtual-list-issue" hidden>
+                <form action="${escape_html(container.dataset.issueUrl)}" method="POST">
+                    <div class="mb-3">
+                        <label class="form-label">Classification</label>
+                        <input class="form-control" type="text" name="classification" readonly>
+                    </div>
+                    <input name="classification_id" hidden>
+                    <div class="mb-3">
+                        <label class="form-label">Comment</label>
+                        <input class="form-control" type="text" name="comment" readonly>
+                    </div>
+                    <div class="mb-3">
+                        <label class="form-label">Issue Details</label>
+                        <textarea rows="3" class="form-control" name="issue"></textarea>
+                    </div>
+                    <input name="user_id" value="${escape_html(container.dataset.userId)}" hidden>
+                    <button class="btn btn-dark" type="submit" value="Submit Issue">Submit Issue</button>
+                </form>
+            </div>
+        </div>
+    </div>`;
+    let list = {
+        analysis: analysis,
+        rows: new Int32Array(0),
+        selected: new Set(),
+        viewport: container.querySelector(".virtual-list-viewport"),
+        spacer: container.querySelector(".virtual-list-spacer"),
+        window: container.querySelector(".virtual-list-window"),
+        frame: null,
+        loading: false,
+    };
+    container.virtualList = list;
+
+    function filter_rows(reset_scroll = true) {
+        if (values === null || values.length !== analysis.count) {
+            values = Float64Array.from(analysis.prediction_values);
+            confidences = Int16Array.from(analysis.prediction_confidences);
+        }
+        let classification = container.querySelector(".virtual-list-classification").value;
+        let min = Number(container.querySelector(".virtual-list-min").value || 0);
+        let max = Number(container.querySelector(".virtual-list-max").value || 100);
+        let sort = container.querySelector(".virtual-list-sort").value;
+        let ids = analysis.classification_ids;
+        let rows = new Int32Array(analysis.count);
+        let length = 0;
+        for (let row = 0; row < analysis.count; row++) {
+            if ((classification === "" || String(ids[row]) === classification)
+                && confidences[row] >= min && confidences[row] <= max) {
+                rows[length++] = row;
+            }
+        }
+        rows = rows.subarray(0, length);
+        if (sort) {
+            let sign = sort === "asc" ? 1 : -1;
+            rows.sort((a, b) => sign * (values[a] - values[b]) || a - b);
+        }
+        list.rows = rows;
+        list.spacer.style.height = `${length * VIRTUAL_LIST_ROW_HEIGHT}px`;
+        container.querySelector(".virtual-list-count").textContent = `${length} of ${analysis.count}`
+            + (analysis.total > analysis.count ? ` loaded (${analysis.total} analysed)` : "");
+        if (reset_scroll) {
+            list.viewport.scrollTop = 0;
+        }
+        render_rows();
+    }
+
+    function render_rows() {
+        list.frame = null;
+        let first = Math.max(0, Math.floor(list.viewport.scrollTop / VIRTUAL_LIST_ROW_HEIGHT) - VIRTUAL_LIST_OVERSCAN);
+        let visible = Math.ceil(list.viewport.clientHeight / VIRTUAL_LIST_ROW_HEIGHT) + 2 * VIRTUAL_LIST_OVERSCAN;
+        let last = Math.min(list.rows.length, first + visible);
+        let parts = [];
+        for (let position = first; position < last; position++) {
+            let row = list.rows[position];
+            let classification = analysis.classifications[analysis.classification_ids[row]];
+            let alertClass = classification === "Misinformation" ? "alert-danger" : "alert-success";
+            let comment = escape_html(analysis.comments[row]);
+            parts.push(`<div class="alert ${alertClass} virtual-list-row" data-row="${row}">
+                <div class="d-flex justify-content-between align-items-center">
+                    <div class="d-flex align-items-center">
+                        <input class="form-check-input me-2 bulk-issue-select" type="checkbox" value="${row + 1}"
+                            aria-label="Select to raise an issue"${list.selected.has(row) ? " checked" : ""}>
+                        <strong>#${row + 1} ${escape_html(classification)}</strong>
+                    </div>
+                    <div>
+                        <span class="me-2">Confidence Score: ${confidences[row]}%</span>
+                        <button class="btn btn-sm btn-dark virtual-list-raise" type="button">Raise an Issue</button>
+                    </div>
+                </div>
+                <p class="mb-0 virtual-list-comment" title="${comment}">"${comment}"</p>
+            </div>`);
+        }
+        list.window.style.transform = `translateY(${first * VIRTUAL_LIST_ROW_HEIGHT}px)`;
+        list.window.innerHTML = parts.join("");
+        if (load_more !== null && !list.loading && last >= list.rows.length - VIRTUAL_LIST_OVERSCAN) {
+            list.loading = true;
+            load_more().then(function (more) {
+                list.loading = false;
+                if (!more) {
+                    load_more = null;
+                }
+                filter_rows(false);
+            }).catch(function (error) {
+                load_more = null;
+                container.querySelector(".virtual-list-count").textContent = error.message;
+            });
+        }
+    }
+
+    list.viewport.addEventListener("scroll", function () {
+        // render at most once per frame however many scroll events are fired.
+        if (list.frame === null) {
+            list.frame = requestAnimationFrame(render_rows);
+        }
+    }, { passive: true });
+    list.window.addEventListener("change", function (event) {
+        if (event.target.classList.contains("bulk-issue-select")) {
+            let row = Number(event.target.closest(".virtual-list-row").dataset.row);
+            event.target.checked ? list.selected.add(row) : list.selected.delete(row);
+        }
+    });
+    list.window.addEventListener("click", function (event) {
+        if (!event.target.classList.contains("virtual-list-raise")) {
+            return;
+        }
+        // rows are replaced while scrolling, so one issue form outside the list is filled with the row's comment.
+        let row = Number(event.target.closest(".virtual-list-row").dataset.row);
+        let issue = container.querySelector(".virtual-list-issue");
+        let form = issue.querySelector("form");
+        form.elements.classification.value = analysis.classifications[analysis.classification_ids[row]];
+        form.elements.classification_id.value = analysis.classification_ids[row];
+        form.elements.comment.value = analysis.comments[row];
+        issue.hidden = false;
+        form.elements.issue.focus();
+    });
+    container.querySelectorAll(".virtual-list-controls select, .virtual-list-controls input").forEach(
+        (control) => control.addEventListener("change", () => filter_rows()));
+    filter_rows();
+}
@@ -0,0 +1,208 @@
+"""
+This module contains a Blueprint to register view functions for issue statistics and their related functions.
+
+Issue statistics are read from summary tables that SQLite triggers keep up to date whenever
+an issue is inserted, updated or deleted (See schema.sql). Reading statistics therefore
+never aggregates over the issue table.
+
+Functions:
+- issue_stats: View function used to return issue statistics as JSON.
+- get_issue_stats: Return issue counts per classification, per author and per day.
+- get_author_issue_count: Return the number of issues raised by an author.
+- recompute_issue_stats: Return issue counts recomputed from the issue table.
+- diff_issue_stats: Return the differences between the summary tables and recomputed counts.
+- repair_issue_stats: Rebuild the summary tables from recomputed counts.
+- verify_issue_stats_command: Click command used to verify, and optionally repair, the summary tables.
+- init_app: Register the issue statistics Click command with the application instance.
+"""
+import click
+from flask import Blueprint, jsonify, request, Response
+from flask.cli import with_appcontext
+from mlapp.db import get_db
+from mlapp.auth import login_required
+
+stats_bp = Blueprint('stats', __name__, url_prefix='/stats')
+
+# summary table name -> (key column, the issue column or expression the key is computed from).
+SUMMARY_TABLES = {
+    "issue_count_by_classification": ("classification_id", "classified_id"),
+    "issue_count_by_author": ("author_id", "author_id"),
+    "issue_count_by_day": ("day", "date(date_created)"),
+}
+DEFAULT_DAYS = 30
+
+
+@stats_bp.route('/issues', methods=["GET"])
+@login_required
+def issue_stats() -> Response:
+    """The issue statistics view function.
+
+    Returns issue counts per classification, per author and per day as JSON.
+    The number of most recent days returned can be set with the "days" query parameter.
+
+    Returns
+    -------
+    Response
+        A JSON Response of issue statistics.
+    """
+    days = request.args.get("days", default=DEFAULT_DAYS, type=int)
+    return jsonify(get_issue_stats(days=days))
+
+
+def get_issue_stats(days: int = DEFAULT_DAYS) -> dict:
+    """Return issue counts per classification, per author and per day.
+
+    Only the summary tables, and the small user and classification tables, are read;
+    the cost of this function does not grow with the number of issues.
+
+    Parameters
+    ----------
+    days : int, optional
+        The number of most recent days with issues to return, by default DEFAULT_DAYS.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the total number of issues and lists of counts
+        by classification, by author and by day.
+    """
+    db = get_db()
+    by_classification = db.execute(
+        "SELECT c.classification_id, c.classification, \
+        COALESCE(s.issue_count, 0) AS issue_count \
+        FROM classification AS c \
+        LEFT JOIN issue_count_by_classification AS s \
+        ON c.classification_id = s.classification_id \
+        ORDER BY c.classification_id"
+    ).fetchall()
+    by_author = db.execute(
+        "SELECT s.author_id, u.email, s.issue_count \
+        FROM issue_count_by_author AS s \
+        INNER JOIN user AS u \
+        ON s.author_id = u.user_id \
+        ORDER BY s.issue_count DESC, s.author_id"
+    ).fetchall()
+    by_day = db.execute(
+        "SELECT day, issue_count \
+        FROM issue_count_by_day \
+        ORDER BY day DESC \
+        LIMIT ?",
+        (days,)
+    ).fetchall()
+
+    return {
+        "total": sum(row['issue_count'] for row in by_classification),
+        "by_classification": [dict(row) for row in by_classification],
+        "by_author": [dict(row) for row in by_author],
+        "by_day": [dict(row) for row in by_day],
+    }
+
+
+def get_author_issue_count(author_id: int) -> int:
+    """Return the number of issues raised by an author.
+
+    Parameters
+    ----------
+    author_id : int
+        The user primary key id number of the issue author.
+
+    Returns
+    -------
+    int
+        The number of issues raised by the author.
+    """
+    row = get_db().execute(
+        "SELECT issue_count FROM issue_count_by_author WHERE author_id = ?",
+        (author_id,)
+    ).fetchone()
+    return 0 if row is None else row['issue_count']
+
+
+def recompute_issue_stats() -> dict[str, dict]:
+    """Return issue counts recomputed from scratch with GROUP BY over the issue table.
+
+    Returns
+    -------
+    dict[str, dict]
+        A dictionary keyed by summary table name whose values map each key to its issue count.
+    """
+    db = get_db()
+    recomputed = {}
+    for table, (_, expression) in SUMMARY_TABLES.items():
+        rows = db.execute(
+            f"SELECT {expression} AS key, COUNT(*) AS issue_count FROM issue GROUP BY key"
+        ).fetchall()
+        recomputed[table] = {row['key']: row['issue_count'] for row in rows}
+    return recomputed
+
+
+def diff_issue_stats() -> dict[str, dict]:
+    """Return the differences between the summary tables and the recomputed issue counts.
+
+    Returns
+    -------
+    dict[str, dict]
+        A dictionary keyed by summary table name whose values map each mismatched key to a
+        tuple of the (stored, recomputed) issue counts. Tables without differences are omitted.
+    """
+    db = get_db()
+    recomputed = recompute_issue_stats()
+    differences = {}
+    for table, (key_column, _) in SUMMARY_TABLES.items():
+        stored = {row[0]: row[1] for row in db.execute(
+            f"SELECT {key_column}, issue_count FROM {table}"
+        )}
+        expected = recomputed[table]
+        mismatched = {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
+        if mismatched:
+            differences[table] = mismatched
+    return differences
+
+
+def repair_issue_stats():
+    """Rebuild the summary tables from the recomputed issue counts in one transaction.
+    """
+    db = get_db()
+    recomputed = recompute_issue_stats()
+    with db:
+        for table, (key_column, _) in SUMMARY_TABLES.items():
+            db.execute(f"DELETE FROM {table}")
+            db.executemany(
+                f"INSERT INTO {table} ({key_column}, issue_count) VALUES (?, ?)",
+                recomputed[table].items()
+            )
+
+
+@click.command('verify-issue-stats')
+@click.option('--repair', is_flag=True, help='Rebuild the summary tables if differences are found.')
+@with_appcontext
+def verify_issue_stats_command(repair: bool):
+    """Recompute issue statistics from the issue table and report any differences.
+    """
+    differences = diff_issue_stats()
+    if not differences:
+        click.echo('Issue statistics are consistent.')
+        return
+    for table, mismatched in differences.items():
+        for key, (stored, expected) in sorted(mismatched.items(), key=lambda item: str(item[0])):
+            click.echo(f'{table}: {key} stored={stored} recomputed={expected}')
+    if repair:
+        repair_issue_stats()
+        click.echo('Issue statistics repaired.')
+    else:
+        raise click.ClickException('Issue statistics differ from the issue table.')
+
+
+def init_app(app):
+    """Register the verify_issue_stats_command() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.cli.add_command(verify_issue_stats_command)
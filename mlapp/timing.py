@@ -0,0 +1,156 @@
+"""
+Functions used to time the phases of a request and return them in a Server-Timing header.
+
+A view function wraps each phase of its work in timed(). The durations are recorded on
+g.timings, are available to the view to log, and are returned in a Server-Timing response
+header when SERVER_TIMING is enabled so they can be read in the browser's developer tools.
+
+Functions:
+- timed: Context manager used to time a phase of the current request.
+- record_timing: Record a phase of the current request that was timed by the caller.
+- get_timings: Return the phases timed during the current request.
+- total_timings: Return the total milliseconds spent in each phase.
+- format_timings: Return phase timings as name_ms=milliseconds pairs for a log line.
+- add_server_timing: Add the phases timed during a request to its Server-Timing header.
+- init_app: Register the Server-Timing request hook with the application instance.
+"""
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from flask import current_app, g, has_request_context, Response
+
+# characters that are not allowed in a Server-Timing metric name.
+_INVALID_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+@contextmanager
+def timed(name: str, description: Optional[str] = None):
+    """Context manager used to time a phase of the current request.
+
+    The phase is recorded on g.timings when the block exits, including when it raises an
+    exception. Outside a request the block is run without being timed.
+
+    Parameters
+    ----------
+    name : str
+        The phase name, used as the Server-Timing metric name.
+    description : str, optional
+        A description of the phase shown alongside its duration, by default None.
+    """
+    if not has_request_context():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, (time.perf_counter() - start) * 1000, description)
+
+
+def record_timing(name: str, duration_ms: float, description: Optional[str] = None):
+    """Record a phase of the current request that was timed by the caller, such as a phase that is only
+    recorded when it did some work. Outside a request nothing is recorded.
+
+    Parameters
+    ----------
+    name : str
+        The phase name, used as the Server-Timing metric name.
+    duration_ms : float
+        The duration of the phase in milliseconds.
+    description : str, optional
+        A description of the phase shown alongside its duration, by default None.
+    """
+    if has_request_context():
+        g.setdefault("timings", []).append((_INVALID_NAME.sub("_", name), duration_ms, description))
+
+
+def get_timings() -> List[Tuple[str, float, Optional[str]]]:
+    """Return the phases timed during the current request.
+
+    Returns
+    -------
+    List[Tuple[str, float, Optional[str]]]
+        The name, duration in milliseconds and description of each phase in the order they finished.
+    """
+    return g.get("timings", [])
+
+
+def total_timings(timings: List[Tuple[str, float, Optional[str]]]) -> Dict[str, float]:
+    """Return the total milliseconds spent in each phase.
+
+    Phases timed more than once, such as each YouTube API page, are added together.
+
+    Parameters
+    ----------
+    timings : List[Tuple[str, float, Optional[str]]]
+        The phases returned by get_timings().
+
+    Returns
+    -------
+    Dict[str, float]
+        The milliseconds spent in each phase keyed by phase name.
+    """
+    totals = {}
+    for name, duration_ms, _ in timings:
+        totals[name] = totals.get(name, 0.0) + duration_ms
+    return totals
+
+
+def format_timings(timings: List[Tuple[str, float, Optional[str]]]) -> str:
+    """Return phase timings as name_ms=milliseconds pairs for a log line.
+
+    Parameters
+    ----------
+    timings : List[Tuple[str, float, Optional[str]]]
+        The phases returned by get_timings().
+
+    Returns
+    -------
+    str
+        The space separated name_ms=milliseconds pairs.
+    """
+    return " ".join(f"{name}_ms={duration_ms:.1f}" for name, duration_ms in total_timings(timings).items())
+
+
+def add_server_timing(response: Response) -> Response:
+    """Add the phases timed during a request to its Server-Timing header.
+
+    A phase timed more than once, such as each page of a video's comments, is added as one metric with
+    its total duration and the number of times it was timed, so the header's size does not grow with the
+    number of pages and stays within the header limits of proxies and load balancers.
+
+    Parameters
+    ----------
+    response : Response
+        The response of the request.
+
+    Returns
+    -------
+    Response
+        The response, with a Server-Timing metric for each phase if SERVER_TIMING is enabled.
+    """
+    timings = g.pop("timings", None)
+    if timings and current_app.config['SERVER_TIMING']:
+        counts = {}
+        for name, _, _ in timings:
+            counts[name] = counts.get(name, 0) + 1
+        descriptions = {name: description for name, _, description in timings}
+        for name, duration_ms in total_timings(timings).items():
+            metric = f"{name};dur={duration_ms:.1f}"
+            description = f"{counts[name]} times" if counts[name] > 1 else descriptions[name]
+            if description:
+                metric += ';desc="{}"'.format(description.replace('\\', '\\\\').replace('"', '\\"'))
+            response.headers.add("Server-Timing", metric)
+    return response
+
+
+def init_app(app):
+    """Register add_server_timing() with the application instance.
+
+    Parameters
+    ----------
+    app : Flask
+        A Flask application instance.
+    """
+    app.after_request(add_server_timing)
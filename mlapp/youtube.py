@@ -0,0 +1,372 @@
+"""
+Functions and classes used to fetch every comment of a YouTube video, including complete reply threads.
+
+A commentThread only includes the first few replies to its top level comment, so the replies of threads
+whose totalReplyCount is larger are listed with comments.list. Pages of commentThreads are fetched one
+after another, as each needs the previous page's token, while the replies of the threads on each page
+are fetched concurrently, at most YOUTUBE_REPLY_CONCURRENCY requests at a time, by an asyncio event loop.
+
+Requests are sent by the standard library's http.client on keep-alive connections, kept in a pool that
+is shared by the requests of each process, so each request does not pay for a new TCP and TLS handshake.
+The blocking requests are run in a thread pool of the same size so the event loop is never blocked.
+
+Only the fields that are read are requested, with a fields projection (THREAD_FIELDS and REPLY_FIELDS),
+and responses are transferred gzip compressed, so both the bytes sent by the API and the structures built
+when a page is parsed are a fraction of the full resources'. The bytes transferred and the time spent
+decompressing and parsing each page are recorded in the mlapp_youtube_response_bytes and
+mlapp_youtube_parse_duration_seconds metrics.
+
+The application's client sends every request through the process's YouTubeGuard, which paces and retries
+requests and fails fast while the API is unhealthy (See youtube_guard). Once the quota is spent part way
+through a video, the comments fetched so far are analysed.
+
+Functions:
+- fetch_video_comments: Coroutine used to fetch the comments of a video and the complete replies of its threads.
+- get_youtube_client: Return the application's pooled YouTube Data API client.
+
+Classes:
+- YouTubeClient: A YouTube Data API client sending requests on a pool of keep-alive connections.
+"""
+import asyncio
+import functools
+import gzip
+import http.client
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+import httplib2
+from flask import current_app
+from googleapiclient.errors import HttpError
+from mlapp.checkpoints import FetchCheckpoint
+from mlapp.memory import budget_exceeded
+from mlapp.metrics import PAGES_FETCHED, YOUTUBE_PARSE_DURATION, YOUTUBE_RESPONSE_BYTES
+from mlapp.sampling import FirstSampler
+from mlapp.timing import timed
+from mlapp.youtube_guard import error_reason, get_youtube_guard, YouTubeGuard
+
+# the YouTube Data API's endpoint, used when the YOUTUBE_API_URL configuration value is not set.
+YOUTUBE_API_URL = "https://youtube.googleapis.com/"
+# the largest page of commentThreads or comments the API returns.
+MAX_RESULTS = 100
+# the fields read from commentThreads.list and comments.list responses, in the API's partial response syntax.
+THREAD_FIELDS = ("nextPageToken,items(id,snippet(totalReplyCount,topLevelComment/snippet/textOriginal),"
+                 "replies/comments/snippet/textOriginal)")
+REPLY_FIELDS = "nextPageToken,items/snippet/textOriginal"
+
+
+class YouTubeClient(object):
+    """
+    The class represents a YouTube Data API client sending requests on a pool of keep-alive connections.
+
+    Attributes
+    ----------
+    connections_opened : int
+        The number of connections opened, used to check connections are reused.
+
+    Methods
+    -------
+    request(resource, **params)
+        Send a list request for a resource and return the decoded response.
+    get(resource, **params)
+        Coroutine used to send a request in the client's thread pool.
+    close()
+        Close the idle connections and the thread pool.
+    """
+
+    def __init__(self, base_url: str, api_key: str, size: int = 8, timeout: float = 30.0, compress: bool = True,
+                 guard: Optional[YouTubeGuard] = None):
+        """
+        Constructor for the YouTubeClient class.
+
+        Parameters
+        ----------
+        base_url : str
+            The URL of the API, such as https://youtube.googleapis.com/ or a fake YouTube Data API.
+        api_key : str
+            The API key sent with every request.
+        size : int, optional
+            The number of connections kept open and of requests sent at once, by default 8.
+        timeout : float, optional
+            Seconds to wait to connect or for a response, by default 30.
+        compress : bool, optional
+            Whether responses are requested gzip compressed, by default True.
+        guard : Optional[YouTubeGuard], optional
+            Paces, retries and stops the client's requests, by default None to send each request once.
+        """
+        url = urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.origin = f"{url.scheme}://{url.netloc}"
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path.rstrip("/") + "/youtube/v3/"
+        self.api_key = api_key
+        self.size = size
+        self.timeout = timeout
+        self.guard = guard
+        self.headers = {"Accept": "application/json"}
+        if compress:
+            # Google's APIs only compress responses to user agents that include "gzip".
+            self.headers.update({"Accept-Encoding": "gzip", "User-Agent": "mlapp (gzip)"})
+        self.connections_opened = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="youtube")
+
+    def _connect(self) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_opened += 1
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, connection: http.client.HTTPConnection):
+        if self._idle.qsize() < self.size:
+            self._idle.put(connection)
+        else:
+            connection.close()
+
+    def request(self, resource: str, **params) -> Dict:
+        """Send a list request for a resource and return the decoded response.
+
+        A request on an idle connection the server has since closed is retried on another connection.
+        Requests are sent through the client's guard, if it has one.
+
+        Parameters
+        ----------
+        resource : str
+            The resource, such as "commentThreads" or "comments".
+        **params
+            The request's query parameters; parameters that are None are not sent.
+
+        Returns
+        -------
+        Dict
+            The decoded JSON response.
+
+        Raises
+        ------
+        HttpError
+            Raised if the API returns an error, with the API's reason in its error details.
+        """
+        query = urlencode({name: value for name, value in params.items() if value is not None})
+        path = f"{self.path}{resource}?{query}"
+        if self.guard is not None:
+            return self.guard.call(functools.partial(self._send, resource, path), resource)
+        return self._send(resource, path)
+
+    def _send(self, resource: str, path: str) -> Dict:
+        while True:
+            connection, reused = self._acquire()
+            try:
+                connection.request("GET", f"{path}&key={self.api_key}", headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (ConnectionError, http.client.BadStatusLine):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            break
+        encoding = response.getheader("Content-Encoding", "identity")
+        YOUTUBE_RESPONSE_BYTES.observe(len(body), resource=resource, encoding=encoding)
+        start = time.perf_counter()
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        if response.status >= 400:
+            raise HttpError(httplib2.Response({"status": response.status}), body, uri=self.origin + path)
+        page = json.loads(body)
+        YOUTUBE_PARSE_DURATION.observe(time.perf_counter() - start, resource=resource)
+        return page
+
+    async def get(self, resource: str, **params) -> Dict:
+        """Coroutine used to send a list request in the client's thread pool (See request)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self.request, resource, **params))
+
+    def close(self):
+        """Close the idle connections and the thread pool.
+        """
+        self._executor.shutdown(wait=False)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+async def _fetch_replies(client: YouTubeClient, semaphore: asyncio.Semaphore, thread_id: str) -> Optional[List[str]]:
+    """Return the text of every reply to a commentThread, or None if the quota is spent before they are fetched."""
+    replies = []
+    page_token = None
+    async with semaphore:
+        while True:
+            try:
+                response = await client.get("comments", part="snippet", parentId=thread_id, maxResults=MAX_RESULTS,
+                                            pageToken=page_token, fields=REPLY_FIELDS)
+            except HttpError as e:
+                if error_reason(e) == "quotaExceeded":
+                    return None
+                raise
+            replies.extend(reply['snippet']['textOriginal'] for reply in response['items'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return replies
+
+
+async def fetch_video_comments(client: YouTubeClient, video_id: str, concurrency: int = 8,
+                               checkpoint: Optional[FetchCheckpoint] = None,
+                               sampler: Optional[FirstSampler] = None) -> Tuple[List[str], Optional[str]]:
+    """Coroutine used to fetch the comments of a video and the complete replies of its commentThreads.
+
+    Comments are returned in the same order as get_youtube_video_comments, each top level comment
+    followed by its replies. Pages stop being fetched once the analysis's comment or memory budget is
+    exceeded, counting the replies still being fetched (See memory), or once the quota is spent, when
+    threads whose replies could not be fetched keep the replies their commentThread includes.
+    With a checkpoint, the fetch resumes from the checkpointed page and, when the checkpoint is due, waits
+    for the replies being fetched and checkpoints the comments (See checkpoints). With a sampler, the replies
+    of each page are waited for and its comments added to the sampler before the next page is fetched, so at
+    most a page of threads and the sample are held, and pages stop being fetched once the sample is complete
+    (See sampling).
+
+    Parameters
+    ----------
+    client : YouTubeClient
+        The client used to send requests.
+    video_id : str
+        The YouTube video videoId.
+    concurrency : int, optional
+        The most comments.list requests sent at once, by default 8.
+    checkpoint : Optional[FetchCheckpoint], optional
+        The checkpoint of the fetch, by default None.
+    sampler : Optional[FirstSampler], optional
+        The sampler of the comments, by default None to return every comment.
+
+    Returns
+    -------
+    Tuple[List[str], Optional[str]]
+        The comments, or the sampled comments, as strings, and the budget that was exceeded ("comments", "memory" or "quota") or None.
+
+    Raises
+    ------
+    HttpError
+        Raised if there is an error returned by the server, such as if the video is not found, or if
+        the quota is spent before the first page is fetched.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    comments = list(checkpoint.comments) if checkpoint else []
+    # comments are added to the sampler, if there is one, instead of comments.
+    sample = comments if sampler is None else sampler
+    # the comments of each thread since comments was last extended, with the task fetching its replies
+    # if its commentThread does not include them all.
+    threads = []
+    tasks = []
+    count = len(comments)
+    page = checkpoint.pages if checkpoint else 0
+    page_token = checkpoint.page_token if checkpoint else None
+    truncated = None
+
+    async def add_threads() -> bool:
+        # wait for the replies being fetched and add the comments of the threads, returning whether
+        # every reply was fetched.
+        nonlocal truncated
+        await asyncio.gather(*tasks)
+        complete = True
+        for top_level_comment, replies, task in threads:
+            sample.append(top_level_comment)
+            if task is not None and task.result() is None:
+                truncated = truncated or "quota"
+                complete = False
+            elif task is not None:
+                replies = task.result()
+            sample.extend(replies)
+        threads.clear()
+        tasks.clear()
+        return complete
+
+    try:
+        while True:
+            page += 1
+            try:
+                with timed("api_page", f"page {page}"):
+                    response = await client.get("commentThreads", part="snippet,replies", videoId=video_id,
+                                                maxResults=MAX_RESULTS, pageToken=page_token, fields=THREAD_FIELDS)
+            except HttpError as e:
+                if not count or error_reason(e) != "quotaExceeded":
+                    raise
+                truncated = "quota"
+                break
+            PAGES_FETCHED.inc()
+            for thread in response['items']:
+                top_level_comment = thread['snippet']['topLevelComment']['snippet']['textOriginal']
+                replies = [reply['snippet']['textOriginal'] for reply in thread.get('replies', {}).get('comments', [])]
+                total_replies = thread['snippet']['totalReplyCount']
+                task = None
+                if total_replies > len(replies):
+                    task = asyncio.ensure_future(_fetch_replies(client, semaphore, thread['id']))
+                    tasks.append(task)
+                threads.append((top_level_comment, replies, task))
+                count += 1 + total_replies
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+            if sampler is not None:
+                with timed("api_replies", f"{len(tasks)} threads"):
+                    complete = await add_threads()
+                if not complete or sampler.complete:
+                    break
+            # a sample holds at most its size, within ANALYSIS_MAX_COMMENTS, so only its memory is checked.
+            truncated = budget_exceeded(count if sampler is None else 0)
+            if truncated is not None:
+                break
+            if checkpoint is not None and checkpoint.due(page):
+                checkpointed = len(comments)
+                with timed("api_replies", f"{len(tasks)} threads"):
+                    complete = await add_threads()
+                # the comments of threads missing replies are not checkpointed, the quota is spent.
+                if not complete:
+                    break
+                with timed("checkpoint", f"page {page}"):
+                    checkpoint.save(page_token, page, comments[checkpointed:])
+        with timed("api_replies", f"{len(tasks)} threads"):
+            await add_threads()
+    finally:
+        # an error cancels the replies still being fetched.
+        for task in tasks:
+            task.cancel()
+    return comments if sampler is None else sampler.comments, truncated
+
+
+def get_youtube_client() -> YouTubeClient:
+    """Return the application's YouTube Data API client for the configured URL and API key, creating it on first use.
+
+    Returns
+    -------
+    YouTubeClient
+        The application's client, with YOUTUBE_REPLY_CONCURRENCY connections and one for the commentThreads pages.
+    """
+    from mlapp.protected import DEVELOPER_KEY
+
+    config = current_app.config
+    key = (config.get("YOUTUBE_API_URL") or YOUTUBE_API_URL, config.get("YOUTUBE_API_KEY") or DEVELOPER_KEY)
+    clients = current_app.extensions.setdefault('youtube_clients', {})
+    client = clients.get(key)
+    if client is None:
+        client = clients.setdefault(key, YouTubeClient(*key, size=config['YOUTUBE_REPLY_CONCURRENCY'] + 1,
+                                                       timeout=config['YOUTUBE_TIMEOUT'], guard=get_youtube_guard()))
+    return client
@@ -0,0 +1,430 @@
+"""
+Functions and classes used to pace, retry and stop YouTube Data API requests while the API is unhealthy.
+
+Every YouTube Data API request of a process is sent through the application's YouTubeGuard, which:
+- paces requests with a token bucket shared by every request of the process, YOUTUBE_RATE_LIMIT
+  requests a second with bursts of up to YOUTUBE_RATE_BURST requests;
+- retries transient errors (5xx responses, rateLimitExceeded and backendError reasons, and broken
+  connections) up to YOUTUBE_RETRIES times, sleeping for an exponential backoff with full jitter;
+- fails fast, with a 503 circuitOpen HttpError, for YOUTUBE_CIRCUIT_RESET seconds once
+  YOUTUBE_CIRCUIT_FAILURES requests in a row have failed, then lets a single request probe the API;
+- counts the quota units spent against YOUTUBE_DAILY_QUOTA units a day, reset at midnight Pacific
+  Time as the API's quota is, and fails with a 403 quotaExceeded HttpError once they are spent
+  or once the API has returned quotaExceeded.
+
+The quota is tracked by each process, so under several workers YOUTUBE_DAILY_QUOTA should be each
+worker's share of the project's quota. The units spent, budgeted and left today by every process are
+added together in the mlapp_youtube_quota_units_total, mlapp_youtube_quota_budget_units and
+mlapp_youtube_quota_remaining_units metrics.
+
+Functions:
+- error_reason: Return the YouTube Data API reason of an HttpError.
+- get_youtube_guard: Return the application's YouTubeGuard.
+
+Classes:
+- YouTubeUnavailable: An HttpError raised without sending a request.
+- TokenBucket: A thread-safe token bucket rate limiter.
+- CircuitBreaker: A thread-safe circuit breaker.
+- QuotaBudget: A thread-safe daily quota budget.
+- YouTubeGuard: Paces, retries and stops YouTube Data API requests.
+"""
+import datetime
+import http.client
+import json
+import random
+import threading
+import time
+import zoneinfo
+from typing import Callable, Optional, TypeVar
+import httplib2
+from flask import current_app
+from googleapiclient.errors import HttpError
+from mlapp.metrics import (
+    YOUTUBE_CIRCUIT_TRANSITIONS, YOUTUBE_QUOTA_BUDGET, YOUTUBE_QUOTA_REMAINING, YOUTUBE_QUOTA_UNITS,
+    YOUTUBE_RATE_LIMIT_WAIT, YOUTUBE_REJECTED, YOUTUBE_RETRIES
+)
+
+T = TypeVar("T")
+# the reasons of errors that are worth retrying after a backoff.
+RETRYABLE_REASONS = frozenset(("rateLimitExceeded", "userRateLimitExceeded", "backendError", "internalError"))
+try:
+    QUOTA_TIMEZONE = zoneinfo.ZoneInfo("America/Los_Angeles")
+except zoneinfo.ZoneInfoNotFoundError:
+    QUOTA_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-8))
+
+
+def error_reason(error: HttpError) -> Optional[str]:
+    """Return the YouTube Data API reason of an HttpError, such as "quotaExceeded", or None if it has none.
+
+    Parameters
+    ----------
+    error : HttpError
+        The error.
+
+    Returns
+    -------
+    Optional[str]
+        The reason of the error's first error detail.
+    """
+    details = error.error_details
+    if isinstance(details, list) and details and isinstance(details[0], dict):
+        return details[0].get("reason")
+    return None
+
+
+class YouTubeUnavailable(HttpError):
+    """
+    The class represents an HttpError, in the YouTube Data API's error format, raised without sending a request.
+
+    Parameters
+    ----------
+    status : int
+        The status code, 503 while the circuit is open or 403 once the quota is spent.
+    reason : str
+        The reason, "circuitOpen" or "quotaExceeded".
+    message : str
+        The error message.
+    """
+
+    def __init__(self, status: int, reason: str, message: str):
+        body = {"error": {"code": status, "message": message,
+                          "errors": [{"message": message, "domain": "mlapp", "reason": reason}]}}
+        super().__init__(httplib2.Response({"status": status}), json.dumps(body).encode())
+
+
+class TokenBucket(object):
+    """
+    The class represents a thread-safe token bucket rate limiter.
+
+    Parameters
+    ----------
+    rate : float
+        The tokens added a second.
+    capacity : float
+        The most tokens the bucket holds, the largest burst allowed.
+    clock : Callable[[], float], optional
+        Returns the current time in seconds, by default time.monotonic.
+    sleep : Callable[[float], None], optional
+        Sleeps for a number of seconds, by default time.sleep.
+
+    Methods
+    -------
+    acquire(tokens=1)
+        Take tokens from the bucket, waiting until there are enough, and return the seconds waited.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens from the bucket, waiting until there are enough, and return the seconds waited.
+
+        Tokens are reserved before waiting, so the bucket may be in debt and callers are served in turn.
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate) - tokens
+            self._updated = now
+            delay = max(-self.tokens / self.rate, 0.0)
+        if delay:
+            self.sleep(delay)
+        return delay
+
+
+class CircuitBreaker(object):
+    """
+    The class represents a thread-safe circuit breaker.
+
+    The circuit is closed while calls succeed and opens after failure_threshold consecutive failures.
+    Calls are rejected while it is open; once reset_timeout seconds have passed it is half open and a
+    single call is allowed, which closes the circuit if it succeeds or opens it again if it fails.
+
+    Parameters
+    ----------
+    failure_threshold : int
+        The consecutive failures that open the circuit.
+    reset_timeout : float
+        Seconds the circuit stays open before a call is allowed to probe it.
+    clock : Callable[[], float], optional
+        Returns the current time in seconds, by default time.monotonic.
+
+    Methods
+    -------
+    allow()
+        Return whether a call is allowed.
+    record_success()
+        Record a successful call.
+    record_failure()
+        Record a failed call.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            YOUTUBE_CIRCUIT_TRANSITIONS.inc(state=state)
+
+    def allow(self) -> bool:
+        """Return whether a call is allowed, moving an open circuit to half open once its reset timeout has passed."""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self._opened >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        """Record a successful call, closing the circuit."""
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit after failure_threshold consecutive failures or a failed probe."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._probing = False
+                self._opened = self.clock()
+                self._transition(self.OPEN)
+
+
+class QuotaBudget(object):
+    """
+    The class represents a thread-safe budget of quota units a day, reset at midnight Pacific Time.
+
+    The budget and the units left today are set in the mlapp_youtube_quota_budget_units and
+    mlapp_youtube_quota_remaining_units gauges as units are spent and when the budget is reset.
+
+    Parameters
+    ----------
+    daily_units : Optional[int]
+        The units that may be spent a day, None for no budget.
+    clock : Callable[[], float], optional
+        Returns the current Unix time, by default time.time.
+
+    Attributes
+    ----------
+    remaining : Optional[int]
+        The units left today, or None if there is no budget.
+
+    Methods
+    -------
+    available(units)
+        Return whether there are enough units left today.
+    spend(units, resource)
+        Record the units spent on a request for a resource.
+    exhaust()
+        Stop spending units until tomorrow, as the API has returned quotaExceeded.
+    """
+
+    def __init__(self, daily_units: Optional[int], clock: Callable[[], float] = time.time):
+        self.daily_units = daily_units
+        self.clock = clock
+        self.used = 0
+        self.exhausted = False
+        self._day = None
+        self._lock = threading.Lock()
+        if daily_units is not None:
+            YOUTUBE_QUOTA_BUDGET.set(daily_units)
+        with self._lock:
+            self._roll_over()
+
+    def _roll_over(self):
+        day = datetime.datetime.fromtimestamp(self.clock(), QUOTA_TIMEZONE).date()
+        if day != self._day:
+            self._day = day
+            self.used = 0
+            self.exhausted = False
+            self._set_remaining()
+
+    def _remaining(self) -> Optional[int]:
+        if self.exhausted:
+            return 0
+        return None if self.daily_units is None else max(self.daily_units - self.used, 0)
+
+    def _set_remaining(self):
+        if self.daily_units is not None:
+            YOUTUBE_QUOTA_REMAINING.set(self._remaining())
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """The units left today, or None if there is no budget."""
+        with self._lock:
+            self._roll_over()
+            return self._remaining()
+
+    def available(self, units: int) -> bool:
+        """Return whether there are enough units left today."""
+        with self._lock:
+            self._roll_over()
+            return not self.exhausted and (self.daily_units is None or self.used + units <= self.daily_units)
+
+    def spend(self, units: int, resource: str):
+        """Record the units spent on a request for a resource."""
+        with self._lock:
+            self._roll_over()
+            self.used += units
+            self._set_remaining()
+        YOUTUBE_QUOTA_UNITS.inc(units, resource=resource)
+
+    def exhaust(self):
+        """Stop spending units until tomorrow, as the API has returned quotaExceeded."""
+        with self._lock:
+            self._roll_over()
+            self.exhausted = True
+            self._set_remaining()
+
+
+class YouTubeGuard(object):
+    """
+    The class represents the pacing, retries and circuit breaker of YouTube Data API requests.
+
+    Parameters
+    ----------
+    rate : float
+        Requests allowed a second.
+    burst : int
+        Requests allowed at once after a pause.
+    daily_quota : Optional[int]
+        Quota units that may be spent a day, None for no budget.
+    retries : int
+        Times a transient error is retried.
+    backoff_base : float
+        Seconds of the first backoff, doubled for each retry.
+    backoff_max : float
+        The longest backoff in seconds.
+    failure_threshold : int
+        Consecutive failures that open the circuit.
+    reset_timeout : float
+        Seconds the circuit stays open.
+    sleep : Callable[[float], None], optional
+        Sleeps for a number of seconds, by default time.sleep.
+
+    Methods
+    -------
+    call(function, resource, units=1)
+        Call a function sending a request, pacing, retrying and failing fast as configured.
+    """
+
+    def __init__(self, rate: float, burst: int, daily_quota: Optional[int], retries: int, backoff_base: float,
+                 backoff_max: float, failure_threshold: int, reset_timeout: float,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.quota = QuotaBudget(daily_quota)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        """Return the seconds to wait before a retry, a random fraction of the exponential backoff ("full jitter")."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, function: Callable[[], T], resource: str, units: int = 1) -> T:
+        """Call a function sending a YouTube Data API request, pacing, retrying and failing fast as configured.
+
+        Parameters
+        ----------
+        function : Callable[[], T]
+            Sends the request and returns its response.
+        resource : str
+            The resource requested, such as "commentThreads", used to label metrics.
+        units : int, optional
+            The quota cost of the request, by default 1 as for every list method.
+
+        Returns
+        -------
+        T
+            The function's result.
+
+        Raises
+        ------
+        HttpError
+            Raised if the request fails with an error that is not transient or after every retry, or
+            as a YouTubeUnavailable error without sending the request while the circuit is open or once
+            the quota is spent.
+        """
+        attempt = 0
+        while True:
+            if not self.quota.available(units):
+                YOUTUBE_REJECTED.inc(reason="quotaExceeded")
+                raise YouTubeUnavailable(403, "quotaExceeded", "The YouTube Data API quota for today has been used.")
+            if not self.breaker.allow():
+                YOUTUBE_REJECTED.inc(reason="circuitOpen")
+                raise YouTubeUnavailable(503, "circuitOpen", "The YouTube Data API is unavailable, "
+                                         "requests are paused after repeated errors.")
+            YOUTUBE_RATE_LIMIT_WAIT.observe(self.bucket.acquire())
+            self.quota.spend(units, resource)
+            try:
+                result = function()
+            except HttpError as e:
+                reason = error_reason(e)
+                if reason == "quotaExceeded":
+                    self.quota.exhaust()
+                if e.status_code < 500 and reason not in RETRYABLE_REASONS:
+                    # the API is healthy, the request could not be completed.
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    raise
+                YOUTUBE_RETRIES.inc(reason=reason or str(e.status_code))
+            except (ConnectionError, TimeoutError, http.client.HTTPException) as e:
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    raise
+                YOUTUBE_RETRIES.inc(reason=type(e).__name__)
+            except Exception:
+                # any other error, such as a failed DNS lookup or a truncated body, is not retried but
+                # still counts as a failure, so a half-open circuit's probe is always released.
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            self.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+def get_youtube_guard() -> YouTubeGuard:
+    """Return the application's YouTubeGuard, shared by every YouTube Data API request of the process, creating it on first use.
+
+    Returns
+    -------
+    YouTubeGuard
+        The application's YouTubeGuard.
+    """
+    guard = current_app.extensions.get('youtube_guard')
+    if guard is None:
+        config = current_app.config
+        guard = current_app.extensions.setdefault('youtube_guard', YouTubeGuard(
+            config['YOUTUBE_RATE_LIMIT'], config['YOUTUBE_RATE_BURST'], config['YOUTUBE_DAILY_QUOTA'],
+            config['YOUTUBE_RETRIES'], config['YOUTUBE_BACKOFF_BASE'], config['YOUTUBE_BACKOFF_MAX'],
+            config['YOUTUBE_CIRCUIT_FAILURES'], config['YOUTUBE_CIRCUIT_RESET']))
+    return guard
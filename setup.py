@@ -3,7 +3,7 @@ from setuptools import find_packages, setup
 setup(
     name='mlapp',
     version='1.0.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data=True,
     install_requires=[
         'flask',
@@ -43,6 +43,10 @@ def app():
     app = create_app({
         'TESTING': True,
         'DATABASE': db_path,
+        # predictions are made by the NumPy-only stub instead of loading the TensorFlow model.
+        'MODEL_BACKEND': 'stub',
+        # the warm-up thread is only started by tests of /readyz.
+        'READINESS_WARM_UP_ON_REQUEST': False,
     })
 
     with app.app_context():
@@ -0,0 +1,246 @@
+"""
+This module is used to test the versioned JSON API view functions.
+
+Functions:
+- test_analyse_comments: Test the analyse comments API returns the analysed comments as columns.
+- test_analyse_comments_youtube_video: Test the analyse comments API with a fake YouTube video.
+- test_analyse_comments_summary: Test the analyse comments API's summary mode and the pages of a summarised analysis.
+- test_analyse_comments_sample: Test the analyse comments API's sampling mode.
+- test_analyse_comments_error: Test the analyse comments API returns errors as JSON.
+- test_analyse_comments_login_required: Test the analyse comments API requires a logged in user.
+"""
+from mlapp import create_app
+from mlapp.db import get_db
+from mlapp.fake_youtube import FakeYouTubeServer
+
+
+def test_analyse_comments(client, auth):
+    """Test the analyse comments API returns a manually entered comment's analysis as columns.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    response = client.post("/api/v1/analyse_comments/manually_entered", data={"input": "test comment"})
+    assert response.status_code == 200
+    analysis = response.get_json()
+    assert analysis["count"] == 1
+    assert analysis["truncated"] is None
+    assert analysis["comments"] == ["test comment"]
+    assert 0 <= analysis["prediction_values"][0] <= 1
+    assert 0 <= analysis["prediction_confidences"][0] <= 100
+    classification_id = str(analysis["classification_ids"][0])
+    assert analysis["classifications"][classification_id] in ("Misinformation", "Neutral")
+    assert set(analysis["classifications"].values()) == {"Misinformation", "Neutral"}
+
+
+def test_analyse_comments_youtube_video(app, client, auth):
+    """Test the analyse comments API analyses the same comments as the analysed comments page, in fewer bytes.
+
+    Test the truncated limit is returned when only the first comments were analysed.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    with FakeYouTubeServer() as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        page = client.post("/analyse_comments/youtube_video", data={"input": "synthetic-50"})
+        response = client.post("/api/v1/analyse_comments/youtube_video", data={"input": "synthetic-50"})
+        analysis = response.get_json()
+        assert analysis["count"] == len(analysis["comments"]) == page.data.count(b"Confidence Score")
+        assert len(analysis["classification_ids"]) == analysis["count"]
+        assert len(response.data) < len(page.data) / 5
+
+        app.config['ANALYSIS_MAX_COMMENTS'] = 10
+        analysis = client.post("/api/v1/analyse_comments/youtube_video", data={"input": "synthetic-50"}).get_json()
+        assert analysis["count"] == 10
+        assert analysis["truncated"] == "comments"
+
+
+def test_analyse_comments_summary(app, client, auth):
+    """Test the analyse comments API's summary mode and fetching pages of the summarised analysis's comments.
+
+    Test a page has the same columns as the analysis of every comment.
+    Test the page size is limited by ANALYSIS_PAGE_SIZE and an analysis is stored in chunks of a page.
+    Test an analysis is fetched from the database by another worker process of the application.
+    Test an analysis cannot be fetched by another user, once it has expired or once it has been evicted by
+    the user's later analyses.
+    Test an analysis that cannot be stored is summarised without an analysis_id.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    app.config['ANALYSIS_PAGE_SIZE'] = 20
+    app.config['ANALYSIS_STORE_SIZE'] = 1
+    auth.login()
+    with FakeYouTubeServer() as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        full = client.post("/api/v1/analyse_comments/youtube_video", data={"input": "synthetic-50"}).get_json()
+        analysis = client.post("/api/v1/analyse_comments/youtube_video?mode=summary",
+                               data={"input": "synthetic-50"}).get_json()
+    assert "comments" not in analysis
+    # every key the analyser page reads from a summary (See static/js/main.js).
+    assert {"analysis_id", "count", "truncated", "classifications", "summary"} <= analysis.keys()
+    assert analysis["classifications"] == full["classifications"]
+    summary = analysis["summary"]
+    assert {"counts", "misinformation_share", "percentiles", "confidence_histogram", "top_misinformation"} <= summary.keys()
+    assert {"counts", "edges"} <= summary["confidence_histogram"].keys()
+    assert all({"comment_number", "comment", "prediction_confidence"} <= comment.keys()
+               for comment in summary["top_misinformation"])
+    assert analysis["count"] == full["count"]
+    assert sum(summary["counts"].values()) == full["count"]
+    assert len(summary["top_misinformation"]) <= app.config['ANALYSIS_SUMMARY_TOP_K']
+
+    url = f"/api/v1/analyses/{analysis['analysis_id']}/comments"
+    page = client.get(url, query_string={"offset": 10, "limit": 100}).get_json()
+    assert {"comments", "prediction_values", "prediction_confidences", "classification_ids", "classifications",
+            "count", "total"} <= page.keys()
+    assert page["offset"] == 10
+    assert page["count"] == 20
+    assert page["total"] == full["count"]
+    assert page["comments"] == full["comments"][10:30]
+    assert page["prediction_values"] == full["prediction_values"][10:30]
+    assert page["classification_ids"] == full["classification_ids"][10:30]
+    assert client.get(url, query_string={"offset": full["count"]}).get_json()["count"] == 0
+    last = client.get(url, query_string={"offset": full["count"] - 5}).get_json()
+    assert last["comments"] == full["comments"][-5:]
+    assert last["prediction_values"] == full["prediction_values"][-5:]
+    with app.app_context():
+        chunks = get_db().execute("SELECT COUNT(*) FROM analysis_chunk").fetchone()[0]
+    assert chunks == -(-full["count"] // app.config['ANALYSIS_PAGE_SIZE'])
+
+    # another worker process, sharing the database but not the memory of the worker that analysed it.
+    worker = create_app({key: app.config[key] for key in ('TESTING', 'DATABASE', 'MODEL_BACKEND',
+                                                          'READINESS_WARM_UP_ON_REQUEST', 'ANALYSIS_PAGE_SIZE')})
+    worker_client = worker.test_client()
+    worker_client.post('/auth/login', data={'email': 't@e.st', 'password': 'test'})
+    assert worker_client.get(url, query_string={"offset": 10}).get_json()["comments"] == full["comments"][10:30]
+
+    with app.app_context():
+        db = get_db()
+        with db:
+            db.execute("UPDATE analysis SET created = datetime('now', '-2 hours')")
+    assert client.get(url).status_code == 404
+    with app.app_context():
+        db = get_db()
+        with db:
+            db.execute("UPDATE analysis SET created = CURRENT_TIMESTAMP")
+    assert client.get(url).status_code == 200
+
+    auth.logout()
+    auth.login("o@t.her", "other")
+    assert client.get(url).status_code == 404
+    # another user's analyses do not evict the user's analyses.
+    client.post("/api/v1/analyse_comments/manually_entered?mode=summary", data={"input": "test comment"})
+    auth.logout()
+    auth.login()
+    assert client.get(url).status_code == 200
+    client.post("/api/v1/analyse_comments/manually_entered?mode=summary", data={"input": "test comment"})
+    assert client.get(url).status_code == 404
+
+    # an analysis that cannot be stored is summarised without an analysis_id.
+    with app.app_context():
+        get_db().executescript("DROP TABLE analysis; DROP TABLE analysis_chunk;")
+    response = client.post("/api/v1/analyse_comments/manually_entered?mode=summary", data={"input": "test comment"})
+    assert response.status_code == 200
+    assert "analysis_id" not in response.get_json()
+    assert response.get_json()["count"] == 1
+
+
+def test_analyse_comments_sample(app, client, auth):
+    """Test the analyse comments API's sampling mode analyses at most max_comments comments and returns
+    the estimated share of misinformation with its confidence interval, also in summary mode.
+
+    Test an unknown sampling method or a maximum comment count over ANALYSIS_MAX_COMMENTS is a 400 error.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    with FakeYouTubeServer() as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        full = client.post("/api/v1/analyse_comments/youtube_video", data={"input": "synthetic-300"}).get_json()
+        analysis = client.post("/api/v1/analyse_comments/youtube_video?max_comments=100&sample=reservoir",
+                               data={"input": "synthetic-300"}).get_json()
+        assert analysis["count"] == 100
+        assert analysis["truncated"] is None
+        sample = analysis["sample"]
+        assert (sample["method"], sample["size"], sample["seen"]) == ("reservoir", 100, full["count"])
+        assert sample["confidence"] == app.config['ANALYSIS_SAMPLE_CONFIDENCE']
+        low, high = sample["interval"]
+        assert 0 <= low <= sample["misinformation_share"] <= high <= 1
+
+        summary = client.post("/api/v1/analyse_comments/youtube_video?mode=summary&max_comments=50",
+                              data={"input": "synthetic-300"}).get_json()
+        assert summary["sample"]["method"] == "first"
+        assert sum(summary["summary"]["counts"].values()) == summary["sample"]["size"] == 50
+
+        for query in ("max_comments=100&sample=random", "max_comments=0", "max_comments=many",
+                      f"max_comments={app.config['ANALYSIS_MAX_COMMENTS'] + 1}"):
+            response = client.post(f"/api/v1/analyse_comments/youtube_video?{query}", data={"input": "synthetic-300"})
+            assert response.status_code == 400
+            assert response.get_json()["error_type"] == "ValueError"
+
+
+def test_analyse_comments_error(client, auth, monkeypatch):
+    """Test the analyse comments API returns errors as JSON with a 400 status code, and unexpected errors
+    as JSON with a 500 status code.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    monkeypatch : MonkeyPatch
+        Helper to modify objects for the duration of a test.
+    """
+    auth.login()
+    response = client.post("/api/v1/analyse_comments/unknown_source", data={"input": "test comment"})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Comments could not be returned from an unknown source!",
+                                   "error_type": "ValueError"}
+
+    def predict_comments(comments):
+        raise KeyError("output_0")
+
+    monkeypatch.setattr("mlapp.api.predict_comments", predict_comments)
+    response = client.post("/api/v1/analyse_comments/manually_entered", data={"input": "test comment"})
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Something unexpected occurred while analysing comment data!",
+                                   "error_type": "KeyError"}
+
+
+def test_analyse_comments_login_required(client):
+    """Test the analyse comments API redirects a user who is not logged in to the login page.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    response = client.post("/api/v1/analyse_comments/manually_entered", data={"input": "test comment"})
+    assert response.headers["Location"] == "/auth/login"
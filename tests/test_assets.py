@@ -0,0 +1,132 @@
+"""
+This module is used to test building fingerprinted, precompressed static assets and serving them.
+
+Functions:
+- static_folder: A pytest fixture function that points the application at a copy of its static folder.
+- test_build_assets: Test the built assets, their variants and the manifest.
+- test_build_assets_command: Test the build-assets command reports the bytes saved and uses the new manifest.
+- test_send_static: Test built assets are sent precompressed with immutable cache headers.
+"""
+import gzip
+import os
+import shutil
+import pytest
+from flask import url_for
+from mlapp.assets import build_assets, load_manifest, page_transfer_sizes, hashed_filename, IMMUTABLE
+
+
+@pytest.fixture
+def static_folder(app, tmp_path):
+    """Point the application at a copy of its static folder so assets are not built in the package.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    tmp_path : Path
+        A temporary directory unique to the test.
+
+    Returns
+    -------
+    str
+        The path of the copied static folder.
+    """
+    folder = str(tmp_path / "static")
+    shutil.copytree(app.static_folder, folder, ignore=shutil.ignore_patterns(app.config['ASSET_BUILD_DIR']))
+    app.static_folder = folder
+    return folder
+
+
+def test_build_assets(static_folder):
+    """Test the built assets, their variants and the manifest.
+
+    Test each asset is copied under a name with the hash of its content.
+    Test text assets have a smaller gzip variant and PNG images, already compressed, do not.
+
+    Parameters
+    ----------
+    static_folder : str
+        The path of the copied static folder.
+    """
+    manifest = build_assets(static_folder, "dist")
+    assert load_manifest(static_folder, "dist") == manifest
+    with open(os.path.join(static_folder, "js", "main.js"), "rb") as f:
+        content = f.read()
+    entry = manifest["js/main.js"]
+    assert entry["file"] == "dist/" + hashed_filename("js/main.js", content)
+    with open(os.path.join(static_folder, entry["file"]), "rb") as f:
+        assert f.read() == content
+    with open(os.path.join(static_folder, entry["file"] + ".gz"), "rb") as f:
+        assert gzip.decompress(f.read()) == content
+    assert entry["gzip"] < entry["size"]
+    assert "gzip" not in manifest["images/Flask.png"]
+    assert not any(filename.startswith("dist/") for filename in manifest)
+
+    sizes = page_transfer_sizes(manifest, ["js/main.js", "css/sidebar.css", "js/main.js"])
+    assert sizes["original"] == entry["size"] + manifest["css/sidebar.css"]["size"]
+    assert sizes["br"] <= sizes["gzip"] < sizes["original"]
+    assert sizes["revalidations"] == 2
+
+
+def test_build_assets_command(app, runner, static_folder):
+    """Test the build-assets command reports the bytes saved and the application uses the new manifest.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    runner : FlaskCliRunner
+        A runner used to call the application's Click commands.
+    static_folder : str
+        The path of the copied static folder.
+    """
+    result = runner.invoke(args=["build-assets"])
+    assert result.exit_code == 0
+    assert "Analyser page assets:" in result.output
+    with app.test_request_context():
+        url = url_for("static", filename="js/main.js")
+        assert url.startswith("/static/dist/js/main.") and url.endswith(".js")
+        assert url_for("static", filename="missing.js") == "/static/missing.js"
+
+
+def test_send_static(app, client, runner, static_folder):
+    """Test built assets are sent precompressed with immutable cache headers.
+
+    Test the gzip variant is only sent to clients that accept it.
+    Test files that have not been built are sent as before.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    runner : FlaskCliRunner
+        A runner used to call the application's Click commands.
+    static_folder : str
+        The path of the copied static folder.
+    """
+    runner.invoke(args=["build-assets"])
+    entry = app.extensions['asset_manifest']["js/main.js"]
+    with open(os.path.join(static_folder, "js", "main.js"), "rb") as f:
+        content = f.read()
+
+    response = client.get("/static/" + entry["file"], headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == IMMUTABLE
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.mimetype in ("text/javascript", "application/javascript")
+    assert gzip.decompress(response.data) == content
+
+    response = client.get("/static/" + entry["file"])
+    assert "Content-Encoding" not in response.headers
+    assert response.data == content
+
+    response = client.get("/static/js/main.js")
+    assert response.status_code == 200
+    assert response.headers.get("Cache-Control") != IMMUTABLE
+    response.close()
+
+    # pages link to the built assets.
+    assert entry["file"].encode() in client.get("/auth/login").data
@@ -8,11 +8,14 @@ Functions:
 - test_login_validate_input: Test unsuccessful log-in of a user.
 - test_logout: Test successful log-out of a user.
 - test_logout_redirect: Test the log-out redirect.
+- test_load_logged_in_user_cached: Test the logged in user is loaded from the user cache.
+- test_load_logged_in_user_not_required: Test the logged in user is not loaded for endpoints that don't use g.user.
 
 """
 import pytest
 from flask import g, session
 from mlapp.db import get_db
+from mlapp.auth import get_user_cache, invalidate_user
 
 def test_register(client, app):
     """Test successful registration of a user to the application using the register view function.
@@ -173,5 +176,69 @@ def test_logout_redirect(client):
     # Check that the second request was to the index page.
     assert response.request.path == "/"
 
+def test_load_logged_in_user_cached(app, client, auth):
+    """Test the logged in user is loaded from the user cache.
 
+    Test that changes to a cached user's row are not seen until the user is invalidated.
+    Test that log-out invalidates the user's cache entry.
 
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instatiated with a FlaskClient instance.
+    """
+    auth.login()
+    with client:
+        client.get('/')
+        assert g.user['email'] == 't@e.st'
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE user SET email = 'ch@ang.ed' WHERE user_id = 1")
+        db.commit()
+
+    with client:
+        client.get('/')
+        assert g.user['email'] == 't@e.st'
+
+    with app.app_context():
+        invalidate_user(1)
+
+    with client:
+        client.get('/')
+        assert g.user['email'] == 'ch@ang.ed'
+        auth.logout()
+        assert get_user_cache().get(1) is None
+
+
+def test_load_logged_in_user_not_required(app, client, auth, monkeypatch):
+    """Test the logged in user is not loaded for endpoints that don't use g.user.
+
+    Test that g.user is None and no database connection is opened for the hello endpoint.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instatiated with a FlaskClient instance.
+    monkeypatch : MonkeyPatch
+        Helper to conveniently monkeypatch attributes/items/environment variables/syspath.
+    """
+    auth.login()
+    with app.app_context():
+        get_user_cache().clear()
+
+    def fail_get_db():
+        raise AssertionError("The database should not be used.")
+
+    monkeypatch.setattr('mlapp.auth.get_db', fail_get_db)
+    with client:
+        assert client.get('/hello').data == b'Hello, World!'
+        assert g.user is None
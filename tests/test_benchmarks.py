@@ -0,0 +1,56 @@
+"""
+This module is used to test the benchmark suite runs and compares results with a baseline.
+
+Functions:
+- test_stub_youtube: Test get_youtube_video_comments reads every page of the stubbed YouTube API client.
+- test_run_benchmarks: Test the quick benchmarks run and write JSON results.
+- test_compare_results: Test benchmark results are compared with a baseline within a tolerance.
+"""
+import json
+from benchmarks.__main__ import main
+from benchmarks.runner import compare_results
+from benchmarks.workloads import make_corpus, StubYouTube, stub_youtube_client
+from mlapp.protected import get_youtube_video_comments
+
+
+def test_stub_youtube():
+    """Test get_youtube_video_comments reads every page of the stubbed YouTube API client.
+
+    Test the synthetic corpus is reproducible.
+    """
+    youtube = StubYouTube(pages=3, threads_per_page=10)
+    expected = sum(1 + item["snippet"]["totalReplyCount"] for page in youtube.pages for item in page["items"])
+    with stub_youtube_client(youtube):
+        assert len(get_youtube_video_comments("video")) == expected
+    assert make_corpus(5, seed=1) == make_corpus(5, seed=1)
+
+
+def test_run_benchmarks(tmp_path):
+    """Test the quick benchmarks run and write JSON results.
+
+    Test a saved baseline is compared with a later run.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        A temporary directory unique to the test.
+    """
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    args = ["--quick", "-k", "confidence", "-k", "youtube", "--baseline", str(baseline)]
+    assert main(args + ["--save-baseline"]) == 0
+    assert main(args + ["--output", str(output), "--tolerance", "100"]) == 0
+    results = json.loads(output.read_text())["results"]
+    assert set(results) == {"calculate_prediction_confidence[predictions=10000]",
+                            "get_youtube_video_comments[pages=1]"}
+    assert all(result["median"] > 0 for result in results.values())
+
+
+def test_compare_results():
+    """Test benchmark results are compared with a baseline within a tolerance.
+    """
+    baseline = {"a": {"median": 1.0}, "b": {"median": 1.0}, "c": {"median": 1.0}}
+    results = {"a": {"median": 1.2}, "b": {"median": 1.3}, "c": {"median": 0.7},
+               "d": {"median": 1.0}, "e": {"skipped": "no model"}}
+    statuses = {key: status for key, _, _, status in compare_results(results, baseline, 0.25)}
+    assert statuses == {"a": "ok", "b": "regressed", "c": "improved", "d": "new", "e": "skipped"}
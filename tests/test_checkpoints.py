@@ -0,0 +1,144 @@
+"""
+This module is used to test checkpointing and resuming fetches of a video's comments.
+
+Functions:
+- expected_comments: Return every comment of a synthetic video in the order they are fetched.
+- test_fetch_checkpoint: Test checkpoints are saved, resumed, taken over, completed and collected.
+- test_resume_after_quota: Test an analysis that ran out of quota is resumed from its checkpoint.
+- test_invalid_checkpoint: Test a checkpoint whose page token is no longer valid is discarded.
+- test_checkpoint_tables_missing: Test fetches are not checkpointed in a database without the checkpoint tables.
+"""
+import pytest
+from mlapp.checkpoints import FetchCheckpoint, collect_checkpoints
+from mlapp.db import get_db
+from mlapp.fake_youtube import FakeYouTubeServer, synthesise_video, INLINE_REPLIES
+from mlapp.protected import get_youtube_video_comments
+
+
+def expected_comments(video_id: str, threads: int, expand_replies: bool) -> list:
+    """Return every comment of a synthetic video in the order they are fetched.
+
+    Parameters
+    ----------
+    video_id : str
+        The synthetic video's videoId.
+    threads : int
+        The number of commentThreads of the video.
+    expand_replies : bool
+        Whether every reply is fetched, or only those included in commentThreads.
+
+    Returns
+    -------
+    list
+        The text of each top level comment followed by its replies.
+    """
+    return [comment["snippet"]["textOriginal"] for thread in synthesise_video(video_id, threads)
+            for comment in [thread.comment] + thread.replies[:None if expand_replies else INLINE_REPLIES]]
+
+
+def test_fetch_checkpoint(app):
+    """Test checkpoints are saved in chunks, resumed, taken over by a later fetch, completed and collected.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    app.config['FETCH_CHECKPOINT_PAGES'] = 2
+    with app.app_context():
+        checkpoint = FetchCheckpoint("video", "inline")
+        assert (checkpoint.page_token, checkpoint.pages, checkpoint.comments) == (None, 0, [])
+        assert not checkpoint.due(1)
+        assert checkpoint.due(2)
+        checkpoint.save("token-2", 2, ["a", "b"])
+        assert not checkpoint.due(3)
+        checkpoint.save("token-4", 4, ["c"])
+
+        resumed = FetchCheckpoint("video", "inline")
+        assert (resumed.page_token, resumed.pages, resumed.comments) == ("token-4", 4, ["a", "b", "c"])
+        # the first fetch stops checkpointing once the resumed fetch has taken over.
+        checkpoint.save("token-6", 6, ["d"])
+        assert not checkpoint.due(8)
+        resumed.save("token-6", 6, ["e"])
+        assert FetchCheckpoint("video", "inline").comments == ["a", "b", "c", "e"]
+
+        # a checkpoint of another mode is discarded.
+        assert FetchCheckpoint("video", "expanded").page_token is None
+        assert get_db().execute("SELECT COUNT(*) FROM fetch_checkpoint_chunk").fetchone()[0] == 0
+
+        checkpoint = FetchCheckpoint("video", "inline")
+        checkpoint.save("token-2", 2, ["a"])
+        checkpoint.complete()
+        assert FetchCheckpoint("video", "inline").page_token is None
+
+        FetchCheckpoint("old", "inline").save("token-2", 2, ["a"])
+        FetchCheckpoint("new", "inline").save("token-2", 2, ["a"])
+        db = get_db()
+        with db:
+            db.execute("UPDATE fetch_checkpoint SET updated = datetime('now', '-2 days') WHERE video_id = 'old'")
+        assert collect_checkpoints(db, app.config['FETCH_CHECKPOINT_TTL']) == 1
+        assert [row[0] for row in db.execute("SELECT DISTINCT video_id FROM fetch_checkpoint_chunk")] == ["new"]
+
+
+@pytest.mark.parametrize("expand_replies", (False, True))
+def test_resume_after_quota(app, expand_replies: bool):
+    """Test an analysis that ran out of quota keeps its checkpoint and the next analysis of the video
+    fetches only the pages after the checkpoint.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    expand_replies : bool
+        Whether the complete replies of threads are fetched.
+    """
+    app.config['YOUTUBE_EXPAND_REPLIES'] = expand_replies
+    app.config['FETCH_CHECKPOINT_PAGES'] = 3
+    expected = expected_comments("synthetic-1000", 1000, expand_replies)
+    with FakeYouTubeServer(quota=50 if expand_replies else 5) as server, app.test_request_context():
+        app.config['YOUTUBE_API_URL'] = server.url
+        comments = get_youtube_video_comments("synthetic-1000")
+        assert len(comments) < len(expected)
+        if not expand_replies:
+            assert comments == expected[:len(comments)]
+        pages = get_db().execute("SELECT pages FROM fetch_checkpoint WHERE video_id = 'synthetic-1000'").fetchone()[0]
+        assert pages >= 3
+
+    app.extensions.pop('youtube_guard')
+    with FakeYouTubeServer() as server, app.test_request_context():
+        app.config['YOUTUBE_API_URL'] = server.url
+        assert get_youtube_video_comments("synthetic-1000") == expected
+        assert server.resource_requests["commentThreads"] == 10 - pages
+        assert get_db().execute("SELECT COUNT(*) FROM fetch_checkpoint").fetchone()[0] == 0
+
+
+def test_invalid_checkpoint(app):
+    """Test a checkpoint whose page token is no longer valid is discarded and the video fetched from its first page.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with FakeYouTubeServer() as server, app.test_request_context():
+        app.config['YOUTUBE_API_URL'] = server.url
+        FetchCheckpoint("synthetic-300", "expanded").save("expired", 2, ["stale comment"])
+        assert get_youtube_video_comments("synthetic-300") == expected_comments("synthetic-300", 300, True)
+        assert server.resource_requests["commentThreads"] == 1 + 3
+
+
+def test_checkpoint_tables_missing(app):
+    """Test fetches are not checkpointed in a database created before the checkpoint tables were added.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    app.config['FETCH_CHECKPOINT_PAGES'] = 1
+    with FakeYouTubeServer() as server, app.test_request_context():
+        app.config['YOUTUBE_API_URL'] = server.url
+        get_db().executescript("DROP TABLE fetch_checkpoint; DROP TABLE fetch_checkpoint_chunk;")
+        checkpoint = FetchCheckpoint("synthetic-300", "expanded")
+        assert not checkpoint.due(1)
+        assert get_youtube_video_comments("synthetic-300") == expected_comments("synthetic-300", 300, True)
@@ -0,0 +1,159 @@
+"""
+This module is used to test compressing responses with gzip or deflate.
+
+Functions:
+- test_choose_encoding: Test the encoding the client prefers is chosen.
+- test_compress_page: Test a large page is compressed with the encoding the client accepts.
+- test_uncompressed_responses: Test small, uncompressible and already encoded responses are sent unchanged.
+- test_compress_stream: Test a streamed response is compressed as it is sent.
+- test_compressed_not_modified: Test a compressed page can still be revalidated by its ETag.
+"""
+import gzip
+import zlib
+import pytest
+from flask import Response
+from werkzeug.http import parse_accept_header
+from werkzeug.datastructures import Accept
+from mlapp.compression import choose_encoding, compress_stream
+
+
+@pytest.mark.parametrize(("header", "encoding"), (
+    ("gzip, deflate, br", "gzip"),
+    ("deflate", "deflate"),
+    ("gzip;q=0.5, deflate", "deflate"),
+    ("*", "gzip"),
+    ("br", None),
+    ("gzip;q=0, identity", None),
+    ("", None),
+))
+def test_choose_encoding(header: str, encoding: str):
+    """Test the encoding the client prefers of gzip and deflate is chosen.
+
+    Parameters
+    ----------
+    header : str
+        The Accept-Encoding header.
+    encoding : str
+        The expected encoding.
+    """
+    assert choose_encoding(parse_accept_header(header, Accept)) == encoding
+
+
+def test_compress_page(app, client, auth):
+    """Test a large page is compressed with the encoding the client accepts.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    page = client.get("/analyser").data
+    assert len(page) >= app.config['COMPRESSION_MIN_SIZE']
+
+    response = client.get("/analyser", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert int(response.headers["Content-Length"]) == len(response.data) < len(page)
+    assert gzip.decompress(response.data) == page
+
+    response = client.get("/analyser", headers={"Accept-Encoding": "deflate"})
+    assert response.headers["Content-Encoding"] == "deflate"
+    assert zlib.decompress(response.data) == page
+
+    app.config['COMPRESSION_ENABLED'] = False
+    response = client.get("/analyser", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.data == page
+
+
+def test_uncompressed_responses(app, client):
+    """Test small, uncompressible and already encoded responses are sent unchanged.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    encoded = gzip.compress(b"x" * 4096)
+
+    @app.route("/responses/<kind>")
+    def responses(kind):
+        if kind == "small":
+            return "small"
+        if kind == "binary":
+            return Response(b"x" * 4096, mimetype="application/octet-stream")
+        return Response(encoded, mimetype="text/plain", headers={"Content-Encoding": "gzip"})
+
+    headers = {"Accept-Encoding": "gzip"}
+    response = client.get("/responses/small", headers=headers)
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.data == b"small"
+    response = client.get("/responses/binary", headers=headers)
+    assert "Content-Encoding" not in response.headers
+    assert len(response.data) == 4096
+    response = client.get("/responses/encoded", headers=headers)
+    assert response.data == encoded
+
+
+def test_compress_stream(app, client):
+    """Test a streamed response is compressed as it is sent and its iterable is closed.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    closed = []
+
+    class Lines(object):
+        def __iter__(self):
+            for n in range(1000):
+                yield f"line {n}\n".encode()
+
+        def close(self):
+            closed.append(True)
+
+    chunks = compress_stream(Lines(), "gzip", 6)
+    assert gzip.decompress(b"".join(chunks)) == b"".join(Lines())
+    assert closed == [True]
+
+    @app.route("/stream")
+    def stream():
+        return Response((f"row {n}\n" for n in range(1000)), mimetype="text/csv")
+
+    response = client.get("/stream", headers={"Accept-Encoding": "deflate"})
+    assert response.headers["Content-Encoding"] == "deflate"
+    assert "Content-Length" not in response.headers
+    assert zlib.decompress(response.data) == "".join(f"row {n}\n" for n in range(1000)).encode()
+
+
+def test_compressed_not_modified(client, auth):
+    """Test a compressed page has a weak ETag and can still be revalidated by it.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    headers = {"Accept-Encoding": "gzip"}
+    etag = client.get("/analyser").headers["ETag"]
+    response = client.get("/analyser", headers=headers)
+    assert response.headers["ETag"] == "W/" + etag
+
+    headers["If-None-Match"] = response.headers["ETag"]
+    response = client.get("/analyser", headers=headers)
+    assert response.status_code == 304
+    assert "Content-Encoding" not in response.headers
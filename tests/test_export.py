@@ -0,0 +1,200 @@
+"""
+This module is used to test exporting issues and analysed comments.
+
+Functions:
+- test_export_issues_csv: Test the export_issues view function with the CSV format.
+- test_export_issues_filters: Test the export_issues view function filters.
+- test_export_issues_jsonl_gzip: Test the export_issues view function with gzip compressed JSON Lines.
+- test_export_issues_invalid: Test the export_issues view function with invalid parameters.
+- test_export_analysis: Test the export_analysis view function.
+- test_iter_rows: Test rows are fetched from a cursor in batches.
+- test_iter_analysed_comments_threshold: Test exported comments are classified with the analyser's prediction threshold.
+- test_export_issues_command: Test the export-issues Click command.
+"""
+import csv
+import gzip
+import io
+import json
+import pytest
+import numpy as np
+from mlapp.db import get_db
+from mlapp.export import iter_analysed_comments, iter_rows
+from mlapp.protected import calculate_prediction_confidence, classify_prediction
+
+
+def test_export_issues_csv(client, auth):
+    """Test the export_issues view function with the CSV format.
+
+    Test the export requires log-in.
+    Test the response is a CSV attachment with a header row and the test issue.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    assert client.get('/export/issues').headers["Location"] == "/auth/login"
+    auth.login()
+    response = client.get('/export/issues')
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == "attachment; filename=issues.csv"
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ["issue_id", "comment", "issue", "date_created", "author_id", "email", "classification"]
+    assert rows[1] == ["1", "test comment", "test\nbody", "2023-01-01 00:00:00", "1", "t@e.st", "Misinformation"]
+
+
+@pytest.mark.parametrize(("query", "count"), (
+    ("start=2023-01-01&end=2023-01-01", 1),
+    ("start=2023-01-02", 0),
+    ("author=t@e.st", 1),
+    ("author=o@t.her", 0),
+    ("classification=Misinformation", 1),
+    ("classification=Neutral", 0),
+))
+def test_export_issues_filters(client, auth, query, count):
+    """Test the export_issues view function filters.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    query : str
+        The export query string.
+    count : int
+        The expected number of exported issues.
+    """
+    auth.login()
+    response = client.get(f'/export/issues?format=jsonl&{query}')
+    assert len(response.get_data(as_text=True).splitlines()) == count
+
+
+def test_export_issues_jsonl_gzip(client, auth):
+    """Test the export_issues view function with gzip compressed JSON Lines.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    response = client.get('/export/issues?format=jsonl&gzip=1')
+    assert response.mimetype == "application/gzip"
+    assert response.headers["Content-Disposition"] == "attachment; filename=issues.jsonl.gz"
+    record = json.loads(gzip.decompress(response.data).decode("utf8"))
+    assert record["comment"] == "test comment"
+    assert record["date_created"] == "2023-01-01 00:00:00"
+
+
+@pytest.mark.parametrize("query", (
+    "format=xml",
+    "start=yesterday",
+))
+def test_export_issues_invalid(client, auth, query):
+    """Test the export_issues view function with invalid parameters.
+
+    Test an unknown format or an invalid date returns a 400 Bad Request status code.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    query : str
+        The export query string.
+    """
+    auth.login()
+    assert client.get(f'/export/issues?{query}').status_code == 400
+
+
+def test_export_analysis(client, auth, monkeypatch):
+    """Test the export_analysis view function.
+
+    Test analysed comments are exported with their classifications.
+    Test the classification filter.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    monkeypatch : MonkeyPatch
+        Helper to conveniently monkeypatch attributes/items/environment variables/syspath.
+    """
+    monkeypatch.setattr('mlapp.export.predict_comments', lambda comments: np.array([[0.75]]))
+    auth.login()
+    response = client.post('/export/analysis/manually_entered?format=jsonl', data={'input': 'test comment'})
+    record = json.loads(response.data)
+    assert record == {"comment_number": 1, "comment": "test comment", "prediction_value": 0.75,
+                      "prediction_confidence": 50, "classification_id": 1, "classification": "Misinformation"}
+    response = client.post('/export/analysis/manually_entered?format=jsonl&classification=Neutral',
+                           data={'input': 'test comment'})
+    assert response.data == b""
+    response = client.post('/export/analysis/invalid_source', data={'input': 'test comment'})
+    assert response.status_code == 400
+
+
+def test_iter_rows(app):
+    """Test rows are fetched from a cursor in batches.
+
+    Test every row is yielded when the number of rows is not a multiple of the batch size.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with app.app_context():
+        db = get_db()
+        cursor = db.execute("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 25) \
+                            SELECT x FROM n")
+        assert [row[0] for row in iter_rows(cursor, 10)] == list(range(1, 26))
+
+
+@pytest.mark.parametrize("prediction_threshold", (0.5, 0.3, 0.8))
+def test_iter_analysed_comments_threshold(app, prediction_threshold: float):
+    """Test exported comments are classified, and their confidences calculated, with the same prediction
+    threshold as classify_prediction and calculate_prediction_confidence.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    prediction_threshold : float
+        The prediction threshold of the classifications.
+    """
+    values = [0.1, 0.3, 0.4996, 0.5, 0.79, 0.8, 0.95]
+    comments = [f"comment {number}" for number in range(len(values))]
+    with app.app_context():
+        rows = list(iter_analysed_comments(np.array(values).reshape(-1, 1), comments,
+                                           prediction_threshold=prediction_threshold))
+        expected = [(classify_prediction(round(value, 3), prediction_threshold),
+                     calculate_prediction_confidence(round(value, 3), prediction_threshold)) for value in values]
+    assert [((row[4], row[5]), row[3]) for row in rows] == expected
+
+
+def test_export_issues_command(runner, tmp_path):
+    """Test the export-issues Click command.
+
+    Parameters
+    ----------
+    runner : FlaskCliRunner
+        A CliRunner for testing a Flask app's CLI commands.
+    tmp_path : Path
+        A temporary directory unique to the test.
+    """
+    result = runner.invoke(args=['export-issues', '--format', 'jsonl'])
+    assert json.loads(result.output)["email"] == "t@e.st"
+    output = tmp_path / "issues.csv.gz"
+    result = runner.invoke(args=['export-issues', '--gzip', '--output', str(output), '--author', 'o@t.her'])
+    assert result.exit_code == 0
+    assert gzip.decompress(output.read_bytes()).decode("utf8").splitlines() == [
+        "issue_id,comment,issue,date_created,author_id,email,classification"]
@@ -0,0 +1,226 @@
+"""
+This module is used to test the fake YouTube Data API and retrieving comments from it.
+
+Functions:
+- fake_youtube: A pytest fixture function that runs a fake YouTube Data API and points the application at it.
+- test_get_youtube_video_comments: Test comments of a synthetic video and all their replies are retrieved over several pages.
+- test_replay_fixture: Test a recorded fixture is replayed.
+- test_comments_list: Test replies are listed and paginated by comments.list.
+- test_partial_response: Test responses are projected to the fields parameter and gzip compressed.
+- test_api_errors: Test API errors are raised as HttpErrors with the YouTube Data API's reasons.
+- test_latency: Test requests are delayed by the configured latency.
+- test_analyse_comments_fake_youtube: Test analyse_comments displays errors returned by the fake YouTube Data API.
+"""
+import gzip
+import json
+import time
+import urllib.error
+import urllib.request
+import pytest
+from googleapiclient.errors import HttpError
+from mlapp.fake_youtube import FakeYouTubeServer, record_video, synthesise_video, INLINE_REPLIES
+from mlapp.protected import build_youtube_client, get_youtube_video_comments
+
+
+@pytest.fixture
+def fake_youtube(app, tmp_path):
+    """Run a fake YouTube Data API in a background thread and point the application at it.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    tmp_path : Path
+        A temporary directory unique to the test, used as the fixtures directory.
+
+    Yields
+    ------
+    FakeYouTubeServer
+        The running fake YouTube Data API.
+    """
+    with FakeYouTubeServer(fixtures=str(tmp_path), api_key="test-key") as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        app.config['YOUTUBE_API_KEY'] = "test-key"
+        yield server
+
+
+def test_get_youtube_video_comments(app, fake_youtube):
+    """Test comments of a synthetic video are retrieved over several pages.
+
+    Test each top level comment and every reply is returned, listing the replies of threads with
+    more replies than their commentThread includes with comments.list.
+    Test only the replies included in each commentThread are returned if YOUTUBE_EXPAND_REPLIES is disabled.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    """
+    threads = synthesise_video("synthetic-250", 250)
+    long_threads = sum(len(thread.replies) > INLINE_REPLIES for thread in threads)
+    assert long_threads > 0
+    expected = [comment["snippet"]["textOriginal"] for thread in threads
+                for comment in [thread.comment] + thread.replies]
+    with app.app_context():
+        assert get_youtube_video_comments("synthetic-250") == expected
+    assert fake_youtube.resource_requests == {"commentThreads": 3, "comments": long_threads}
+
+    app.config['YOUTUBE_EXPAND_REPLIES'] = False
+    expected = [comment["snippet"]["textOriginal"] for thread in threads
+                for comment in [thread.comment] + thread.replies[:INLINE_REPLIES]]
+    with app.app_context():
+        assert get_youtube_video_comments("synthetic-250") == expected
+    assert fake_youtube.resource_requests == {"commentThreads": 6, "comments": long_threads}
+
+
+def test_replay_fixture(app, fake_youtube, tmp_path):
+    """Test a fixture recorded with record_video is replayed.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    tmp_path : Path
+        A temporary directory unique to the test.
+    """
+    with app.app_context():
+        # record every reply of a synthetic video, then replay it under another videoId.
+        fixture = record_video(build_youtube_client(), "synthetic-30")
+    assert sum(len(thread["replies"]) for thread in fixture["threads"]) == \
+        sum(len(thread.replies) for thread in synthesise_video("synthetic-30", 30))
+    fixture["threads"][0]["comment"]["snippet"]["textOriginal"] = "recorded comment"
+    (tmp_path / "rdwz7QiG0lk.json").write_text(json.dumps(fixture))
+    with app.app_context():
+        assert get_youtube_video_comments("rdwz7QiG0lk")[0] == "recorded comment"
+
+
+def test_comments_list(fake_youtube):
+    """Test replies are listed and paginated by comments.list.
+
+    Parameters
+    ----------
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    """
+    thread = max(synthesise_video("synthetic-50", 50), key=lambda thread: len(thread.replies))
+    url = f"{fake_youtube.url}youtube/v3/comments?part=snippet&maxResults=2&key=test-key&parentId={thread.comment['id']}"
+    ids = []
+    page = json.load(urllib.request.urlopen(url))
+    ids += [item["id"] for item in page["items"]]
+    while "nextPageToken" in page:
+        page = json.load(urllib.request.urlopen(f"{url}&pageToken={page['nextPageToken']}"))
+        ids += [item["id"] for item in page["items"]]
+    assert ids == [reply["id"] for reply in thread.replies]
+
+
+def test_partial_response(fake_youtube):
+    """Test responses are projected to the fields parameter's selection and gzip compressed when accepted.
+
+    Test an invalid selection is rejected.
+
+    Parameters
+    ----------
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    """
+    url = f"{fake_youtube.url}youtube/v3/commentThreads?part=snippet&maxResults=3&key=test-key&videoId=synthetic-5"
+    fields = "nextPageToken,items(id,snippet(totalReplyCount,topLevelComment/snippet/textOriginal)),items/kind"
+    page = json.load(urllib.request.urlopen(f"{url}&fields={fields}"))
+    threads = synthesise_video("synthetic-5", 5)[:3]
+    assert set(page) == {"nextPageToken", "items"}
+    assert page["items"] == [
+        {"kind": "youtube#commentThread", "id": thread.comment["id"],
+         "snippet": {"totalReplyCount": len(thread.replies),
+                     "topLevelComment": {"snippet": {"textOriginal": thread.comment["snippet"]["textOriginal"]}}}}
+        for thread in threads
+    ]
+
+    response = urllib.request.urlopen(urllib.request.Request(url, headers={"Accept-Encoding": "gzip"}))
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.read())) == json.load(urllib.request.urlopen(url))
+
+    for fields in ("items(id", "items/", "items,,id", "items)"):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"{url}&fields={fields}")
+        assert e.value.code == 400
+        assert json.load(e.value)["error"]["errors"][0]["reason"] == "invalidParameter"
+
+
+@pytest.mark.parametrize(("video_id", "status", "reason"), (
+    ("unknown", 404, "videoNotFound"),
+    ("disabled-1", 403, "commentsDisabled"),
+))
+def test_api_errors(app, fake_youtube, video_id, status, reason):
+    """Test API errors are raised as HttpErrors with the YouTube Data API's reasons.
+
+    Test videos without comments raise a ValueError.
+    Test invalid API keys and exceeded quotas are rejected.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    video_id : str
+        The videoId requested.
+    status : int
+        The expected HTTP status code.
+    reason : str
+        The expected error reason.
+    """
+    with app.app_context():
+        with pytest.raises(HttpError) as e:
+            get_youtube_video_comments(video_id)
+        assert (e.value.status_code, e.value.error_details[0]["reason"]) == (status, reason)
+        with pytest.raises(ValueError):
+            get_youtube_video_comments("empty-1")
+
+        app.config['YOUTUBE_API_KEY'] = "wrong-key"
+        with pytest.raises(HttpError) as e:
+            get_youtube_video_comments("synthetic-1")
+        assert e.value.error_details[0]["reason"] == "keyInvalid"
+
+        app.config['YOUTUBE_API_KEY'] = "test-key"
+        fake_youtube.quota = fake_youtube.requests
+        with pytest.raises(HttpError) as e:
+            get_youtube_video_comments("synthetic-1")
+        assert e.value.error_details[0]["reason"] == "quotaExceeded"
+
+
+def test_latency(app, fake_youtube):
+    """Test requests are delayed by the configured latency.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    """
+    fake_youtube.latency = 0.05
+    start = time.perf_counter()
+    with app.app_context():
+        get_youtube_video_comments("synthetic-150")
+    assert time.perf_counter() - start >= 0.1
+
+
+def test_analyse_comments_fake_youtube(client, auth, fake_youtube):
+    """Test analyse_comments displays errors returned by the fake YouTube Data API.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    fake_youtube : FakeYouTubeServer
+        The running fake YouTube Data API.
+    """
+    auth.login()
+    response = client.post("/analyse_comments/youtube_video", data={'input': 'unknown'})
+    assert b"An error occured while retrieving YouTube comments: 404 videoNotFound" in response.data
@@ -0,0 +1,167 @@
+"""
+This module is used to test the fragment cache of the issue lists, conditional responses and issue pagination.
+
+Functions:
+- fragment_hits: Return the number of fragment cache hits recorded.
+- test_fragment_cache: Test the fragment cache evicts the least recently used fragment.
+- test_generation_triggers: Test the issue generation is incremented whenever an issue changes.
+- test_cached_issue_list: Test the analyser page's issue list is cached until an issue changes.
+- test_not_modified: Test an unchanged page is revalidated with a 304 Not Modified response.
+- test_issue_pagination: Test the analyser page's issues are paginated by cursor.
+- test_invalid_cursor: Test an invalid cursor is rejected.
+"""
+import re
+import pytest
+from mlapp.db import get_db
+from mlapp.fragment_cache import FragmentCache, get_generation
+from mlapp.metrics import CACHE_REQUESTS
+
+
+def fragment_hits() -> float:
+    """Return the number of fragment cache hits recorded.
+
+    Returns
+    -------
+    float
+        The number of hits.
+    """
+    samples = dict((tuple(key), value) for key, value in CACHE_REQUESTS.snapshot()["samples"])
+    return samples.get(("fragment", "hit"), 0)
+
+
+def test_fragment_cache():
+    """Test the fragment cache evicts the least recently used fragment.
+    """
+    cache = FragmentCache(maxsize=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert len(cache) == 2
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_generation_triggers(app):
+    """Test the issue generation is incremented whenever an issue is inserted, updated or deleted.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with app.app_context():
+        db = get_db()
+        generation = get_generation()
+        db.execute("INSERT INTO issue (comment, issue, author_id, classified_id) VALUES ('c', 'i', 1, 1)")
+        assert get_generation() == generation + 1
+        db.execute("UPDATE issue SET issue = 'updated' WHERE issue_id = 1")
+        assert get_generation() == generation + 2
+        db.execute("DELETE FROM issue WHERE issue_id = 1")
+        assert get_generation() == generation + 3
+        db.execute("DROP TABLE cache_generation")
+        assert get_generation() is None
+
+
+def test_cached_issue_list(client, auth):
+    """Test the analyser page's issue list is cached until an issue is created, updated or deleted.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    client.get("/analyser")
+    hits = fragment_hits()
+    assert b"test comment" in client.get("/analyser").data
+    assert fragment_hits() == hits + 1
+
+    client.post("/issues", data={"comment": "new comment", "issue": "new issue",
+                                 "user_id": 1, "classification_id": 2})
+    assert b"new comment" in client.get("/analyser").data
+    assert fragment_hits() == hits + 1
+
+    client.post("/issue/update/1", data={"comment": "test comment", "issue": "changed issue",
+                                         "user_id": 1, "classification_id": 1})
+    assert b"changed issue" in client.get("/analyser").data
+    client.post("/issue/delete/1")
+    assert b"test comment" not in client.get("/analyser").data
+    assert fragment_hits() == hits + 1
+
+
+@pytest.mark.parametrize("path", ("/analyser", "/account"))
+def test_not_modified(client, auth, path):
+    """Test an unchanged page is revalidated with a 304 Not Modified response.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    path : str
+        The path of the page.
+    """
+    auth.login()
+    response = client.get(path)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    client.post("/issue/update/1", data={"comment": "test comment", "issue": "changed issue",
+                                         "user_id": 1, "classification_id": 1})
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"changed issue" in response.data
+
+
+def test_issue_pagination(app, client, auth):
+    """Test the analyser page's issues are listed newest first and paginated by cursor.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    app.config['ISSUES_PER_PAGE'] = 2
+    with app.app_context():
+        db = get_db()
+        # two issues share a date_created so the issue_id orders them.
+        db.executemany("INSERT INTO issue (comment, date_created, issue, author_id, classified_id) VALUES (?, ?, 'i', 2, 1)",
+                       [("second", "2023-01-02 00:00:00"), ("third", "2023-01-03 00:00:00"),
+                        ("fourth", "2023-01-03 00:00:00")])
+        db.commit()
+    auth.login()
+    comments = []
+    path = "/analyser"
+    while path:
+        data = client.get(path).data.decode()
+        comments += re.findall(r'<p class="mb-1">(test comment|second|third|fourth)</p>', data)
+        older = re.search(r'href="(/analyser\?cursor=[^"]+)">Older', data)
+        path = older.group(1) if older else None
+    assert comments == ["fourth", "third", "second", "test comment"]
+
+
+def test_invalid_cursor(client, auth):
+    """Test an invalid cursor is rejected with a 400 Bad Request response.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    assert client.get("/analyser?cursor=not-a-cursor").status_code == 400
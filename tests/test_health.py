@@ -0,0 +1,126 @@
+"""
+This module is used to test the health and readiness endpoints, the model warm-up and the classification cache.
+
+Functions:
+- test_healthz: Test the health endpoint reports the process is alive.
+- test_readyz: Test the readiness endpoint reports ready once the warm-up has finished.
+- test_readyz_failed_warm_up: Test a failed warm-up is reported and retried by a later probe.
+- test_warm_up_on_first_request: Test the warm-up starts on a worker's first request.
+- test_classification_cache: Test classifying many comments reads the classification table once.
+"""
+import numpy as np
+from flask import g
+from mlapp import create_app
+from mlapp.health import get_readiness
+from mlapp.protected import combine_analysed_data
+
+
+def test_healthz(client):
+    """Test the health endpoint reports the process is alive.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
+
+
+def test_readyz(app, client):
+    """Test the readiness endpoint reports ready once the warm-up has finished.
+
+    Test the first probe starts the warm-up and the durations of each warm-up step are reported.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    with app.app_context():
+        readiness = get_readiness()
+    assert readiness.state == "pending"
+    response = client.get("/readyz")
+    assert response.get_json()["status"] in ("warming", "ready")
+    readiness.wait(10)
+
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["ready"] is True
+    assert report["model_backend"] == "stub"
+    assert set(report["checks"]) == {"database_ms", "classifications_ms", "model_load_ms", "warm_up_ms"}
+    assert report["error"] is None
+
+
+def test_readyz_failed_warm_up(app, client):
+    """Test a failed warm-up is reported and retried by a probe after READINESS_RETRY_SECONDS.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    backend = app.extensions['model_backend']
+
+    def load():
+        raise OSError("model not found")
+    backend.load = load
+    client.get("/readyz")
+    app.extensions['readiness'].wait(10)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    report = response.get_json()
+    assert report["ready"] is False
+    assert report["status"] == "failed"
+    assert report["error"] == "OSError: model not found"
+
+    del backend.load
+    app.config['READINESS_RETRY_SECONDS'] = 0
+    client.get("/readyz")
+    app.extensions['readiness'].wait(10)
+    assert client.get("/readyz").status_code == 200
+
+
+def test_warm_up_on_first_request(app):
+    """Test the warm-up starts on a worker's first request when READINESS_WARM_UP_ON_REQUEST is enabled.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    worker = create_app({
+        'TESTING': True,
+        'DATABASE': app.config['DATABASE'],
+        'MODEL_BACKEND': 'stub',
+        'READINESS_WARM_UP_ON_REQUEST': True,
+    })
+    readiness = worker.extensions['readiness']
+    assert readiness.state == "pending"
+    worker.test_client().get("/hello")
+    readiness.wait(10)
+    assert readiness.state == "ready"
+
+
+def test_classification_cache(app):
+    """Test classifying many comments reads the classification table once.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    comments = [f"comment {number}" for number in range(100)]
+    predictions = np.linspace(0, 1, len(comments)).reshape(-1, 1)
+    with app.test_request_context():
+        g.queries = []
+        classification_data = combine_analysed_data(predictions, comments)
+        queries = [query for query in g.queries if "classification" in query.sql]
+    assert len(queries) == 1
+    assert {data["classification"] for data in classification_data.values()} == {"Misinformation", "Neutral"}
@@ -0,0 +1,46 @@
+"""
+This module is used to test the load test harness against the application served offline.
+
+Functions:
+- test_parse_mix: Test operation mixes are parsed and validated.
+- test_percentile: Test nearest-rank percentiles.
+- test_run_load_test: Test every operation of a short offline load test succeeds.
+"""
+import pytest
+from benchmarks.loadtest import parse_mix, percentile, run_load_test, serve_offline, OPERATIONS
+
+
+def test_parse_mix():
+    """Test operation mixes are parsed and validated.
+    """
+    assert parse_mix("analyser=3, account") == {"analyser": 3.0, "account": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+    with pytest.raises(ValueError):
+        parse_mix("analyser=0")
+
+
+def test_percentile():
+    """Test nearest-rank percentiles.
+    """
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([5], 90) == 5
+    assert percentile([], 50) == 0.0
+
+
+def test_run_load_test():
+    """Test every operation of a short offline load test succeeds.
+
+    The application is served with a seeded database, the stub model backend and a fake YouTube Data API.
+    """
+    mix = ",".join(f"{operation}=1" for operation in OPERATIONS)
+    with serve_offline(issues=50) as url:
+        report = run_load_test(url, users=2, duration=30, requests=120, mix=mix, video_id="synthetic-20")
+    assert report["total"]["count"] == 120
+    assert report["total"]["errors"] == 0
+    assert set(report["operations"]) == set(OPERATIONS)
+    for stats in report["operations"].values():
+        assert 0 < stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
@@ -0,0 +1,150 @@
+"""
+This module is used to test the per-request memory tracking and the memory and comment budgets of analyses.
+
+Functions:
+- sample: Return the value of a metric with the given label values.
+- test_current_rss: Test the resident set size of the process is read.
+- test_request_memory_metrics: Test the memory used by each request is recorded in metrics.
+- test_tracemalloc_logging: Test requests over the threshold are logged with their largest allocations.
+- test_comment_budget: Test an analysis stops fetching comments at ANALYSIS_MAX_COMMENTS.
+- test_memory_budget: Test an analysis stops fetching comments once the request exceeds its memory budget.
+"""
+import itertools
+import logging
+import tracemalloc
+import pytest
+from flask import g
+from mlapp import memory
+from mlapp.fake_youtube import FakeYouTubeServer
+from mlapp.metrics import REQUEST_RSS_DELTA, ANALYSES_TRUNCATED
+from mlapp.protected import get_youtube_video_comments
+
+
+def sample(metric, *labels):
+    """Return the value of a metric with the given label values.
+
+    Parameters
+    ----------
+    metric : Metric
+        A metric.
+    *labels : str
+        The label values.
+
+    Returns
+    -------
+    float or list
+        The value of a counter or the bucket counts, sum and count of a histogram; 0 if it has not been recorded.
+    """
+    return dict((tuple(key), value) for key, value in metric.snapshot()["samples"]).get(labels, 0)
+
+
+def test_current_rss():
+    """Test the resident set size of the process is read.
+    """
+    rss = memory.current_rss()
+    if rss is None:
+        pytest.skip("/proc is not available on this platform")
+    assert rss > memory.MB
+
+
+def test_request_memory_metrics(client):
+    """Test the memory used by each request is recorded in metrics.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    """
+    if memory.current_rss() is None:
+        pytest.skip("/proc is not available on this platform")
+    before = sample(REQUEST_RSS_DELTA, "hello")
+    client.get("/hello")
+    assert sample(REQUEST_RSS_DELTA, "hello")[-1] == (before[-1] if before else 0) + 1
+
+
+def test_tracemalloc_logging(app, client, caplog):
+    """Test requests over the threshold are logged with their largest allocations in MEMORY_TRACEMALLOC mode.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    caplog : LogCaptureFixture
+        Access and control of log capturing.
+    """
+    app.config['MEMORY_TRACEMALLOC'] = True
+    app.config['MEMORY_LOG_THRESHOLD_MB'] = 0
+    try:
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            client.get("/hello")
+    finally:
+        tracemalloc.stop()
+    record = [record for record in caplog.records if hasattr(record, "memory")][0]
+    assert record.memory["traced_peak_bytes"] is not None
+    assert "largest allocations" in record.getMessage()
+
+    caplog.clear()
+    app.config['MEMORY_TRACEMALLOC'] = False
+    app.config['MEMORY_LOG_THRESHOLD_MB'] = 1024
+    client.get("/hello")
+    assert not [record for record in caplog.records if hasattr(record, "memory")]
+
+
+def test_comment_budget(app, client, auth):
+    """Test an analysis stops fetching comments at ANALYSIS_MAX_COMMENTS.
+
+    Test the comments fetched are limited to the budget and the analysed comments page says so.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    app.config['ANALYSIS_MAX_COMMENTS'] = 150
+    with FakeYouTubeServer() as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        with app.test_request_context():
+            comments = get_youtube_video_comments("synthetic-500")
+            assert len(comments) == 150
+            assert g.analysis_truncated == "comments"
+            # only the pages needed to reach the budget are requested.
+            assert server.resource_requests["commentThreads"] <= 2
+        with app.test_request_context():
+            assert len(get_youtube_video_comments("synthetic-20")) < 150
+            assert "analysis_truncated" not in g
+
+        auth.login()
+        response = client.post("/analyse_comments/youtube_video", data={'input': "synthetic-500"})
+    assert b"Only the first 150 comments were analysed" in response.data
+    assert response.data.count(b"Confidence Score") == 150
+
+
+def test_memory_budget(app, monkeypatch):
+    """Test an analysis stops fetching comments once the request exceeds its memory budget.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    monkeypatch : MonkeyPatch
+        Helper to modify objects for the duration of a test.
+    """
+    # the process appears to grow by 1 MB each time its memory is read.
+    rss = itertools.count(100 * memory.MB, memory.MB)
+    monkeypatch.setattr(memory, "current_rss", lambda: next(rss))
+    app.config['ANALYSIS_MEMORY_BUDGET_MB'] = 2
+    before = sample(ANALYSES_TRUNCATED, "memory")
+    with FakeYouTubeServer() as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        with app.test_request_context():
+            memory.start_memory_tracking()
+            comments = get_youtube_video_comments("synthetic-1000")
+            assert g.analysis_truncated == "memory"
+    assert 0 < len(comments) < 1000
+    assert sample(ANALYSES_TRUNCATED, "memory") == before + 1
@@ -0,0 +1,150 @@
+"""
+This module is used to test the metrics registry and the /metrics endpoint.
+
+Functions:
+- parse_exposition: Parse and validate metrics in the text exposition format.
+- test_metrics_endpoint: Test a scrape of the metrics view function.
+- test_histogram_buckets: Test histogram observations are counted into cumulative buckets.
+- test_label_escaping: Test label values are escaped.
+- test_multiprocess_metrics: Test metrics of several processes are added together.
+"""
+import json
+import math
+import os
+import re
+import pytest
+from mlapp.metrics import Registry, generate_latest, collect_metrics, CACHE_REQUESTS
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+def parse_exposition(text: str) -> dict:
+    """Parse and validate metrics in the text exposition format.
+
+    Every metric must have HELP and TYPE lines before its samples, every sample line must be
+    well formed and histogram buckets must be cumulative and end with +Inf equal to the count.
+
+    Parameters
+    ----------
+    text : str
+        Metrics in the text exposition format.
+
+    Returns
+    -------
+    dict
+        A dictionary of sample values keyed by the sample name and labels.
+    """
+    samples = {}
+    types = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert metric_type in ("counter", "gauge", "histogram")
+            types[name] = metric_type
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.group(1), match.group(2) or "", match.group(3)
+        base = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert base in types, line
+        samples[name + labels] = math.inf if value == "+Inf" else float(value)
+
+    for key, count in samples.items():
+        if "_count" not in key:
+            continue
+        name, labels = key.split("_count", 1)
+        buckets = [value for sample, value in samples.items()
+                   if sample.startswith(name + "_bucket") and
+                   re.sub(r',?le="[^"]*"', "", sample[len(name + "_bucket"):]).replace("{}", "") == labels]
+        assert buckets == sorted(buckets)
+        inf = labels[:-1] + ',le="+Inf"}' if labels else '{le="+Inf"}'
+        assert samples[name + "_bucket" + inf.replace("{,", "{")] == count
+    return samples
+
+
+def test_metrics_endpoint(client, auth):
+    """Test a scrape of the metrics view function.
+
+    Test the response is valid text exposition format.
+    Test request latency and user cache lookups are recorded.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    client.get('/analyser')
+    client.get('/analyser')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    samples = parse_exposition(response.get_data(as_text=True))
+    key = 'mlapp_request_duration_seconds_count{endpoint="protected.analyser",method="GET",status="200"}'
+    assert samples[key] >= 2
+    assert samples['mlapp_cache_requests_total{cache="user",result="hit"}'] >= 1
+    assert samples['mlapp_db_queries_total'] >= 1
+
+
+def test_histogram_buckets():
+    """Test histogram observations are counted into cumulative buckets.
+    """
+    registry = Registry()
+    histogram = registry.histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, stage="a")
+    with pytest.raises(ValueError):
+        histogram.observe(1, other="b")
+    samples = parse_exposition(generate_latest(registry.snapshot()))
+    assert samples['test_seconds_bucket{stage="a",le="0.1"}'] == 1
+    assert samples['test_seconds_bucket{stage="a",le="1"}'] == 3
+    assert samples['test_seconds_bucket{stage="a",le="+Inf"}'] == 4
+    assert samples['test_seconds_sum{stage="a"}'] == 6.05
+    assert samples['test_seconds_count{stage="a"}'] == 4
+
+
+def test_label_escaping():
+    """Test label values are escaped.
+    """
+    registry = Registry()
+    registry.counter("test_total", "Test.", ("path",)).inc(path='a"b\\c\nd')
+    assert 'test_total{path="a\\"b\\\\c\\nd"} 1' in generate_latest(registry.snapshot())
+
+
+def test_multiprocess_metrics(app, client, tmp_path):
+    """Test metrics of several processes are added together.
+
+    Test another process's metrics file is combined with this process's metrics in a scrape, gauges included.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    tmp_path : Path
+        A temporary directory unique to the test.
+    """
+    directory = str(tmp_path)
+    hits = collect_metrics()["mlapp_cache_requests_total"]["samples"]
+    own = dict((tuple(labels), value) for labels, value in hits).get(("user", "hit"), 0)
+    remaining = collect_metrics()["mlapp_youtube_quota_remaining_units"]["samples"]
+    own_remaining = remaining[0][1] if remaining else 0
+    other = {"mlapp_cache_requests_total": {
+        "type": "counter", "help": "Cache lookups by cache and result.",
+        "labelnames": ["cache", "result"], "samples": [[["user", "hit"], 5]]},
+        "mlapp_youtube_quota_remaining_units": {
+        "type": "gauge", "help": "YouTube Data API quota units left today.",
+        "labelnames": [], "samples": [[[], 40]]}}
+    with open(os.path.join(directory, "metrics_1.json"), "w") as f:
+        json.dump(other, f)
+    app.config['METRICS_MULTIPROCESS_DIR'] = directory
+    samples = parse_exposition(client.get('/metrics').get_data(as_text=True))
+    assert samples['mlapp_cache_requests_total{cache="user",result="hit"}'] == own + 5
+    # each process's share of the quota left today is added together.
+    assert samples['mlapp_youtube_quota_remaining_units'] == own_remaining + 40
+    assert os.path.exists(os.path.join(directory, f"metrics_{os.getpid()}.json"))
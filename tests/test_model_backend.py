@@ -0,0 +1,153 @@
+"""
+This module is used to test the model backends.
+
+Functions:
+- test_stub_backend: Test the stub backend's predictions are deterministic and within range.
+- test_stub_backend_invalid_comments: Test the stub backend rejects empty comment arrays.
+- test_stub_backend_latency: Test the stub backend sleeps for the configured latency.
+- test_predict_comments_backend: Test predict_comments uses the application's model backend.
+- test_model_load_observed: Test only the requests that load the model observe its load latency.
+- test_incomplete_backend: Test a backend without predict cannot be created.
+- test_unknown_backend: Test an unknown MODEL_BACKEND is rejected when creating the application.
+- test_create_app_without_tensorflow: Test the application is created and serves analyses without importing TensorFlow.
+"""
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import pytest
+from mlapp import create_app
+from mlapp.metrics import MODEL_LATENCY
+from mlapp.model_backend import ModelBackend, StubBackend, get_model_backend
+from mlapp.protected import predict_comments
+from mlapp.timing import get_timings
+
+
+def test_stub_backend():
+    """Test the stub backend's predictions are deterministic and within range.
+    """
+    comments = np.asarray(["first comment", "second comment", "first comment"])
+    predictions = StubBackend().predict(comments)
+    assert predictions.shape == (3, 1)
+    assert predictions.dtype == np.float32
+    assert ((predictions >= 0) & (predictions < 1)).all()
+    assert predictions[0, 0] == predictions[2, 0] != predictions[1, 0]
+    assert (StubBackend().predict(comments) == predictions).all()
+
+
+@pytest.mark.parametrize("comments", (
+    [],
+    [["nested"]],
+))
+def test_stub_backend_invalid_comments(comments):
+    """Test the stub backend rejects comment arrays the Keras model cannot predict.
+
+    Parameters
+    ----------
+    comments : list
+        An invalid list of comments.
+    """
+    with pytest.raises(ValueError):
+        StubBackend().predict(np.asarray(comments))
+
+
+def test_stub_backend_latency():
+    """Test the stub backend sleeps for the configured latency.
+    """
+    start = time.perf_counter()
+    StubBackend(latency_ms=50).predict(np.asarray(["comment"]))
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_predict_comments_backend(app):
+    """Test predict_comments uses the application's model backend.
+
+    Test an empty list of comments raises a ValueError.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with app.app_context():
+        assert isinstance(get_model_backend(), StubBackend)
+        predictions = predict_comments(["a comment", "another comment"])
+        assert (predictions == StubBackend().predict(np.asarray(["a comment", "another comment"]))).all()
+        with pytest.raises(ValueError) as e:
+            predict_comments([])
+        assert str(e.value) == "There is an error with the input comment data during predictions!"
+
+
+def test_model_load_observed(app):
+    """Test the model's load latency is only observed, and only timed in Server-Timing, when predict_comments
+    loads the model, not on every request once it has been loaded.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    class LazyBackend(StubBackend):
+        loaded = False
+
+        def load(self) -> bool:
+            loaded, self.loaded = self.loaded, True
+            return not loaded
+
+    def load_count() -> int:
+        samples = dict((tuple(labels), values) for labels, values in MODEL_LATENCY.snapshot()["samples"])
+        return samples.get(("load",), [0])[-1]
+
+    app.extensions['model_backend'] = LazyBackend()
+    before = load_count()
+    for loads in (1, 0, 0):
+        with app.test_request_context():
+            predict_comments(["a comment"])
+            assert [name for name, _, _ in get_timings()].count("model_load") == loads
+    assert load_count() == before + 1
+    assert StubBackend().load() is False
+
+
+def test_incomplete_backend():
+    """Test a model backend that does not implement predict fails when it is created rather than when it is used.
+    """
+    class IncompleteBackend(ModelBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+def test_unknown_backend():
+    """Test an unknown MODEL_BACKEND is rejected when creating the application.
+    """
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'MODEL_BACKEND': 'unknown'})
+
+
+def test_create_app_without_tensorflow(app):
+    """Test the application is created and serves analyses without importing TensorFlow.
+
+    TensorFlow is made unimportable in a new interpreter, where the application is created with
+    the stub backend and a comment is analysed.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    script = f"""
+import sys
+sys.modules["tensorflow"] = None
+from mlapp import create_app
+app = create_app({{"TESTING": True, "DATABASE": {app.config['DATABASE']!r}, "MODEL_BACKEND": "stub"}})
+client = app.test_client()
+client.post("/auth/login", data={{"email": "t@e.st", "password": "test"}})
+response = client.post("/analyse_comments/manually_entered", data={{"input": "test comment"}})
+assert b"Confidence Score" in response.data, response.data
+assert not any(name.startswith("tensorflow") for name in sys.modules if sys.modules[name] is not None)
+"""
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,106 @@
+"""
+This module is used to test request profiling.
+
+Functions:
+- test_profile_token: Test requests are only profiled with the authorised token.
+- test_profile_sample_rate: Test requests are profiled at the sample rate and old profiles removed.
+- test_profiles_command: Test the profiles Click command.
+"""
+import os
+import pytest
+from mlapp import create_app
+from mlapp.profiling import list_profiles
+
+
+@pytest.fixture
+def profiled_app(app, tmp_path):
+    """Create an application with profiling enabled and its instance folder in a temporary directory.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    tmp_path : Path
+        A temporary directory unique to the test.
+
+    Returns
+    -------
+    Flask
+        An application using the app fixture's database with profiling enabled.
+    """
+    profiled_app = create_app({
+        'TESTING': True,
+        'DATABASE': app.config['DATABASE'],
+        'PROFILE_TOKEN': 'secret',
+        'PROFILE_MAX_FILES': 2,
+    })
+    profiled_app.instance_path = str(tmp_path)
+    return profiled_app
+
+
+def test_profile_token(profiled_app):
+    """Test requests are only profiled with the authorised token.
+
+    Parameters
+    ----------
+    profiled_app : Flask
+        An application with profiling enabled.
+    """
+    client = profiled_app.test_client()
+    client.get('/hello')
+    client.get('/hello', headers={'X-Profile-Token': 'wrong'})
+    with profiled_app.app_context():
+        assert list_profiles() == []
+    client.get('/hello', headers={'X-Profile-Token': 'secret'})
+    with profiled_app.app_context():
+        profiles = list_profiles()
+    assert len(profiles) == 1
+    assert profiles[0].endpoint == 'hello'
+    assert profiles[0].name.endswith('.prof')
+
+
+def test_profile_sample_rate(profiled_app):
+    """Test requests are profiled at the sample rate and old profiles are removed.
+
+    Parameters
+    ----------
+    profiled_app : Flask
+        An application with profiling enabled.
+    """
+    profiled_app.config['PROFILE_SAMPLE_RATE'] = 1.0
+    client = profiled_app.test_client()
+    for _ in range(3):
+        client.get('/hello')
+    client.get('/missing')
+    with profiled_app.app_context():
+        profiles = list_profiles()
+        assert len(profiles) == 2
+        assert profiles[0].endpoint == 'unmatched'
+        assert len(os.listdir(os.path.join(profiled_app.instance_path, 'profiles'))) == 2
+
+
+def test_profiles_command(profiled_app):
+    """Test the profiles Click command.
+
+    Test captured profiles are listed.
+    Test a named profile and an endpoint's profiles are summarised.
+
+    Parameters
+    ----------
+    profiled_app : Flask
+        An application with profiling enabled.
+    """
+    runner = profiled_app.test_cli_runner()
+    assert 'No profiles have been captured.' in runner.invoke(args=['profiles']).output
+    client = profiled_app.test_client()
+    client.get('/hello', headers={'X-Profile-Token': 'secret'})
+    client.get('/hello', headers={'X-Profile-Token': 'secret'})
+    result = runner.invoke(args=['profiles'])
+    assert result.output.count('hello') == 4
+    with profiled_app.app_context():
+        name = list_profiles()[0].name
+    assert 'function calls' in runner.invoke(args=['profiles', name]).output
+    result = runner.invoke(args=['profiles', '--endpoint', 'hello', '--sort', 'tottime'])
+    assert '2 profiles of hello' in result.output
+    assert 'function calls' in result.output
+    assert runner.invoke(args=['profiles', 'missing.prof']).exit_code != 0
@@ -4,6 +4,8 @@ This module is used to test functionality of protected view functions and any re
 Functions:
 - test_analyser: Test the analyser view function.
 - test_create_issue: Test the create_issue view function.
+- test_create_issues_bulk: Test the create_issues_bulk view function.
+- test_create_issues_bulk_invalid: Test the create_issues_bulk view function with invalid request bodies.
 # TODO test_get_issue_existing: Test the get_issue function for an existing issue.
 # TODO test_get_issue_nonexistent: Test the get_issue function for an non-existent issue.
 - test_update_issue: Test the update_issue view function.
@@ -16,6 +18,7 @@ Functions:
 - test_analyse_comments_valid: Test the analyse_comments function with a valid comment source and a valid YouTube videoId.
 - test_analyse_comments_invalid_source: Test the analyse_comments function with an invalid comment sources.
 - test_analyse_comments_invalid_video_id: Test the analyse_comments function with an invalid YouTube videoId.
+- test_analyse_comments_server_timing: Test the analyse_comments function times its phases.
 - test_get_youtube_video_comments_valid_videoId: Test the get_youtube_video_comments function with a valid YouTube videoId.
 - test_get_youtube_video_comments_video_without_comments: Test the get_youtube_video_comments function on a YouTube video without comments.
 - test_get_youtube_video_comments_invalid_videoId: Test the get_youtube_video_comments function with an invalid videoId.
@@ -24,6 +27,8 @@ Functions:
 - test_predict_comments_invalid_comments: Test the predict_comments function with an empty comment list.
 - test_combine_analysed_data_valid: Test the combine_analysed_data function with corresponding numbers of prediction values and comments.
 - test_combine_analysed_data_invalid: Test the combine_analysed_data function with mismatched numbers of predictions values and comments.
+- test_combine_analysed_columns: Test the combine_analysed_columns function returns the values of combine_analysed_data as columns.
+- test_summarise_analysed_data: Test the summarise_analysed_data function against the analysed data of each comment.
 - test_calculate_prediction_confidence_valid: Test the calculate_prediction_confidence with valid parameters.
 - test_calculate_prediction_confidence_invalid: Test the calculate_prediction_confidence with invalid parameters.
 - test_classify_prediction_misinformation: Test the classify_prediction function for misinformation prediction values.
@@ -38,7 +43,8 @@ import pytest
 from flask import g, session, request
 from werkzeug.exceptions import HTTPException
 from mlapp.db import get_db
-from mlapp.protected import get_issue, get_classification, analyse_comments, get_youtube_video_comments, predict_comments, combine_analysed_data, calculate_prediction_confidence, classify_prediction
+from mlapp.fake_youtube import FakeYouTubeServer
+from mlapp.protected import get_issue, get_classification, analyse_comments, get_youtube_video_comments, predict_comments, combine_analysed_data, combine_analysed_columns, summarise_analysed_data, calculate_prediction_confidence, classify_prediction
 from googleapiclient.errors import HttpError
 import numpy as np
 from numpy import ndarray
@@ -102,6 +108,66 @@ def test_create_issue(app, client, auth):
                             FROM issue').fetchone()[0]
         assert count == 2
 
+def test_create_issues_bulk(app, client, auth):
+    """Test the create_issues_bulk view function.
+
+    Test valid entries are inserted with the logged in user as their author.
+    Test invalid entries are reported by their index and not inserted.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context. 
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    response = client.post('/issues/bulk', json={"issues": [
+        {"comment": "bulk one", "issue": "wrong", "classification_id": 1},
+        {"comment": "", "classification_id": 1},
+        {"comment": "bulk two", "classification_id": 2},
+        {"comment": "bulk three", "classification_id": 3},
+        "not an issue",
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["created"] == 2
+    assert data["errors"]["1"] == {"comment": ["The issues's comment is required!"]}
+    assert data["errors"]["3"] == {"classification_id": ["Unknown classification_id!"]}
+    assert "4" in data["errors"]
+
+    with app.app_context():
+        rows = get_db().execute("SELECT comment, issue, author_id, classified_id FROM issue \
+                                WHERE comment LIKE 'bulk%' ORDER BY issue_id").fetchall()
+        assert [tuple(row) for row in rows] == [("bulk one", "wrong", 1, 1), ("bulk two", "", 1, 2)]
+
+@pytest.mark.parametrize("body", (
+    None,
+    {"issues": "not a list"},
+    {"issues": [{"comment": "c", "classification_id": 1}] * 3},
+))
+def test_create_issues_bulk_invalid(app, client, auth, body):
+    """Test the create_issues_bulk view function with invalid request bodies.
+
+    Test a missing issues list or more than BULK_ISSUE_LIMIT entries returns a 400 Bad Request status code.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context. 
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    body : dict
+        The JSON request body.
+    """
+    app.config['BULK_ISSUE_LIMIT'] = 2
+    auth.login()
+    assert client.post('/issues/bulk', json=body).status_code == 400
+
 # TODO : def test_get_issue_existing(issue_id: int):
 # TODO : def test_get_issue_nonexistent(issue_id: int)
 
@@ -333,6 +399,54 @@ def test_analyse_comments_invalid_video_id(source: str, input: str, app, client,
         response = client.post(f"/analyse_comments/{source}", data={'input': input})
         assert b"An error occured while retrieving YouTube comments:" in response.data
 
+def test_analyse_comments_server_timing(app, client, auth, monkeypatch, caplog):
+    """Test analyse_comments times its phases.
+
+    Test the phases are returned in Server-Timing headers when SERVER_TIMING is enabled.
+    Test a log line with the comment count and phase timings is logged.
+    Test the phase of each page of a video's comments is one Server-Timing metric, while every page is logged.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    monkeypatch : MonkeyPatch
+        Helper to modify objects for the duration of a test.
+    caplog : LogCaptureFixture
+        Access and control of log capturing.
+    """
+    monkeypatch.setattr("mlapp.protected.predict_comments", lambda comments: np.array([[0.9]]))
+    app.config['SERVER_TIMING'] = True
+    auth.login()
+    with caplog.at_level("INFO", logger=app.logger.name):
+        response = client.post("/analyse_comments/manually_entered", data={'input': 'test comment'})
+    metrics = [metric.split(";")[0] for metric in response.headers.getlist("Server-Timing")]
+    assert "combine" in metrics
+    assert "render" in metrics
+    assert "db" in metrics
+    record = [record for record in caplog.records if hasattr(record, "analysis")][0]
+    assert record.analysis["comments"] == 1
+    assert record.analysis["source"] == "manually_entered"
+    assert set(record.analysis["timings"]) == {"combine", "render"}
+    assert "comments=1" in record.getMessage()
+
+    app.config['YOUTUBE_EXPAND_REPLIES'] = False
+    with FakeYouTubeServer() as server, caplog.at_level("INFO", logger=app.logger.name):
+        app.config['YOUTUBE_API_URL'] = server.url
+        response = client.post("/analyse_comments/youtube_video", data={'input': 'synthetic-1000'})
+    metrics = [metric for metric in response.headers.getlist("Server-Timing") if metric.startswith("api_page;")]
+    assert len(metrics) == 1 and metrics[0].endswith(';desc="10 times"')
+    record = [record for record in caplog.records if hasattr(record, "analysis")][-1]
+    assert record.analysis["pages"] == 10
+
+    app.config['SERVER_TIMING'] = False
+    response = client.post("/analyse_comments/manually_entered", data={'input': 'test comment'})
+    assert "Server-Timing" not in response.headers
+
 # NOTE: test for the base Exception handler in analyse_comments is dependent on unkown unhandled exceptions and hence not tested.
 
 @pytest.mark.parametrize('video_id', [
@@ -499,6 +613,71 @@ def test_combine_analysed_data_invalid(predictions: ndarray, comments: List[str]
             combine_analysed_data(predictions, comments)
         assert str(e.value) == "The number of prediction values does not match the number of comments!" 
 
+def test_combine_analysed_columns(app):
+    """Test combine_analysed_columns returns the values of combine_analysed_data as columns.
+
+    Test the columns hold the same values, in the same order, as combine_analysed_data.
+    Test each classification is returned once, keyed by its classification_id.
+    Test mismatched numbers of predictions and comments, and prediction values outside the range (0-1),
+    raise a ValueError exception.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    predictions = np.random.default_rng(0).random((1000, 1)).astype(np.float32)
+    predictions[:3, 0] = [0, 0.5, 1]
+    comments = [f"comment {n}" for n in range(1000)]
+    with app.app_context():
+        columns = combine_analysed_columns(predictions, comments)
+        rows = combine_analysed_data(predictions, comments)
+        assert columns["comments"] == comments
+        assert columns["prediction_values"] == [row["prediction_value"] for row in rows.values()]
+        assert columns["prediction_confidences"] == [row["prediction_confidence"] for row in rows.values()]
+        assert columns["classification_ids"] == [row["classification_id"] for row in rows.values()]
+        assert columns["classifications"] == {row["classification_id"]: row["classification"] for row in rows.values()}
+
+        with pytest.raises(ValueError):
+            combine_analysed_columns(predictions, comments[:-1])
+        with pytest.raises(ValueError):
+            combine_analysed_columns(np.array([[1.5]]), ["test"])
+
+def test_summarise_analysed_data(app):
+    """Test summarise_analysed_data against the analysed data of each comment.
+
+    Test the counts, misinformation share and histograms count every comment.
+    Test the top misinformation comments are those with the highest prediction values.
+    Test an empty analysis is summarised without errors.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    predictions = np.random.default_rng(0).random((1000, 1)).astype(np.float32)
+    comments = [f"comment {n}" for n in range(1000)]
+    with app.app_context():
+        summary = summarise_analysed_data(predictions, comments, top_k=5)
+        rows = list(combine_analysed_data(predictions, comments).values())
+        misinformation_id, _ = get_classification("Misinformation")
+        misinformation = [row for row in rows if row["classification"] == "Misinformation"]
+        assert summary["counts"][misinformation_id] == len(misinformation)
+        assert sum(summary["counts"].values()) == 1000
+        assert summary["misinformation_share"] == len(misinformation) / 1000
+        assert sum(summary["confidence_histogram"]["counts"]) == 1000
+        assert sum(summary["prediction_histogram"]["counts"]) == 1000
+        assert summary["percentiles"][5] <= summary["percentiles"][50] <= summary["percentiles"][95]
+        top = sorted(misinformation, key=lambda row: -row["prediction_value"])[:5]
+        assert [comment["prediction_value"] for comment in summary["top_misinformation"]] == \
+            [row["prediction_value"] for row in top]
+        top_comment = summary["top_misinformation"][0]
+        assert comments[top_comment["comment_number"] - 1] == top_comment["comment"]
+
+        empty = summarise_analysed_data(np.empty((0, 1)), [])
+        assert empty["misinformation_share"] == 0.0
+        assert empty["top_misinformation"] == []
+
 @pytest.mark.parametrize("prediction_value, confidence_percentage",  [
     (0, 100),
     (0.25, 50),
@@ -647,6 +826,7 @@ def test_account(client, auth):
 @pytest.mark.parametrize('path', (
     "/analyser",
     "/account",
+    "/issues/bulk",
     "/issue/update/1",
     "/issue/delete/1",
 ))
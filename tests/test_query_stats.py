@@ -0,0 +1,132 @@
+"""
+This module is used to test the SQL query instrumentation.
+
+Functions:
+- test_normalise_query: Test queries are normalised.
+- test_instrumented_connection: Test get_db returns a connection that records statements.
+- test_server_timing: Test the db Server-Timing metric.
+- test_slow_and_repeated_queries_logged: Test slow and repeated queries are logged.
+- test_query_stats_command: Test the query-stats Click command.
+"""
+import logging
+import pytest
+from flask import g
+from mlapp.db import get_db
+from mlapp.query_stats import InstrumentedConnection, normalise_query, flush_query_stats
+
+
+@pytest.mark.parametrize(("sql", "normalised"), (
+    ("SELECT *   FROM user\n WHERE user_id = 1", "SELECT * FROM user WHERE user_id = ?"),
+    ("SELECT * FROM user WHERE email = 'a''b' AND user_id = ?", "SELECT * FROM user WHERE email = ? AND user_id = ?"),
+    ("SELECT 2.5, x1 FROM t", "SELECT ?, x1 FROM t"),
+))
+def test_normalise_query(sql, normalised):
+    """Test queries are normalised.
+
+    Test whitespace is collapsed and string and number literals are replaced by placeholders.
+
+    Parameters
+    ----------
+    sql : str
+        A SQL statement.
+    normalised : str
+        The expected normalised SQL statement.
+    """
+    assert normalise_query(sql) == normalised
+
+
+def test_instrumented_connection(app):
+    """Test get_db returns a connection that records statements.
+
+    Test the row count, call site and normalised statement are recorded.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with app.test_request_context():
+        g.queries = []
+        db = get_db()
+        assert isinstance(db, InstrumentedConnection)
+        rows = db.execute("SELECT * FROM classification WHERE classification_id > 0").fetchall()
+        assert len(rows) == 2
+        query = g.queries[0]
+        assert query.sql == "SELECT * FROM classification WHERE classification_id > ?"
+        assert query.rows == 2
+        assert query.call_site.startswith("test_query_stats.py:")
+        assert query.duration > 0
+
+
+def test_server_timing(app, client, auth):
+    """Test the db Server-Timing metric.
+
+    Test the header is only returned when SERVER_TIMING is enabled.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    assert "Server-Timing" not in client.get('/analyser').headers
+    app.config['SERVER_TIMING'] = True
+    assert client.get('/analyser').headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_slow_and_repeated_queries_logged(app, client, auth, caplog):
+    """Test slow and repeated queries are logged.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    caplog : LogCaptureFixture
+        Access and control of log capturing.
+    """
+    auth.login()
+    app.config['DB_SLOW_QUERY_MS'] = 0
+    app.config['DB_REPEATED_QUERY_THRESHOLD'] = 1
+    with caplog.at_level(logging.WARNING, logger="mlapp.query_stats"):
+        client.get('/account')
+    assert "Slow query" in caplog.text
+    assert "Query repeated 1 times in /account" in caplog.text
+
+
+def test_query_stats_command(app, client, auth, runner, tmp_path):
+    """Test the query-stats Click command.
+
+    Test statistics are printed per normalised query with their call sites.
+    Test --reset removes the recorded statistics.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    runner : FlaskCliRunner
+        A CliRunner for testing a Flask app's CLI commands.
+    tmp_path : Path
+        A temporary directory unique to the test.
+    """
+    app.instance_path = str(tmp_path)
+    auth.login()
+    client.get('/analyser')
+    with app.app_context():
+        flush_query_stats()
+    result = runner.invoke(args=['query-stats', '--sort', 'count', '--reset'])
+    assert "SELECT * FROM user WHERE email = ?" in result.output
+    assert "from auth.py:" in result.output
+    result = runner.invoke(args=['query-stats'])
+    assert "No query statistics have been recorded." in result.output
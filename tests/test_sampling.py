@@ -0,0 +1,122 @@
+"""
+This module is used to test analysing a bounded sample of a video's comments.
+
+Functions:
+- test_first_sampler: Test the first sampler keeps the first comments and is complete once it has them.
+- test_reservoir_sampler: Test the reservoir sampler keeps a uniform random sample in the order comments were added.
+- test_get_sampler: Test samplers are returned for known methods and maximum comment counts within the budget.
+- test_wilson_interval: Test the Wilson score interval of proportions.
+- test_sampled_fetch: Test a video's comments are sampled as its pages are fetched.
+"""
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from mlapp.fake_youtube import FakeYouTubeServer, synthesise_video, INLINE_REPLIES
+from mlapp.protected import get_youtube_video_comments
+from mlapp.sampling import FirstSampler, ReservoirSampler, get_sampler, summarise_sample, wilson_interval
+
+
+def test_first_sampler():
+    """Test the first sampler keeps the first comments, counts every comment and is complete once it has them.
+    """
+    sampler = FirstSampler(3)
+    sampler.append("a")
+    assert not sampler.complete
+    sampler.extend(["b", "c", "d"])
+    assert sampler.complete
+    assert sampler.comments == ["a", "b", "c"]
+    assert (len(sampler), sampler.seen) == (3, 4)
+
+
+def test_reservoir_sampler():
+    """Test the reservoir sampler holds at most its size, returns its sample in the order comments were
+    added and samples every comment with the same probability.
+    """
+    sampler = ReservoirSampler(5, random.Random(0))
+    sampler.extend(range(3))
+    assert sampler.comments == [0, 1, 2]
+    sampler.extend(range(3, 1000))
+    assert (len(sampler), sampler.seen) == (5, 1000)
+    assert not sampler.complete
+    assert sampler.comments == sorted(sampler.comments)
+
+    rng = random.Random(1)
+    counts = Counter()
+    trials = 4000
+    for _ in range(trials):
+        sampler = ReservoirSampler(5, rng)
+        sampler.extend(range(20))
+        counts.update(sampler.comments)
+    # each comment is sampled in a quarter of trials, within about five standard deviations.
+    assert all(abs(counts[comment] / trials - 0.25) < 0.035 for comment in range(20))
+
+
+def test_get_sampler(app):
+    """Test samplers are returned for known methods and maximum comment counts within ANALYSIS_MAX_COMMENTS.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with app.app_context():
+        assert isinstance(get_sampler("reservoir", 100), ReservoirSampler)
+        assert get_sampler("first", 100).size == 100
+        for method, max_comments in (("random", 100), ("first", 0), ("first", None), ("first", 10 ** 6)):
+            with pytest.raises(ValueError):
+                get_sampler(method, max_comments)
+
+
+def test_wilson_interval():
+    """Test the Wilson score interval of proportions, including proportions of 0 and 1 and no trials, and that
+    a sample's predictions are classified with the same rounding as the analysed comments.
+    """
+    assert wilson_interval(5, 10) == pytest.approx((0.2366, 0.7634), abs=1e-4)
+    assert wilson_interval(0, 10) == pytest.approx((0.0, 0.2775), abs=1e-4)
+    assert wilson_interval(10, 10) == pytest.approx((0.7225, 1.0), abs=1e-4)
+    assert wilson_interval(50, 1000, confidence=0.99) == pytest.approx((0.0350, 0.0709), abs=1e-4)
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+    sampler = FirstSampler(4)
+    sampler.extend("abcd")
+    sample = summarise_sample(sampler, np.array([[0.1], [0.5], [0.9], [0.4996]]))
+    assert sample["size"] == 4
+    assert sample["misinformation_share"] == 0.75
+    assert sample["interval"][0] < 0.75 < sample["interval"][1]
+
+
+@pytest.mark.parametrize("expand_replies", (False, True))
+@pytest.mark.parametrize("method", ("first", "reservoir"))
+def test_sampled_fetch(app, method: str, expand_replies: bool):
+    """Test a video's comments are sampled as its pages are fetched: the first sampler stops fetching pages
+    once it has its sample and the reservoir sampler fetches every page for a sample spread over the video.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    method : str
+        The sampling method.
+    expand_replies : bool
+        Whether the complete replies of threads are fetched.
+    """
+    app.config['YOUTUBE_EXPAND_REPLIES'] = expand_replies
+    expected = [comment["snippet"]["textOriginal"] for thread in synthesise_video("synthetic-1000", 1000)
+                for comment in [thread.comment] + thread.replies[:None if expand_replies else INLINE_REPLIES]]
+    with FakeYouTubeServer() as server, app.test_request_context():
+        app.config['YOUTUBE_API_URL'] = server.url
+        sampler = get_sampler(method, 150)
+        comments = get_youtube_video_comments("synthetic-1000", sampler)
+        pages = server.resource_requests["commentThreads"]
+    assert len(comments) == 150
+    if method == "first":
+        assert comments == expected[:150]
+        assert pages == 1
+    else:
+        assert sampler.seen == len(expected)
+        assert pages == 10
+        # the sample is in the order of the video's comments and not only from its first pages.
+        remaining = iter(enumerate(expected))
+        positions = [next(position for position, comment in remaining if comment == sampled) for sampled in comments]
+        assert positions[-1] > len(expected) / 2
@@ -0,0 +1,118 @@
+"""
+This module is used to test the trigger-maintained issue statistics and their view function.
+
+Functions:
+- test_issue_stats: Test the issue_stats view function.
+- test_issue_stats_triggers: Test the summary tables follow inserts, updates and deletes of issues.
+- test_verify_issue_stats_command: Test the verify-issue-stats Click command.
+- test_account_issue_stats: Test issue statistics are displayed on the account page.
+"""
+from mlapp.db import get_db
+from mlapp.stats import get_issue_stats, diff_issue_stats
+
+
+def test_issue_stats(client, auth):
+    """Test the issue_stats view function.
+
+    Test the view function requires log-in.
+    Test the JSON response contains the counts of the test issue.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    assert client.get('/stats/issues').headers["Location"] == "/auth/login"
+    auth.login()
+    stats = client.get('/stats/issues').get_json()
+    assert stats["total"] == 1
+    assert stats["by_classification"][0] == {"classification_id": 1, "classification": "Misinformation", "issue_count": 1}
+    assert stats["by_classification"][1]["issue_count"] == 0
+    assert stats["by_author"] == [{"author_id": 1, "email": "t@e.st", "issue_count": 1}]
+    assert stats["by_day"] == [{"day": "2023-01-01", "issue_count": 1}]
+
+
+def test_issue_stats_triggers(app):
+    """Test the summary tables follow inserts, updates and deletes of issues.
+
+    Test the summary tables match counts recomputed from the issue table after each change.
+    Test empty counts are removed from the summary tables.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    """
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO issue (comment, date_created, author_id, classified_id) VALUES (?, ?, ?, ?)",
+            [("a", "2023-01-01 10:00:00", 2, 2), ("b", "2023-01-02 10:00:00", 2, 1)]
+        )
+        db.commit()
+        assert not diff_issue_stats()
+        assert get_issue_stats()["total"] == 3
+
+        db.execute("UPDATE issue SET classified_id = 2, date_created = '2023-01-03 00:00:00' WHERE issue_id = 1")
+        db.commit()
+        assert not diff_issue_stats()
+
+        db.execute("DELETE FROM issue WHERE author_id = 2")
+        db.commit()
+        assert not diff_issue_stats()
+        stats = get_issue_stats()
+        assert stats["total"] == 1
+        assert [row["author_id"] for row in stats["by_author"]] == [1]
+        assert stats["by_day"] == [{"day": "2023-01-03", "issue_count": 1}]
+
+
+def test_verify_issue_stats_command(app, runner):
+    """Test the verify-issue-stats Click command.
+
+    Test consistent summary tables are reported as consistent.
+    Test differences are reported and the command fails without --repair.
+    Test --repair rebuilds the summary tables.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    runner : FlaskCliRunner
+        A CliRunner for testing a Flask app's CLI commands.
+    """
+    result = runner.invoke(args=['verify-issue-stats'])
+    assert 'consistent' in result.output
+    assert result.exit_code == 0
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE issue_count_by_author SET issue_count = 5 WHERE author_id = 1")
+        db.commit()
+
+    result = runner.invoke(args=['verify-issue-stats'])
+    assert 'issue_count_by_author: 1 stored=5 recomputed=1' in result.output
+    assert result.exit_code != 0
+
+    result = runner.invoke(args=['verify-issue-stats', '--repair'])
+    assert 'repaired' in result.output
+    with app.app_context():
+        assert not diff_issue_stats()
+
+
+def test_account_issue_stats(client, auth):
+    """Test issue statistics are displayed on the account page.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    """
+    auth.login()
+    response = client.get('/account')
+    assert b'Issue Statistics:' in response.data
+    assert b'Your Issues:' in response.data
+    assert b'2023-01-01: 1' in response.data
@@ -0,0 +1,168 @@
+"""
+This module is used to test the pooled YouTube Data API client and the concurrent comment fetcher.
+
+Functions:
+- test_connections_reused: Test requests reuse the client's keep-alive connections.
+- test_client_errors: Test API errors are raised as HttpErrors with the YouTube Data API's reasons.
+- test_fetch_video_comments: Test every comment and reply of a video is fetched, with bounded concurrency.
+- test_fetch_video_comments_faster: Test fetching replies concurrently is faster than fetching them in turn.
+- test_response_bytes: Test field masks and gzip reduce the bytes transferred, which are recorded with the parse time.
+"""
+import asyncio
+import threading
+import time
+import pytest
+from googleapiclient.errors import HttpError
+from mlapp.fake_youtube import FakeYouTubeServer, synthesise_video, INLINE_REPLIES
+from mlapp.metrics import YOUTUBE_PARSE_DURATION, YOUTUBE_RESPONSE_BYTES
+from mlapp.youtube import YouTubeClient, fetch_video_comments, THREAD_FIELDS
+
+
+def expected_comments(video_id: str, threads: int) -> list:
+    """Return every comment of a synthetic video in the order they are fetched.
+
+    Parameters
+    ----------
+    video_id : str
+        The synthetic video's videoId.
+    threads : int
+        The number of commentThreads of the video.
+
+    Returns
+    -------
+    list
+        The text of each top level comment followed by its replies.
+    """
+    return [comment["snippet"]["textOriginal"] for thread in synthesise_video(video_id, threads)
+            for comment in [thread.comment] + thread.replies]
+
+
+def test_connections_reused():
+    """Test sequential requests are sent on one keep-alive connection.
+    """
+    with FakeYouTubeServer() as server:
+        client = YouTubeClient(server.url, "key", size=2)
+        for _ in range(5):
+            response = client.request("commentThreads", part="snippet", videoId="synthetic-5", maxResults=5)
+            assert len(response["items"]) == 5
+        client.close()
+    assert client.connections_opened == 1
+    assert server.requests == 5
+
+
+@pytest.mark.parametrize(("video_id", "status", "reason"), (
+    ("unknown", 404, "videoNotFound"),
+    ("disabled-1", 403, "commentsDisabled"),
+))
+def test_client_errors(video_id: str, status: int, reason: str):
+    """Test API errors are raised as HttpErrors with the YouTube Data API's reasons.
+
+    Parameters
+    ----------
+    video_id : str
+        The videoId of a video that cannot be listed.
+    status : int
+        The expected status code.
+    reason : str
+        The expected reason.
+    """
+    with FakeYouTubeServer() as server:
+        client = YouTubeClient(server.url, "key")
+        with pytest.raises(HttpError) as e:
+            asyncio.run(fetch_video_comments(client, video_id))
+        client.close()
+    assert e.value.status_code == status
+    assert e.value.error_details[0]["reason"] == reason
+
+
+def test_fetch_video_comments():
+    """Test every comment and reply of a video is fetched with at most the given number of concurrent requests.
+    """
+    in_flight = 0
+    most_in_flight = 0
+    lock = threading.Lock()
+
+    with FakeYouTubeServer(latency=0.005) as server:
+        client = YouTubeClient(server.url, "key", size=4)
+        request = client.request
+
+        def counted_request(resource, **params):
+            nonlocal in_flight, most_in_flight
+            with lock:
+                in_flight += 1
+                most_in_flight = max(most_in_flight, in_flight)
+            try:
+                return request(resource, **params)
+            finally:
+                with lock:
+                    in_flight -= 1
+
+        client.request = counted_request
+        comments, truncated = asyncio.run(fetch_video_comments(client, "synthetic-300", concurrency=3))
+        client.close()
+    assert comments == expected_comments("synthetic-300", 300)
+    assert truncated is None
+    # the replies requests and the commentThreads page being fetched alongside them.
+    assert most_in_flight <= 3 + 1
+    long_threads = sum(len(thread.replies) > INLINE_REPLIES for thread in synthesise_video("synthetic-300", 300))
+    assert server.resource_requests == {"commentThreads": 3, "comments": long_threads}
+
+
+def test_fetch_video_comments_faster():
+    """Test fetching the replies of threads concurrently takes a fraction of the time of fetching them in turn.
+    """
+    durations = {}
+    with FakeYouTubeServer(latency=0.02) as server:
+        for concurrency in (1, 8):
+            client = YouTubeClient(server.url, "key", size=concurrency + 1)
+            start = time.perf_counter()
+            comments, _ = asyncio.run(fetch_video_comments(client, "synthetic-300", concurrency=concurrency))
+            durations[concurrency] = time.perf_counter() - start
+            client.close()
+            assert comments == expected_comments("synthetic-300", 300)
+    assert durations[8] < durations[1] / 2
+
+
+def observed(metric, *labels) -> tuple:
+    """Return the sum and count of a histogram's observations with the given label values.
+
+    Parameters
+    ----------
+    metric : Histogram
+        The histogram.
+    *labels
+        The label values.
+
+    Returns
+    -------
+    tuple
+        The sum and count of the observations.
+    """
+    values = dict((tuple(key), value) for key, value in metric.snapshot()["samples"]).get(labels, [0, 0])
+    return values[-2], values[-1]
+
+
+def test_response_bytes():
+    """Test requesting only the fields read, gzip compressed, transfers a fraction of the bytes of the full page.
+
+    Test the bytes of each response and the time taken to parse it are recorded.
+    """
+    params = {"part": "snippet,replies", "videoId": "synthetic-100", "maxResults": 100}
+    sizes = {}
+    with FakeYouTubeServer() as server:
+        for compress in (False, True):
+            client = YouTubeClient(server.url, "key", compress=compress)
+            encoding = "gzip" if compress else "identity"
+            for fields in (None, THREAD_FIELDS):
+                before = observed(YOUTUBE_RESPONSE_BYTES, "commentThreads", encoding)
+                parses = observed(YOUTUBE_PARSE_DURATION, "commentThreads")[1]
+                page = client.request("commentThreads", fields=fields, **params)
+                after = observed(YOUTUBE_RESPONSE_BYTES, "commentThreads", encoding)
+                assert after[1] == before[1] + 1
+                assert observed(YOUTUBE_PARSE_DURATION, "commentThreads")[1] == parses + 1
+                sizes[encoding, fields is not None] = after[0] - before[0]
+                assert len(page["items"]) == 100
+            client.close()
+    assert sizes["identity", True] < sizes["identity", False] / 3
+    assert sizes["gzip", False] < sizes["identity", False] / 3
+    assert sizes["gzip", True] < sizes["identity", False] / 10
@@ -0,0 +1,302 @@
+"""
+This module is used to test pacing, retrying and stopping YouTube Data API requests.
+
+Functions:
+- gauge: Return the value of a gauge without labels.
+- make_guard: Return a YouTubeGuard that does not sleep.
+- test_token_bucket: Test the token bucket allows bursts and then paces requests.
+- test_circuit_breaker: Test the circuit opens after repeated failures and closes after a successful probe.
+- test_quota_budget: Test the quota budget is spent and reset at midnight Pacific Time.
+- test_retries: Test transient errors are retried and other errors are not.
+- test_circuit_open: Test requests fail fast while the fake API is unhealthy.
+- test_circuit_probe_error: Test a probe failing with an error that is not retried does not wedge the circuit.
+- test_fetch_video_comments_error_rate: Test every comment is fetched from a fake API failing a fraction of requests.
+- test_quota_truncates_analysis: Test the comments fetched before the quota is spent are analysed.
+"""
+import asyncio
+import datetime
+import json
+import socket
+import pytest
+from googleapiclient.errors import HttpError
+from mlapp.fake_youtube import FakeYouTubeServer, synthesise_video
+from mlapp.metrics import Gauge, YOUTUBE_QUOTA_BUDGET, YOUTUBE_QUOTA_REMAINING
+from mlapp.youtube import YouTubeClient, fetch_video_comments
+from mlapp.youtube_guard import (
+    CircuitBreaker, QuotaBudget, TokenBucket, YouTubeGuard, YouTubeUnavailable, error_reason, QUOTA_TIMEZONE
+)
+
+
+class FakeClock(object):
+    """A clock that only moves when it is slept on or advanced."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def gauge(metric: Gauge) -> float:
+    """Return the value of a gauge without labels.
+
+    Parameters
+    ----------
+    metric : Gauge
+        The gauge.
+
+    Returns
+    -------
+    float
+        The gauge's value.
+    """
+    return dict((tuple(labels), value) for labels, value in metric.snapshot()["samples"])[()]
+
+
+def make_guard(**options) -> YouTubeGuard:
+    """Return a YouTubeGuard that does not sleep, with generous limits unless given.
+
+    Parameters
+    ----------
+    **options
+        YouTubeGuard arguments replacing the defaults.
+
+    Returns
+    -------
+    YouTubeGuard
+        The guard.
+    """
+    arguments = {"rate": 1000, "burst": 100, "daily_quota": None, "retries": 3, "backoff_base": 0.5,
+                 "backoff_max": 8, "failure_threshold": 5, "reset_timeout": 30, "sleep": lambda seconds: None}
+    arguments.update(options)
+    return YouTubeGuard(**arguments)
+
+
+def test_token_bucket():
+    """Test the token bucket allows a burst of its capacity and then paces requests at its rate.
+    """
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=3, clock=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert clock.now == pytest.approx(0.1)
+    clock.now += 10
+    # the bucket holds at most its capacity after a pause.
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.1)
+
+
+def test_circuit_breaker():
+    """Test the circuit opens after consecutive failures, rejects calls until its reset timeout has
+    passed and then allows a single probe that closes it or opens it again.
+    """
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_quota_budget():
+    """Test the quota budget is spent, exhausted by the API's quotaExceeded and reset at midnight Pacific Time,
+    and the budget and units left today are set in their gauges.
+    """
+    midnight = datetime.datetime(2026, 1, 2, tzinfo=QUOTA_TIMEZONE).timestamp()
+    clock = FakeClock(midnight - 60)
+    quota = QuotaBudget(3, clock=clock)
+    assert (gauge(YOUTUBE_QUOTA_BUDGET), gauge(YOUTUBE_QUOTA_REMAINING)) == (3, 3)
+    for _ in range(3):
+        assert quota.available(1)
+        quota.spend(1, "commentThreads")
+        assert gauge(YOUTUBE_QUOTA_REMAINING) == quota.remaining
+    assert not quota.available(1)
+    assert quota.remaining == 0
+
+    clock.now = midnight
+    assert gauge(YOUTUBE_QUOTA_REMAINING) == 0
+    assert quota.remaining == 3
+    assert gauge(YOUTUBE_QUOTA_REMAINING) == 3
+    quota.exhaust()
+    assert not quota.available(1)
+    assert gauge(YOUTUBE_QUOTA_REMAINING) == 0
+    clock.now += 24 * 60 * 60
+    assert quota.available(1)
+    assert gauge(YOUTUBE_QUOTA_REMAINING) == 3
+
+    # a process without a budget leaves the gauges of the budget unset.
+    unlimited = QuotaBudget(None, clock=clock)
+    assert unlimited.available(10 ** 9)
+    unlimited.exhaust()
+    assert not unlimited.available(1)
+    assert (gauge(YOUTUBE_QUOTA_BUDGET), gauge(YOUTUBE_QUOTA_REMAINING)) == (3, 3)
+
+
+@pytest.mark.parametrize(("status", "reason", "retried"), (
+    (503, "backendError", True),
+    (500, "internalError", True),
+    (403, "rateLimitExceeded", True),
+    (403, "quotaExceeded", False),
+))
+def test_retries(status: int, reason: str, retried: bool):
+    """Test transient errors are retried and other errors are raised without retrying.
+
+    Parameters
+    ----------
+    status : int
+        The status code of the injected errors.
+    reason : str
+        The reason of the injected errors.
+    retried : bool
+        Whether the error is retried.
+    """
+    slept = []
+    with FakeYouTubeServer() as server:
+        client = YouTubeClient(server.url, "key", guard=make_guard(retries=3, sleep=slept.append))
+        server.fail(status, reason, 2)
+        if retried:
+            response = client.request("commentThreads", part="snippet", videoId="synthetic-5", maxResults=5)
+            assert len(response["items"]) == 5
+            assert server.requests == 3
+            assert len(slept) == 2 and all(0 <= seconds <= 0.5 * 2 ** n for n, seconds in enumerate(slept))
+        else:
+            with pytest.raises(HttpError) as e:
+                client.request("commentThreads", part="snippet", videoId="synthetic-5", maxResults=5)
+            assert error_reason(e.value) == reason
+            assert server.requests == 1
+            assert slept == []
+
+        # the error is raised once the retries are used up.
+        server.fail(503, "backendError", 4)
+        with pytest.raises(HttpError) as e:
+            client.request("commentThreads", part="snippet", videoId="synthetic-5", maxResults=5)
+        assert error_reason(e.value) == ("backendError" if retried else "quotaExceeded")
+        client.close()
+
+
+def test_circuit_open():
+    """Test requests fail fast, without being sent, once the fake API has failed repeatedly, and that
+    a successful probe after the reset timeout lets requests through again.
+    """
+    guard = make_guard(retries=1, failure_threshold=4, reset_timeout=30)
+    clock = FakeClock()
+    guard.breaker.clock = clock
+    with FakeYouTubeServer() as server:
+        client = YouTubeClient(server.url, "key", guard=guard)
+        server.fail(503, "backendError", 4)
+        for _ in range(2):
+            with pytest.raises(HttpError):
+                client.request("commentThreads", part="snippet", videoId="synthetic-5")
+        assert server.requests == 4
+        with pytest.raises(YouTubeUnavailable) as e:
+            client.request("commentThreads", part="snippet", videoId="synthetic-5")
+        assert (e.value.status_code, error_reason(e.value)) == (503, "circuitOpen")
+        with pytest.raises(HttpError):
+            asyncio.run(fetch_video_comments(client, "synthetic-5"))
+        assert server.requests == 4
+
+        clock.now += 30
+        assert len(client.request("commentThreads", part="snippet", videoId="synthetic-5")["items"]) == 5
+        assert guard.breaker.state == CircuitBreaker.CLOSED
+        client.close()
+
+
+def test_circuit_probe_error():
+    """Test a half-open circuit's probe that fails with an error that is not retried, such as a failed DNS
+    lookup or an unreadable body, reopens the circuit rather than leaving it half open, so a later probe
+    is allowed and closes it.
+    """
+    guard = make_guard(retries=0, failure_threshold=1, reset_timeout=30)
+    clock = FakeClock()
+    guard.breaker.clock = clock
+
+    def fail(error):
+        def function():
+            raise error
+        return function
+
+    with pytest.raises(ConnectionError):
+        guard.call(fail(ConnectionError()), "commentThreads")
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    for error in (socket.gaierror(-2, "Name or service not known"), json.JSONDecodeError("Expecting value", "", 0)):
+        clock.now += 30
+        with pytest.raises(type(error)):
+            guard.call(fail(error), "commentThreads")
+        assert guard.breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert guard.call(lambda: "response", "commentThreads") == "response"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_fetch_video_comments_error_rate():
+    """Test every comment and reply of a video is fetched from a fake API failing a fifth of requests.
+    """
+    with FakeYouTubeServer(error_rate=0.2) as server:
+        client = YouTubeClient(server.url, "key", guard=make_guard(retries=10, failure_threshold=100))
+        comments, truncated = asyncio.run(fetch_video_comments(client, "synthetic-300"))
+        client.close()
+    assert truncated is None
+    assert comments == [comment["snippet"]["textOriginal"] for thread in synthesise_video("synthetic-300", 300)
+                        for comment in [thread.comment] + thread.replies]
+    # the requests that failed before being listed.
+    assert server.requests > sum(server.resource_requests.values())
+
+
+@pytest.mark.parametrize("expand_replies", (True, False))
+def test_quota_truncates_analysis(app, client, auth, expand_replies: bool):
+    """Test the comments fetched before the quota is spent are analysed, whether the quota is the
+    application's daily budget or the API's quota.
+
+    Parameters
+    ----------
+    app : Flask
+        An instance of the Flask application object with the current request context.
+    client : FlaskClient
+        Similar to a Werkzeug test client but has knowledge about Flask's contexts.
+    auth : AuthActions
+        An instance of the AuthActions class instantiated with FlaskClient instance.
+    expand_replies : bool
+        Whether the complete replies of threads are fetched.
+    """
+    app.config['YOUTUBE_EXPAND_REPLIES'] = expand_replies
+    app.config['YOUTUBE_DAILY_QUOTA'] = 2
+    auth.login()
+    with FakeYouTubeServer() as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        analysis = client.post("/api/v1/analyse_comments/youtube_video", data={"input": "synthetic-500"}).get_json()
+        assert analysis["truncated"] == "quota"
+        assert 100 <= analysis["count"] < 600
+        assert server.requests == 2
+        page = client.post("/analyse_comments/youtube_video", data={"input": "synthetic-500"})
+        assert b"403 quotaExceeded" in page.data
+        assert server.requests == 2
+
+    app.config['YOUTUBE_DAILY_QUOTA'] = None
+    app.extensions.pop('youtube_guard')
+    with FakeYouTubeServer(quota=1) as server:
+        app.config['YOUTUBE_API_URL'] = server.url
+        page = client.post("/analyse_comments/youtube_video", data={"input": "synthetic-500"})
+        assert b"YouTube Data API quota was used up" in page.data
+        assert page.data.count(b"Confidence Score") >= 100